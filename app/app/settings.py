@@ -52,15 +52,23 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.HealthCheckMiddleware",
+    "core.metrics.MetricsMiddleware",
+    "core.profiling.SQLProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    # Sessions, CSRF, auth and messages are skipped for API_PATH_PREFIX,
+    # see core/middleware.py
+    "core.middleware.BrowserSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
+    "core.middleware.BrowserCsrfViewMiddleware",
+    "core.middleware.BrowserAuthenticationMiddleware",
+    "core.middleware.BrowserMessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Token authenticated routes that need no session, CSRF or messages
+API_PATH_PREFIX = "/api/"
+
 ROOT_URLCONF = "app.urls"
 
 TEMPLATES = [
@@ -150,4 +158,108 @@ REST_FRAMEWORK= {
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
-}
\ No newline at end of file
+}
+
+# Prebuilt schema written by `manage.py build_schema`, see core/schema.py
+SCHEMA_DIR = os.path.join(STATIC_ROOT, 'schema')
+SCHEMA_CACHE_MAX_AGE = 60 * 60 * 24
+
+# Number of HASH (user_id) partitions for core_recipe and its M2M tables.
+# 0 keeps plain tables; see core/partitioning.py
+RECIPE_HASH_PARTITIONS = int(os.environ.get('RECIPE_HASH_PARTITIONS', 0))
+
+# Liveness is answered by core.middleware.HealthCheckMiddleware, readiness
+# results are cached for the TTL in seconds, see core/health.py
+HEALTH_CHECK_LIVENESS_PATH = '/api/health-check/'
+HEALTH_CHECK_READINESS_TTL = 5
+HEALTH_CHECK_MAX_DB_SATURATION = 0.9
+
+# Each worker writes its metrics snapshot to METRICS_DIR so the metrics
+# endpoint can sum them; unset keeps metrics per process, see core/metrics.py.
+# Scrapers send `Authorization: Bearer <METRICS_TOKEN>`; without a token the
+# endpoint only answers in DEBUG
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Opt-in SQL profiler, see core/profiling.py. Profiles a sampled share of
+# requests, or any request with `X-Profile-SQL: <SQL_PROFILER_TOKEN>`
+SQL_PROFILER_SAMPLE_RATE = float(os.environ.get('SQL_PROFILER_SAMPLE_RATE', 0))
+SQL_PROFILER_TOKEN = os.environ.get('SQL_PROFILER_TOKEN')
+SQL_PROFILER_SLOW_MS = float(os.environ.get('SQL_PROFILER_SLOW_MS', 500))
+SQL_PROFILER_N_PLUS_ONE = 5
+SQL_PROFILER_MAX_STATEMENTS = 1000
+SQL_PROFILER_STACK_DEPTH = 8
+SQL_PROFILER_LOG = os.environ.get(
+    'SQL_PROFILER_LOG', '/vol/web/sql-profile.ndjson'
+)
+SQL_PROFILER_LOG_MAX_BYTES = 10 * 1024 * 1024
+SQL_PROFILER_LOG_BACKUPS = 5
+
+# Recipes read per chunk by the streaming export, see recipe/export.py
+EXPORT_CHUNK_SIZE = 2000
+
+# Recipes validated and inserted per transaction by the NDJSON import, and
+# the number of per-line errors kept on each ImportJob, see
+# recipe/importing.py
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_ERRORS = 1000
+# Uploads wait here for their background import, outside the MEDIA_ROOT the
+# proxy serves
+IMPORT_UPLOAD_ROOT = os.environ.get('IMPORT_UPLOAD_ROOT', '/vol/imports')
+
+# Rows deleted per transaction when removing users or many recipes, see
+# core/deletion.py
+DELETION_BATCH_SIZE = 1000
+
+# Admin changelists show the planner's row estimate instead of an exact
+# COUNT(*) once a result is estimated to be at least this large
+ADMIN_COUNT_ESTIMATE_THRESHOLD = 10000
+
+# Delta sync, see recipe/sync.py. Changes younger than the settle time wait
+# for the next sync so late commits are not skipped; cursors older than the
+# tombstone retention get 410 and must sync from scratch
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 5000
+SYNC_SETTLE_SECONDS = 5
+SYNC_TOMBSTONE_DAYS = 90
+
+# Recipes accepted by the shopping list action and how long results stay
+# cached; entries of older data versions are never read again, see
+# recipe/shopping.py
+SHOPPING_LIST_MAX_RECIPES = 100
+SHOPPING_LIST_CACHE_TTL = 60 * 60
+
+# Similar recipes, see recipe/similarity.py. Shared features are weighted
+# per kind; features of more than SIMILAR_MAX_POSTINGS recipes only score
+# candidates found through rarer ones. Each process keeps the indexes of
+# SIMILAR_INDEX_CACHE_USERS users and builds larger libraries than
+# SIMILAR_INLINE_BUILD_MAX_RECIPES in the background
+SIMILAR_TAG_WEIGHT = 0.5
+SIMILAR_INGREDIENT_WEIGHT = 1.0
+SIMILAR_DEFAULT_K = 10
+SIMILAR_MAX_K = 50
+SIMILAR_MAX_POSTINGS = 1000
+SIMILAR_INDEX_CACHE_USERS = 8
+SIMILAR_INLINE_BUILD_MAX_RECIPES = 5000
+
+# Limits of the pantry query, see recipe/pantry.py
+PANTRY_MAX_INGREDIENTS = 500
+PANTRY_MAX_RESULTS = 100
+
+# Library statistics, see core/stats.py. Prices are counted in buckets of
+# STATS_PRICE_BUCKET_CENTS, times in the buckets starting at each of
+# STATS_TIME_BUCKETS minutes (the last one is open ended). Run
+# rebuild_recipe_stats after changing them
+STATS_PRICE_BUCKET_CENTS = 100
+STATS_TIME_BUCKETS = [0, 15, 30, 45, 60, 90, 120, 180, 240]
+STATS_TOP_TAGS = 10
+
+# Most ids one ?ids= multi-get on recipes, tags or ingredients may ask for
+MULTI_GET_MAX_IDS = 100
+
+# Batched API calls, see core/batch.py. GET-only batches asking for it run
+# up to BATCH_MAX_CONCURRENCY sub-requests at once, each on its own
+# database connection
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_CONCURRENCY = 4
@@ -14,10 +14,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularSwaggerView
 
 from django.contrib import admin
 from django.urls import include, path
@@ -28,10 +25,17 @@ from core import views as core_views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/health-check/", core_views.health_check, name="health-check"),
-    path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
+    path(
+        "api/health/ready/",
+        core_views.readiness_check,
+        name="readiness-check",
+    ),
+    path("api/metrics/", core_views.metrics_view, name="metrics"),
+    path("api/schema/", core_views.SchemaView.as_view(), name="api-schema"),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name="api-schema"), name="api-docs"),
     path("api/user/", include("user.urls")),
     path("api/recipe", include("recipe.urls")),
+    path("api/batch/", core_views.BatchView.as_view(), name="batch"),
 ]
 
 if settings.DEBUG:
@@ -1,11 +1,92 @@
-from django.contrib import admin
+import json
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.auth import get_user_model
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
-from core import models
+from core import deletion, models
+
+
+def estimated_count(queryset):
+    """Planner row estimate on PostgreSQL for large results, else COUNT"""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        #Small results are cheap to count exactly
+        if estimate >= settings.ADMIN_COUNT_ESTIMATE_THRESHOLD:
+            return estimate
+
+    return queryset.count()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never runs COUNT(*) over a huge table"""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class UserFilter(admin.SimpleListFilter):
+    """Filter by owner without listing every user in the sidebar"""
+    title = _('user')
+    parameter_name = 'user'
+
+    def lookups(self, request, model_admin):
+        #Only the selected user is shown, links in the user column set it
+        value = self.value()
+        if not value or not value.isdigit():
+            return []
+        user = get_user_model().objects.filter(id=value).first()
+        return [(value, user.email if user else value)]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(user_id=value)
+        return queryset
+
+
+class OwnedAdmin(admin.ModelAdmin):
+    """Changelist settings for the large per-user tables"""
+    #Paginated JSON lookups instead of a <select> of every user
+    autocomplete_fields = ['user']
+    list_filter = [UserFilter]
+    list_select_related = ['user']
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description=_('user'), ordering='user_id')
+    def owner(self, obj):
+        return format_html(
+            '<a href="?{}={}">{}</a>',
+            UserFilter.parameter_name,
+            obj.user_id,
+            obj.user.email,
+        )
+
 
 class UserAdmin(BaseUserAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
+    search_fields = ['email']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('email', 'password',)}),
         (
@@ -26,6 +107,32 @@ class UserAdmin(BaseUserAdmin):
         ),
     )
     readonly_fields = ['last_login']
+
+    def get_deleted_objects(self, objs, request):
+        """Count what goes instead of collecting every row of the users"""
+        users = list(objs)
+        model_count = {self.model._meta.verbose_name_plural: len(users)}
+        for model in (models.Recipe, models.Tag, models.Ingredient):
+            model_count[model._meta.verbose_name_plural] = \
+                model.objects.filter(user__in=users).count()
+        deleted_objects = [str(user) for user in users]
+        return deleted_objects, model_count, set(), []
+
+    def delete_model(self, request, obj):
+        """Queue a batched deletion instead of running the collector"""
+        #delete_view runs this in a transaction, the job starts after it
+        deletion.queue_user_deletion(obj)
+        self.message_user(
+            request,
+            _('%(user)s is locked out, their data is deleted in the '
+              'background.') % {'user': obj},
+            messages.WARNING,
+        )
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            self.delete_model(request, user)
+
     add_fieldsets = (
         (None, {
             'classes': ('wide',),
@@ -34,7 +141,118 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+
+class OwnerRawIdWidget(ForeignKeyRawIdWidget):
+    """Raw id widget whose lookup popup lists only the owner's objects"""
+
+    def __init__(self, rel, admin_site, owner_id=None, **kwargs):
+        super().__init__(rel, admin_site, **kwargs)
+        self.owner_id = owner_id
+
+    def url_parameters(self):
+        params = super().url_parameters()
+        if self.owner_id is not None:
+            params[UserFilter.parameter_name] = self.owner_id
+        return params
+
+
+class RecipeLinkFormSet(BaseInlineFormSet):
+    """Only accept tags and ingredients of the recipe owner"""
+
+    def clean(self):
+        super().clean()
+        field = self.owned_field
+        for form in self.forms:
+            obj = form.cleaned_data.get(field)
+            if obj is not None and obj.user_id != self.instance.user_id:
+                form.add_error(
+                    field,
+                    _('Must belong to the owner of the recipe.'),
+                )
+
+
+class RecipeLinkInline(admin.TabularInline):
+    """Tag or ingredient links edited by id, scoped to the recipe owner"""
+    formset = RecipeLinkFormSet
+    extra = 0
+
+    def get_formset(self, request, obj=None, **kwargs):
+        #The factory builds new form and formset classes on every call
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.owned_field = self.owned_field
+        formset.form.base_fields[self.owned_field].widget = OwnerRawIdWidget(
+            self.model._meta.get_field(self.owned_field).remote_field,
+            self.admin_site,
+            owner_id=obj.user_id if obj else None,
+        )
+        return formset
+
+
+class RecipeTagInline(RecipeLinkInline):
+    model = models.RecipeTag
+    owned_field = 'tag'
+    fields = ['tag']
+    raw_id_fields = ['tag']
+
+
+class RecipeIngredientInline(RecipeLinkInline):
+    model = models.RecipeIngredient
+    owned_field = 'ingredient'
+    fields = ['ingredient']
+    raw_id_fields = ['ingredient']
+
+
+class RecipeAdmin(OwnedAdmin):
+    inlines = [RecipeTagInline, RecipeIngredientInline]
+    list_display = ['title', 'owner', 'time_minutes', 'price']
+    readonly_fields = ['ingredient_count']
+    #Backed by trigram indexes, see migration 0012_admin_search_indexes
+    search_fields = ['title']
+
+    def save_formset(self, request, form, formset, change):
+        """Save tag/ingredient links in bulk with the recipe owner on them"""
+        recipe = form.instance
+        links = formset.save(commit=False)
+        for link in links:
+            link.user_id = recipe.user_id
+            if not link._state.adding:
+                link.save()
+        formset.model.objects.bulk_create(
+            [link for link in links if link._state.adding],
+        )
+        deleted = [link.pk for link in formset.deleted_objects]
+        if deleted:
+            models.delete_links(
+                formset.model,
+                formset.model.objects.filter(
+                    user_id=recipe.user_id,
+                    pk__in=deleted,
+                ),
+            )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        #Link rows saved here bypass the M2M managers that touch the recipe,
+        #delta sync and the caches keyed on updated_at need the change
+        if any(formset.has_changed() for formset in formsets):
+            models.Recipe.objects.filter(pk=form.instance.pk).update(
+                updated_at=timezone.now(),
+            )
+
+
+class TagAdmin(OwnedAdmin):
+    list_display = ['name', 'owner', 'recipe_count']
+    readonly_fields = ['recipe_count']
+    search_fields = ['name']
+
+
+class IngredientAdmin(OwnedAdmin):
+    list_display = ['name', 'owner', 'recipe_count']
+    readonly_fields = ['recipe_count']
+    search_fields = ['name']
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
\ No newline at end of file
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
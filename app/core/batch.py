@@ -0,0 +1,151 @@
+"""
+Several API calls in one request
+
+The batch request is authenticated once. Each sub-request is resolved
+against ROOT_URLCONF and handed straight to its view, without running the
+middleware a second time. It carries the batch's user and token, which
+BatchTokenAuthentication on the API views picks up instead of looking the
+token up again. Sub-requests run in order in the batch's thread and on its
+database connection. When the batch asks for it and every sub-request is
+a GET, they run concurrently, see run().
+"""
+
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.exception import response_for_exception
+from django.db import connection
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve, reverse
+from rest_framework.authentication import TokenAuthentication
+
+logger = logging.getLogger(__name__)
+
+#Request headers a sub-request keeps from the batch request
+_DROPPED_META = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'QUERY_STRING',
+                 'wsgi.input')
+
+
+class BatchError(ValueError):
+    """A sub-request that can't be dispatched"""
+
+
+class BatchTokenAuthentication(TokenAuthentication):
+    """Token authentication that trusts the batch a sub-request came from"""
+
+    def authenticate(self, request):
+        #Only build_request() sets it, nothing from the client can
+        batch_auth = getattr(request, 'batch_auth', None)
+        if batch_auth is not None:
+            return batch_auth
+        return super().authenticate(request)
+
+
+def check_path(path):
+    """Only API routes other than the batch itself can be batched"""
+    path = urlsplit(path).path
+    if not path.startswith('/api/') or path == reverse('batch'):
+        raise BatchError(f'{path} is not a batchable API route')
+
+
+def build_request(request, method, path, body=None):
+    """HttpRequest for a sub-request of the (DRF) batch request"""
+    url = urlsplit(path)
+    sub = HttpRequest()
+    sub.method = method
+    sub.path = sub.path_info = url.path
+    sub.META = {
+        key: value for key, value in request.META.items()
+        if key not in _DROPPED_META
+    }
+    sub.META.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'HTTP_ACCEPT': 'application/json',
+    })
+    sub.GET = QueryDict(url.query)
+    content = b'' if body is None else json.dumps(body).encode()
+    if content:
+        sub.META['CONTENT_TYPE'] = 'application/json'
+        sub.META['CONTENT_LENGTH'] = str(len(content))
+    sub._stream = io.BytesIO(content)
+    sub._read_started = False
+
+    #Read by BatchTokenAuthentication through the DRF request's proxying
+    sub.batch_auth = (request.user, request.auth)
+    return sub
+
+
+def _body(response):
+    if not response.content:
+        return None
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content)
+    return response.content.decode(response.charset)
+
+
+def dispatch(request, method, path, body=None):
+    """{status, headers, body} of one sub-request"""
+    sub = build_request(request, method, path, body)
+    try:
+        match = resolve(sub.path_info)
+        sub.resolver_match = match
+        response = match.func(sub, *match.args, **match.kwargs)
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+    except Resolver404:
+        return {'status': 404, 'headers': {}, 'body': None}
+    except Exception as e:
+        #Same status and logging as an exception in a standalone request
+        response = response_for_exception(sub, e)
+
+    if response.streaming:
+        response.close()
+        return {
+            'status': 400,
+            'headers': {},
+            'body': {'detail': 'Streaming responses cannot be batched'},
+        }
+    return {
+        'status': response.status_code,
+        'headers': dict(response.items()),
+        'body': _body(response),
+    }
+
+
+def _dispatch_in_thread(request, method, path, body):
+    try:
+        return dispatch(request, method, path, body)
+    finally:
+        connection.close()
+
+
+def run(request, subrequests, concurrent=False):
+    """Responses of the sub-requests, in order
+
+    Sequential sub-requests share the batch's database connection. The
+    concurrent path deliberately does not: a Django connection can't be
+    used from several threads at once, so each worker thread opens its own
+    and closes it when done. Concurrency is only offered for GETs, which
+    need no shared transaction, and is bounded by BATCH_MAX_CONCURRENCY.
+    """
+    if concurrent and len(subrequests) > 1 and all(
+        sub['method'] == 'GET' for sub in subrequests
+    ):
+        workers = min(settings.BATCH_MAX_CONCURRENCY, len(subrequests))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                lambda sub: _dispatch_in_thread(
+                    request, sub['method'], sub['path'], sub.get('body'),
+                ),
+                subrequests,
+            ))
+    return [
+        dispatch(request, sub['method'], sub['path'], sub.get('body'))
+        for sub in subrequests
+    ]
@@ -0,0 +1,359 @@
+"""
+Latency and throughput benchmark for the API
+
+Seeds a reproducible dataset, serves the app from an in-process WSGI
+server and drives each endpoint with a fixed number of concurrent clients
+using only the standard library. Results are plain JSON so a run can be
+compared against a saved baseline.
+
+compare_middleware() times the same requests in-process with Django's
+session, CSRF, auth and messages middleware and with the Browser*
+variants that skip them for the API, to show the per-request saving.
+"""
+
+import http.client
+import io
+import json
+import random
+import statistics
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client
+from django.test.client import encode_multipart
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from core.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+BENCHMARK_PASSWORD = 'benchmark-pass-123'
+BOUNDARY = 'BenchmarkBoundary'
+
+#The API-skipping middleware and the Django classes they extend
+FULL_MIDDLEWARE = {
+    'core.middleware.BrowserSessionMiddleware':
+        'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.BrowserCsrfViewMiddleware':
+        'django.middleware.csrf.CsrfViewMiddleware',
+    'core.middleware.BrowserAuthenticationMiddleware':
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.BrowserMessageMiddleware':
+        'django.contrib.messages.middleware.MessageMiddleware',
+}
+
+Endpoint = namedtuple('Endpoint', ['name', 'method', 'path', 'body', 'auth'])
+
+
+def _json_body(payload):
+    return json.dumps(payload).encode(), 'application/json'
+
+
+def _image_body():
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    buffer.seek(0)
+    buffer.name = 'benchmark.jpg'
+    body = encode_multipart(BOUNDARY, {'image': buffer})
+    return body, f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def endpoints(recipe_id):
+    """Endpoints exercised by the benchmark, keyed by name"""
+    return {
+        'recipes': Endpoint(
+            'recipes', 'GET', reverse('recipe:recipe-list'), None, True,
+        ),
+        'tags': Endpoint(
+            'tags', 'GET', reverse('recipe:tag-list'), None, True,
+        ),
+        'ingredients': Endpoint(
+            'ingredients', 'GET', reverse('recipe:ingredient-list'),
+            None, True,
+        ),
+        'token': Endpoint(
+            'token', 'POST', reverse('user:token'),
+            _json_body({
+                'email': BENCHMARK_EMAIL,
+                'password': BENCHMARK_PASSWORD,
+            }),
+            False,
+        ),
+        'upload-image': Endpoint(
+            'upload-image', 'POST',
+            reverse('recipe:recipe-upload-image', args=[recipe_id]),
+            _image_body(), True,
+        ),
+    }
+
+
+def seed_dataset(recipes=200, tags=20, ingredients=50, tags_per_recipe=3,
+                 ingredients_per_recipe=5, seed=0):
+    """Create the benchmark user and library, return (user, token)"""
+    rng = random.Random(seed)
+    user = get_user_model().objects.create_user(
+        BENCHMARK_EMAIL,
+        BENCHMARK_PASSWORD,
+    )
+    token = Token.objects.create(user=user)
+
+    tag_objs = Tag.objects.bulk_create(
+        Tag(user=user, name=f'Tag {i}') for i in range(tags)
+    )
+    ingredient_objs = Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f'Ingredient {i}')
+        for i in range(ingredients)
+    )
+    recipe_objs = Recipe.objects.bulk_create(
+        Recipe(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=rng.randint(5, 180),
+            price=Decimal(rng.randint(100, 5000)) / 100,
+        )
+        for i in range(recipes)
+    )
+
+    RecipeTag.objects.bulk_create(
+        RecipeTag(user=user, recipe=recipe, tag=tag)
+        for recipe in recipe_objs
+        for tag in rng.sample(tag_objs, min(tags_per_recipe, tags))
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(user=user, recipe=recipe, ingredient=ingredient)
+        for recipe in recipe_objs
+        for ingredient in rng.sample(
+            ingredient_objs,
+            min(ingredients_per_recipe, ingredients),
+        )
+    )
+
+    return user, token
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class BenchmarkServer:
+    """The Django app served from a background thread"""
+
+    def __init__(self, application=None):
+        self.server = make_server(
+            '127.0.0.1', 0,
+            application or WSGIHandler(),
+            server_class=_ThreadingWSGIServer,
+            handler_class=_QuietHandler,
+        )
+        self.port = self.server.server_port
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            daemon=True,
+        )
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of samples"""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _request(port, endpoint, token_key):
+    headers = {'Host': '127.0.0.1'}
+    body = None
+    if endpoint.body:
+        body, headers['Content-Type'] = endpoint.body
+    if endpoint.auth:
+        headers['Authorization'] = f'Token {token_key}'
+
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    started = time.perf_counter()
+    try:
+        conn.request(endpoint.method, endpoint.path, body=body,
+                     headers=headers)
+        response = conn.getresponse()
+        response.read()
+        ok = response.status < 400
+    except OSError:
+        ok = False
+    finally:
+        conn.close()
+    return time.perf_counter() - started, ok
+
+
+def _client_call(client, endpoint):
+    kwargs = {}
+    if endpoint.body:
+        body, content_type = endpoint.body
+        kwargs = {'data': body, 'content_type': content_type}
+    return getattr(client, endpoint.method.lower())(endpoint.path, **kwargs)
+
+
+def count_queries(endpoint, token_key):
+    """Queries issued by one in-process request to endpoint"""
+    client = Client(HTTP_AUTHORIZATION=f'Token {token_key}')
+    with CaptureQueriesContext(connection) as queries:
+        _client_call(client, endpoint)
+    return len(queries)
+
+
+def compare_middleware(token, recipe_id, names=None, requests=200,
+                       log=None):
+    """Median in-process time per endpoint with the full and lean stacks"""
+    log = log or (lambda message: None)
+    selected = endpoints(recipe_id)
+    if names:
+        selected = {name: selected[name] for name in names}
+    stacks = {
+        'full': [FULL_MIDDLEWARE.get(path, path)
+                 for path in settings.MIDDLEWARE],
+        'lean': list(settings.MIDDLEWARE),
+    }
+
+    # A client loads the middleware on its first request and keeps it
+    clients = {}
+    for stack, middleware in stacks.items():
+        with override_settings(MIDDLEWARE=middleware):
+            clients[stack] = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+            _client_call(clients[stack], next(iter(selected.values())))
+
+    results = {}
+    for name, endpoint in selected.items():
+        samples = {stack: [] for stack in clients}
+        for stack, client in clients.items():
+            _client_call(client, endpoint)
+        # Alternating the stacks spreads any drift over both equally
+        for _ in range(requests):
+            for stack, client in clients.items():
+                started = time.perf_counter()
+                _client_call(client, endpoint)
+                samples[stack].append(
+                    (time.perf_counter() - started) * 1000
+                )
+        timings = {
+            stack: round(statistics.median(times), 3)
+            for stack, times in samples.items()
+        }
+        timings['saving_ms'] = round(timings['full'] - timings['lean'], 3)
+        results[name] = timings
+        log(
+            f'{name:<14} full={timings["full"]}ms '
+            f'lean={timings["lean"]}ms saving={timings["saving_ms"]}ms'
+        )
+    return results
+
+
+def run_endpoint(port, endpoint, token_key, concurrency, requests):
+    """Drive endpoint with concurrency clients for requests calls"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(
+            lambda _: _request(port, endpoint, token_key),
+            range(requests),
+        ))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for latency, ok in samples]
+    return {
+        'requests': requests,
+        'errors': sum(1 for latency, ok in samples if not ok),
+        'rps': round(requests / elapsed, 2),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+
+def run_benchmark(token, recipe_id, names=None, concurrency=(1, 8),
+                  requests=200, log=None):
+    """Benchmark every endpoint at every concurrency level"""
+    log = log or (lambda message: None)
+    selected = endpoints(recipe_id)
+    if names:
+        selected = {name: selected[name] for name in names}
+
+    results = {}
+    with BenchmarkServer() as server:
+        for name, endpoint in selected.items():
+            # Warm up caches and connections before timing
+            _request(server.port, endpoint, token.key)
+            results[name] = {
+                'queries': count_queries(endpoint, token.key),
+                'concurrency': {},
+            }
+            for level in concurrency:
+                stats = run_endpoint(
+                    server.port, endpoint, token.key, level, requests,
+                )
+                results[name]['concurrency'][str(level)] = stats
+                log(
+                    f'{name:<14} c={level:<3} rps={stats["rps"]:<9} '
+                    f'p50={stats["p50_ms"]}ms p95={stats["p95_ms"]}ms '
+                    f'p99={stats["p99_ms"]}ms '
+                    f'queries={results[name]["queries"]} '
+                    f'errors={stats["errors"]}'
+                )
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """List regressions of results against a baseline run"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: queries {previous["queries"]} -> '
+                f'{current["queries"]}'
+            )
+        for level, stats in current['concurrency'].items():
+            before = previous['concurrency'].get(level)
+            if before is None:
+                continue
+            if stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f'{name} c={level}: p95 {before["p95_ms"]}ms -> '
+                    f'{stats["p95_ms"]}ms'
+                )
+            if stats['rps'] < before['rps'] * (1 - tolerance):
+                regressions.append(
+                    f'{name} c={level}: rps {before["rps"]} -> '
+                    f'{stats["rps"]}'
+                )
+    return regressions
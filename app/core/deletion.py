@@ -0,0 +1,207 @@
+"""
+Batched deletion of users and recipes
+
+Model.delete() runs Django's collector, which loads every related row into
+memory before deleting anything, all in one long transaction. Here links,
+recipes, tags and ingredients are removed with plain DELETE statements in
+batches of DELETION_BATCH_SIZE ids, each batch in its own short transaction.
+Batches are idempotent, so an interrupted job can simply be run again.
+Raw deletes skip the delete receivers, so recipe_count updates and
+tombstones are written here, and the library statistics adjusted.
+"""
+
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+
+from core import stats
+from core.models import (
+    DeletionJob,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeStat,
+    RecipeTag,
+    Tag,
+    Tombstone,
+    adjust_recipe_counts,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _raw_delete(queryset):
+    # A single DELETE without the collector, dependents are removed first
+    return queryset._raw_delete(queryset.db)
+
+
+def _id_batches(queryset, batch_size):
+    """Lists of at most batch_size ids until the queryset is empty"""
+    while True:
+        ids = list(
+            queryset.order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+
+
+def _uncount_links(model, links):
+    # Raw deletes skip the recipe_count receivers
+    field = f'{model.target_field}_id'
+    removed = links.order_by().values_list(field).annotate(n=Count('pk'))
+    adjust_recipe_counts(model, {target: -n for target, n in removed})
+
+
+def delete_recipes(user, recipe_ids=None, batch_size=None, progress=None,
+                   update_counts=True, tombstones=True):
+    """Delete the user's recipes (all, or those in recipe_ids) in batches"""
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    progress = progress or (lambda count: None)
+    recipes = Recipe.objects.filter(user=user)
+    if recipe_ids is None:
+        selections = [recipes]
+    else:
+        selections = [
+            recipes.filter(id__in=recipe_ids[start:start + batch_size])
+            for start in range(0, len(recipe_ids), batch_size)
+        ]
+
+    deleted = 0
+    for selection in selections:
+        for ids in _id_batches(selection, batch_size):
+            with transaction.atomic():
+                count = 0
+                for model in (RecipeTag, RecipeIngredient):
+                    links = model.objects.filter(user=user, recipe_id__in=ids)
+                    if update_counts:
+                        _uncount_links(model, links)
+                    count += _raw_delete(links)
+                batch = Recipe.objects.filter(user=user, id__in=ids)
+                if update_counts:
+                    stats.apply(user.id, stats.deltas(
+                        batch.values_list('price', 'time_minutes',
+                                          'created_at'),
+                        sign=-1,
+                    ))
+                recipe_count = _raw_delete(batch)
+                if tombstones:
+                    Tombstone.objects.bulk_create(
+                        Tombstone(
+                            user=user,
+                            kind=Tombstone.RECIPE,
+                            object_id=recipe_id,
+                        )
+                        for recipe_id in ids
+                    )
+            deleted += recipe_count
+            progress(count + recipe_count)
+    return deleted
+
+
+def _delete_owned(model, link_model, field, user, batch_size, progress):
+    for ids in _id_batches(model.objects.filter(user=user), batch_size):
+        with transaction.atomic():
+            count = _raw_delete(
+                link_model.objects.filter(**{f'{field}__in': ids})
+            )
+            count += _raw_delete(model.objects.filter(id__in=ids))
+        progress(count)
+
+
+def delete_user(user, batch_size=None, progress=None):
+    """Delete a user and everything they own in bounded batches"""
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    progress = progress or (lambda count: None)
+
+    #The user's tags and ingredients go next, their counts don't matter
+    #and there is no client left to sync
+    delete_recipes(
+        user,
+        batch_size=batch_size,
+        progress=progress,
+        update_counts=False,
+        tombstones=False,
+    )
+    _delete_owned(Tag, RecipeTag, 'tag', user, batch_size, progress)
+    _delete_owned(
+        Ingredient, RecipeIngredient, 'ingredient', user, batch_size,
+        progress,
+    )
+    for model in (Tombstone, RecipeStat):
+        for ids in _id_batches(model.objects.filter(user=user), batch_size):
+            progress(_raw_delete(model.objects.filter(id__in=ids)))
+    #Only small tables like tokens and jobs are left for the collector
+    count, _ = user.delete()
+    progress(count)
+
+
+def run_job(job):
+    """Run a deletion job, recording progress and the outcome"""
+    job.status = DeletionJob.RUNNING
+    job.save(update_fields=['status', 'updated_at'])
+
+    def progress(count):
+        job.deleted += count
+        DeletionJob.objects.filter(id=job.id).update(deleted=job.deleted)
+
+    try:
+        if job.kind == DeletionJob.USER:
+            if job.user is not None:
+                delete_user(job.user, progress=progress)
+                #The collector already nulled the row's user
+                job.user = None
+        elif job.user is not None:
+            delete_recipes(job.user, job.recipe_ids, progress=progress)
+    except Exception as e:
+        job.status = DeletionJob.FAILED
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'deleted', 'updated_at'])
+        raise
+
+    job.status = DeletionJob.DONE
+    job.error = ''
+    job.save(update_fields=['status', 'error', 'deleted', 'updated_at'])
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(DeletionJob.objects.get(id=job_id))
+    except Exception:
+        logger.exception('Deletion job %s failed', job_id)
+    finally:
+        connection.close()
+
+
+def start_job(job, background=False):
+    """Run job now, or in a thread once the current transaction commits"""
+    if not background:
+        return run_job(job)
+
+    thread = threading.Thread(
+        target=_run_in_thread,
+        args=(job.id,),
+        daemon=True,
+    )
+    transaction.on_commit(thread.start)
+    return job
+
+
+def queue_user_deletion(user):
+    """Lock the user out now and delete their data in a background job"""
+    #The data goes batch by batch, the account is unusable at once
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    Token.objects.filter(user=user).delete()
+
+    job = DeletionJob.objects.create(
+        user=user,
+        email=user.email,
+        kind=DeletionJob.USER,
+    )
+    return start_job(job, background=True)
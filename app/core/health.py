@@ -0,0 +1,109 @@
+"""
+Readiness probes for the app
+
+Results are cached for HEALTH_CHECK_READINESS_TTL seconds so load balancer
+probes from many nodes never turn into a query per probe. The endpoint is
+public, so failures are logged and reported only as a fixed error code.
+"""
+
+import logging
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+CACHE_KEY = 'health:readiness'
+
+logger = logging.getLogger(__name__)
+
+_refresh_lock = threading.Lock()
+
+
+def check_database():
+    """Measure a round trip to the default database"""
+    started = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except DatabaseError:
+        logger.exception('Readiness: database check failed')
+        return {'ok': False, 'error': 'database_unavailable'}
+
+    return {
+        'ok': True,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def check_connection_pool():
+    """Compare open server connections to max_connections"""
+    if connection.vendor != 'postgresql':
+        return {'ok': True, 'saturation': None}
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*), current_setting('max_connections')::int "
+                "FROM pg_stat_activity WHERE datname = current_database()"
+            )
+            used, available = cursor.fetchone()
+    except DatabaseError:
+        logger.exception('Readiness: connection pool check failed')
+        return {'ok': False, 'error': 'database_unavailable'}
+
+    saturation = round(used / available, 3)
+    return {
+        'ok': saturation < settings.HEALTH_CHECK_MAX_DB_SATURATION,
+        'connections': used,
+        'max_connections': available,
+        'saturation': saturation,
+    }
+
+
+def check_media():
+    """Make sure uploaded images can be written"""
+    try:
+        with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT) as f:
+            f.write(b'ok')
+            f.flush()
+    except OSError:
+        logger.exception('Readiness: media check failed')
+        return {'ok': False, 'error': 'media_unwritable'}
+
+    return {'ok': True}
+
+
+def check_readiness():
+    """Run every probe and return the combined result"""
+    checks = {
+        'database': check_database(),
+        'connection_pool': check_connection_pool(),
+        'media': check_media(),
+    }
+    return {
+        'ready': all(check['ok'] for check in checks.values()),
+        'checks': checks,
+        'checked_at': timezone.now().isoformat(),
+    }
+
+
+def readiness():
+    """Return the cached readiness result, refreshing it once per TTL"""
+    result = cache.get(CACHE_KEY)
+    if result is None:
+        # Only one thread per process refreshes, the rest wait for its result
+        with _refresh_lock:
+            result = cache.get(CACHE_KEY)
+            if result is None:
+                result = check_readiness()
+                cache.set(
+                    CACHE_KEY,
+                    result,
+                    settings.HEALTH_CHECK_READINESS_TTL,
+                )
+    return result
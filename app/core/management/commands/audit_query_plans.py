@@ -0,0 +1,125 @@
+"""
+Django command to audit the query plans of every API route
+"""
+
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    teardown_databases,
+)
+
+from core import benchmark, plan_audit, seeding
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the SQL of every API route on a seeded throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=500,
+            help="Recipes of the audited user",
+        )
+        parser.add_argument(
+            '--background-users',
+            type=int,
+            default=50,
+            help="Other users seeded so tables have realistic sizes",
+        )
+        parser.add_argument(
+            '--background-recipes',
+            type=int,
+            default=20000,
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=1000,
+            help="Ignore sequential scans reading fewer rows",
+        )
+        parser.add_argument(
+            '--max-findings',
+            type=int,
+            help="Fail when the audit reports more findings than this",
+        )
+        parser.add_argument('--output', help="Write the JSON report here")
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        # Runs in a test database so the seeded rows never touch real data
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(
+                        ALLOWED_HOSTS=['testserver'],
+                        MEDIA_ROOT=media_root,
+                        IMPORT_UPLOAD_ROOT=media_root,
+                        SQL_PROFILER_SAMPLE_RATE=0,
+                    ):
+                report = self.run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        for name, results in report['routes'].items():
+            for result in results:
+                for finding in result['findings']:
+                    self.stdout.write(
+                        f"{result['method']} {result['path']}: "
+                        f"{finding['kind']}"
+                        + (
+                            f" on {finding['table']} ({finding['rows']} rows)"
+                            if finding['table']
+                            else f" ({finding['detail']})"
+                        )
+                        + (
+                            f", try an index on {finding['suggested_index']}"
+                            if finding['suggested_index'] else ''
+                        )
+                    )
+        for name in report['uncovered']:
+            self.stdout.write(self.style.WARNING(f"Not audited: {name}"))
+
+        limit = options['max_findings']
+        if limit is not None and report['findings'] > limit:
+            raise CommandError(
+                f"{report['findings']} query plan findings, "
+                f"at most {limit} allowed"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['findings']} query plan findings"
+        ))
+
+    def run(self, options):
+        user, token = benchmark.seed_dataset(
+            recipes=options['recipes'],
+            seed=options['seed'],
+        )
+        if options['background_users']:
+            seeding.seed(
+                users=options['background_users'],
+                recipes=options['background_recipes'],
+                seed=options['seed'],
+            )
+        if connection.vendor == 'postgresql':
+            # Planner statistics for the freshly loaded tables
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        return plan_audit.run_audit(
+            user,
+            benchmark.BENCHMARK_PASSWORD,
+            token.key,
+            min_rows=options['min_rows'],
+            log=self.stdout.write,
+        )
@@ -0,0 +1,123 @@
+"""
+Django command to benchmark API latency and throughput
+"""
+
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    teardown_databases,
+)
+
+from core import benchmark
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',')]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the API against a seeded throwaway database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoints',
+            type=lambda value: value.split(','),
+            help="Comma separated subset of: recipes, tags, ingredients, "
+                 "token, upload-image",
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=_int_list,
+            default=[1, 8],
+            help="Comma separated concurrency levels",
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write JSON results here")
+        parser.add_argument(
+            '--baseline',
+            help="Fail if results regress against this results file",
+        )
+        parser.add_argument(
+            '--compare-middleware',
+            action='store_true',
+            help="Also time each endpoint with Django's full session, "
+                 "CSRF, auth and messages middleware",
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help="Allowed relative p95/rps change against the baseline",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        # Runs in a test database so the seeded rows never touch real data
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(
+                        ALLOWED_HOSTS=['127.0.0.1', 'testserver'],
+                        MEDIA_ROOT=media_root,
+                        SQL_PROFILER_SAMPLE_RATE=0,
+                    ):
+                results = self.run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = benchmark.compare(
+                results['endpoints'],
+                baseline['endpoints'],
+                options['tolerance'],
+            )
+            if regressions:
+                raise CommandError(
+                    "Benchmark regressions:\n" + "\n".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def run(self, options):
+        dataset = {
+            'recipes': options['recipes'],
+            'tags': options['tags'],
+            'ingredients': options['ingredients'],
+            'seed': options['seed'],
+        }
+        user, token = benchmark.seed_dataset(**dataset)
+        recipe_id = user.recipe_set.values_list('id', flat=True).first()
+
+        results = {
+            'dataset': dataset,
+            'endpoints': benchmark.run_benchmark(
+                token,
+                recipe_id,
+                names=options['endpoints'],
+                concurrency=options['concurrency'],
+                requests=options['requests'],
+                log=self.stdout.write,
+            ),
+        }
+        if options['compare_middleware']:
+            results['middleware'] = benchmark.compare_middleware(
+                token,
+                recipe_id,
+                names=options['endpoints'],
+                requests=options['requests'],
+                log=self.stdout.write,
+            )
+        return results
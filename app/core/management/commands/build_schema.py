@@ -0,0 +1,24 @@
+"""
+Django command to prebuild the OpenAPI schema served by the API
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.schema import build_schema
+
+
+class Command(BaseCommand):
+    help = "Write the OpenAPI schema to versioned static files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir',
+            help="Directory to write to (default: settings.SCHEMA_DIR)",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        manifest = build_schema(options['output_dir'])
+        for entry in manifest.values():
+            self.stdout.write(f"Wrote {entry['file']}")
+        self.stdout.write(self.style.SUCCESS("Schema built"))
@@ -0,0 +1,54 @@
+"""
+Django command to stream a user's recipe library to a file
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe import export
+
+
+class Command(BaseCommand):
+    help = "Export a user's recipes with tags and ingredients"
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help="Owner of the recipes")
+        parser.add_argument(
+            '--format',
+            choices=export.FORMATS,
+            default='ndjson',
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help="File to write, '-' for stdout",
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+        if options['gzip'] and options['output'] == '-':
+            raise CommandError("--gzip needs --output")
+
+        stream = export.export_stream(
+            user,
+            options['format'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+        )
+        if options['output'] == '-':
+            for data in stream:
+                self.stdout.write(data.decode(), ending='')
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as f:
+            for data in stream:
+                f.write(data)
+                written += len(data)
+        self.stderr.write(f"Wrote {written} bytes to {options['output']}")
@@ -0,0 +1,67 @@
+"""
+Django command to import recipes for a user from an NDJSON file
+"""
+
+import gzip
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ImportJob
+from recipe import importing
+
+
+class Command(BaseCommand):
+    help = "Import recipes from NDJSON, resuming an interrupted import"
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help="Owner of the imported recipes")
+        parser.add_argument('path', help="NDJSON file, may be gzipped")
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Start over instead of resuming an unfinished import",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+
+        path = options['path']
+        source = os.path.abspath(path)[-255:]
+        job = None
+        if not options['restart']:
+            job = ImportJob.objects.filter(
+                user=user,
+                source=source,
+                status=ImportJob.RUNNING,
+            ).order_by('-id').first()
+        if job is None:
+            job = ImportJob.objects.create(user=user, source=source)
+        else:
+            self.stdout.write(
+                f"Resuming import {job.id} after line {job.lines}"
+            )
+
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            try:
+                importing.run_import(
+                    job,
+                    f,
+                    batch_size=options['batch_size'],
+                    log=self.stdout.write,
+                )
+            except importing.ImportConflict as e:
+                raise CommandError(str(e))
+
+        for error in job.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {job.imported} recipes, {job.failed} lines failed"
+        ))
@@ -0,0 +1,42 @@
+"""
+Django command to hash partition the recipe tables by user
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.utils import NotSupportedError
+
+from core.partitioning import partition_recipe_tables
+
+
+class Command(BaseCommand):
+    help = "Hash partition core_recipe and its M2M tables by user_id"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=settings.RECIPE_HASH_PARTITIONS or 16,
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--keep-old',
+            action='store_true',
+            help="Keep the unpartitioned tables as <table>_unpartitioned",
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        try:
+            partition_recipe_tables(
+                options['partitions'],
+                batch_size=options['batch_size'],
+                keep_old=options['keep_old'],
+                using=options['database'],
+                log=self.stdout.write,
+            )
+        except (NotSupportedError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS("Recipe tables partitioned"))
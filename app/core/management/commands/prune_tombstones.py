@@ -0,0 +1,28 @@
+"""
+Django command to delete the tombstones delta sync no longer needs
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe import sync
+
+
+class Command(BaseCommand):
+    help = "Delete tombstones older than SYNC_TOMBSTONE_DAYS"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.SYNC_TOMBSTONE_DAYS,
+        )
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        pruned = sync.prune_tombstones(
+            days=options['days'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{pruned} tombstones pruned"))
@@ -0,0 +1,26 @@
+"""
+Django command to recompute the library statistics rollup rows
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import stats
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Recompute the RecipeStat rows of every user, or of one"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help="Only rebuild this user")
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        users = User.objects.order_by('id')
+        if options['email']:
+            users = users.filter(email=options['email'])
+        rebuilt = 0
+        for user in users.iterator():
+            stats.rebuild(user)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"{rebuilt} users rebuilt"))
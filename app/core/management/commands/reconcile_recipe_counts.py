@@ -0,0 +1,89 @@
+"""
+Django command to repair drift in the maintained link counts
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import (
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    recount_ingredient_counts,
+    recount_recipe_counts,
+)
+
+
+class Command(BaseCommand):
+    help = ("Compare recipe_count and ingredient_count with the link rows "
+            "and fix differences")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report the drift",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        for link_model in (RecipeTag, RecipeIngredient):
+            field = link_model.target_field
+            drifted = self.reconcile(
+                link_model.target_model().objects.order_by('id'),
+                'recipe_count',
+                link_model.objects.filter(**{field: OuterRef('pk')}),
+                field,
+                lambda targets, link_model=link_model: recount_recipe_counts(
+                    link_model, targets,
+                ),
+                options['batch_size'],
+                options['dry_run'],
+            )
+            name = link_model.target_model()._meta.verbose_name_plural
+            self.stdout.write(f"{name}: {drifted} with a wrong recipe_count")
+
+        drifted = self.reconcile(
+            Recipe.objects.order_by('id'),
+            'ingredient_count',
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk')),
+            'recipe',
+            recount_ingredient_counts,
+            options['batch_size'],
+            options['dry_run'],
+        )
+        self.stdout.write(f"recipes: {drifted} with a wrong ingredient_count")
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS("Counts reconciled"))
+
+    def reconcile(self, targets, count_field, links, group_by, recount,
+                  batch_size, dry_run):
+        """Check targets in id batches, return how many had drifted"""
+        links = links.order_by().values(group_by).annotate(
+            n=Count('pk'),
+        ).values('n')
+
+        drifted = 0
+        last_id = 0
+        while True:
+            ids = list(
+                targets.filter(id__gt=last_id)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return drifted
+            last_id = ids[-1]
+
+            wrong = list(
+                targets.filter(id__gte=ids[0], id__lte=ids[-1])
+                .annotate(actual=Coalesce(Subquery(links), 0))
+                .exclude(**{count_field: F('actual')})
+                .values_list('id', flat=True)
+            )
+            drifted += len(wrong)
+            #The recount reads the links at update time, so races are fine
+            if wrong and not dry_run:
+                recount(targets.filter(id__in=wrong))
@@ -0,0 +1,46 @@
+"""
+Django command to run pending or interrupted deletion jobs
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import deletion
+from core.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = "Run unfinished deletion jobs, optionally queueing a user first"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            help="Queue the deletion of this user before running the jobs",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        if options['email']:
+            try:
+                user = get_user_model().objects.get(email=options['email'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['email']}")
+            DeletionJob.objects.create(
+                user=user,
+                email=user.email,
+                kind=DeletionJob.USER,
+            )
+
+        jobs = DeletionJob.objects.exclude(
+            status=DeletionJob.DONE,
+        ).order_by('id')
+        for job in jobs:
+            self.stdout.write(f"Running {job}...")
+            try:
+                deletion.run_job(job)
+            except Exception as e:
+                self.stderr.write(f"Job {job.id} failed: {e}")
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"Job {job.id} deleted {job.deleted} rows"
+            ))
@@ -0,0 +1,71 @@
+"""
+Django command to fill the database with synthetic recipe libraries
+"""
+
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.seeding import seed
+
+
+class Command(BaseCommand):
+    help = "Generate users, recipes, tags and ingredients at scale"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags-per-user', type=int, default=30)
+        parser.add_argument('--ingredients-per-user', type=int, default=100)
+        parser.add_argument(
+            '--tags-per-recipe',
+            type=int,
+            default=3,
+            help="Maximum tags per recipe",
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=8,
+            help="Maximum ingredients per recipe",
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help="Zipf exponent for library sizes and tag/ingredient "
+                 "popularity",
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes (PostgreSQL only)",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='seedpass123')
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        result = seed(
+            users=options['users'],
+            recipes=options['recipes'],
+            tags_per_user=options['tags_per_user'],
+            ingredients_per_user=options['ingredients_per_user'],
+            tags_per_recipe=options['tags_per_recipe'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            skew=options['skew'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            seed=options['seed'],
+            password=options['password'],
+            log=self.stdout.write,
+        )
+
+        for table, count in result['rows'].items():
+            self.stdout.write(f"{table:<20} {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded in {result['seconds']} sec "
+            f"({result['rows_per_second']} rows/sec)"
+        ))
@@ -0,0 +1,49 @@
+"""
+Django command to run the container startup steps and time each one
+"""
+
+import json
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+# (command, options) run in order before the app server starts
+PHASES = [
+    ('wait_for_db', {}),
+    ('collectstatic', {'interactive': False}),
+    ('build_schema', {}),
+    ('migrate', {'interactive': False}),
+]
+
+
+class Command(BaseCommand):
+    help = "Run the startup phases and report how long each one took"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report-file',
+            help="Also write the JSON report to this path",
+        )
+
+    def handle(self, *args, **options):
+        """EntryPoint for command"""
+        started = time.monotonic()
+        phases = []
+
+        for name, phase_options in PHASES:
+            phase_started = time.monotonic()
+            call_command(name, **phase_options)
+            phases.append({
+                'name': name,
+                'seconds': round(time.monotonic() - phase_started, 4),
+            })
+
+        report = json.dumps({
+            'phases': phases,
+            'seconds': round(time.monotonic() - started, 4),
+        })
+        if options['report_file']:
+            with open(options['report_file'], 'w') as f:
+                f.write(report)
+        self.stdout.write(report)
@@ -2,25 +2,114 @@
 Django COmmand to wait for db to be available
 """
 
+import json
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 from psycopg2 import OperationalError as Psycog2Error
+from django.db import connections
 from django.db.utils import OperationalError
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
+    help = "Wait until every configured database accepts connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help="Alias to probe, may be repeated (default: all aliases)",
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60.0,
+            help="Give up after this many seconds",
+        )
+        parser.add_argument('--initial-delay', type=float, default=0.1)
+        parser.add_argument('--max-delay', type=float, default=5.0)
+        parser.add_argument(
+            '--report',
+            action='store_true',
+            help="Print a JSON report of the probe timings",
+        )
+
+    def probe(self, alias):
+        """Open a connection to alias and run a trivial query"""
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        finally:
+            # Probes run in worker threads, don't leave connections behind
+            connection.close()
+
+    def wait_for(self, alias, deadline, initial_delay, max_delay):
+        """Probe alias with exponential backoff and full jitter"""
+        started = time.monotonic()
+        delay = initial_delay
+        attempts = 0
+
+        while True:
+            attempts += 1
+            try:
+                self.probe(alias)
+                available = True
+                break
+            except (Psycog2Error, OperationalError):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    available = False
+                    break
+                sleep = min(random.uniform(0, delay), remaining)
+                self.stdout.write(
+                    f"Database '{alias}' unavailable, "
+                    f"waiting {sleep:.2f} sec..."
+                )
+                time.sleep(sleep)
+                delay = min(delay * 2, max_delay)
+
+        return {
+            'available': available,
+            'attempts': attempts,
+            'seconds': round(time.monotonic() - started, 4),
+        }
 
     def handle(self, *args, **options):
         """EntryPoint for command"""
+        aliases = options['databases'] or list(connections)
         self.stdout.write("Waiting for database...")
-        db_up = False
+        started = time.monotonic()
+        deadline = started + options['timeout']
 
-        while db_up is False:
-            try:
-                self.check(databases=["default"])
-                db_up = True
-            except (Psycog2Error, OperationalError):
-                self.stdout.write("Database Unavailable, waiting 1 sec...")
-                time.sleep(1)
+        with ThreadPoolExecutor(max_workers=len(aliases)) as executor:
+            results = dict(zip(aliases, executor.map(
+                lambda alias: self.wait_for(
+                    alias,
+                    deadline,
+                    options['initial_delay'],
+                    options['max_delay'],
+                ),
+                aliases,
+            )))
+
+        if options['report']:
+            self.stdout.write(json.dumps({
+                'phase': 'wait_for_db',
+                'seconds': round(time.monotonic() - started, 4),
+                'databases': results,
+            }))
+
+        unavailable = [
+            alias for alias, result in results.items()
+            if not result['available']
+        ]
+        if unavailable:
+            raise CommandError(
+                f"Database unavailable after {options['timeout']} sec: "
+                f"{', '.join(unavailable)}"
+            )
         self.stdout.write(self.style.SUCCESS("Database Available"))
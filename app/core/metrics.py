@@ -0,0 +1,283 @@
+"""
+Prometheus-style request metrics
+
+Each process keeps its own counters in memory and, when METRICS_DIR is
+set, periodically writes a snapshot to METRICS_DIR/metrics-<pid>.json.
+The metrics endpoint sums the snapshots of every worker, so counts stay
+correct across the uwsgi worker processes without any shared locks.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+PREFIX = 'recipe_api'
+
+SECONDS_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        'Request latency per view', SECONDS_BUCKETS,
+    ),
+    'db_queries': ('Database queries per request', QUERY_BUCKETS),
+    'db_duration_seconds': (
+        'Time spent in database queries per request', SECONDS_BUCKETS,
+    ),
+    'serializer_duration_seconds': (
+        'Time spent building serializer output per request', SECONDS_BUCKETS,
+    ),
+    'response_bytes': ('Response body size', BYTES_BUCKETS),
+}
+COUNTERS = {
+    'requests_total': 'Requests per view, method and status',
+}
+
+# Per-request accumulator for the serializer timings
+_request_stats = ContextVar('metrics_request_stats', default=None)
+
+
+class Registry:
+    """In-process metric values for this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._next_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self._lock:
+            # One slot per bucket, then +Inf, sum and count
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(buckets) + 3)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(buckets)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self._counters.items()
+                ],
+                'histograms': [
+                    [name, list(labels), list(series)]
+                    for (name, labels), series in self._histograms.items()
+                ],
+            }
+
+    def maybe_flush(self):
+        """Write the snapshot file at most once per flush interval"""
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if now < self._next_flush:
+            return
+        self._next_flush = now + settings.METRICS_FLUSH_INTERVAL
+        self.flush()
+
+    def flush(self):
+        if not settings.METRICS_DIR:
+            return
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = _snapshot_path(os.getpid())
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f'{path}.tmp', path)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def _snapshot_path(pid):
+    return os.path.join(settings.METRICS_DIR, f'metrics-{pid}.json')
+
+
+def collect():
+    """Sum the snapshots of every worker process"""
+    snapshots = [registry.snapshot()]
+    if settings.METRICS_DIR:
+        own = _snapshot_path(os.getpid())
+        for path in glob.glob(_snapshot_path('*')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+    return counters, histograms
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    return ','.join(
+        '{}="{}"'.format(key, str(value).replace('"', '\\"'))
+        for key, value in pairs
+    )
+
+
+def render():
+    """Render the aggregated metrics in Prometheus text format"""
+    counters, histograms = collect()
+    lines = []
+
+    for name, description in COUNTERS.items():
+        lines.append(f'# HELP {PREFIX}_{name} {description}')
+        lines.append(f'# TYPE {PREFIX}_{name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(
+                    f'{PREFIX}_{name}{{{_format_labels(labels)}}} {value}'
+                )
+
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {PREFIX}_{name} {description}')
+        lines.append(f'# TYPE {PREFIX}_{name} histogram')
+        for (metric, labels), series in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(
+                    f'{PREFIX}_{name}_bucket'
+                    f'{{{_format_labels(labels, le=bound)}}} {cumulative}'
+                )
+            lines.append(
+                f'{PREFIX}_{name}_sum{{{_format_labels(labels)}}} '
+                f'{series[-2]}'
+            )
+            lines.append(
+                f'{PREFIX}_{name}_count{{{_format_labels(labels)}}} '
+                f'{series[-1]}'
+            )
+
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """Database and serializer timings gathered during one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper for the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record latency, queries, serializer time and size per view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        labels = (('view', view), ('method', request.method))
+        registry.inc(
+            'requests_total',
+            labels + (('status', str(response.status_code)),),
+        )
+        registry.observe('request_duration_seconds', labels, duration)
+        registry.observe('db_queries', labels, stats.queries)
+        registry.observe('db_duration_seconds', labels, stats.db_seconds)
+        registry.observe(
+            'serializer_duration_seconds',
+            labels,
+            stats.serializer_seconds,
+        )
+        if not response.streaming:
+            registry.observe('response_bytes', labels, len(response.content))
+        registry.maybe_flush()
+
+        return response
+
+
+@contextmanager
+def serializer_timer():
+    """Count the enclosed time towards the request's serializer time"""
+    stats = _request_stats.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.serializer_seconds += time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """Record time spent building .data for the metrics"""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """ListSerializer whose .data is timed, for Meta.list_serializer_class"""
@@ -0,0 +1,75 @@
+"""
+Middleware for the app
+"""
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+
+LIVENESS_BODY = b'{"healthy": true}'
+
+
+class HealthCheckMiddleware:
+    """Answer liveness probes before the rest of the middleware stack.
+
+    Should be first in MIDDLEWARE so probes skip sessions, CSRF, auth,
+    host validation and DRF entirely.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.path = settings.HEALTH_CHECK_LIVENESS_PATH
+
+    def __call__(self, request):
+        if request.path_info == self.path:
+            return HttpResponse(LIVENESS_BODY, content_type='application/json')
+        return self.get_response(request)
+
+
+class APIPassthroughMixin:
+    """Hand requests under API_PATH_PREFIX straight to the next middleware.
+
+    The API authenticates with tokens and never uses sessions, CSRF
+    cookies or messages, so that work is only done for the admin and
+    other browser pages. The subclasses stay subclasses of Django's
+    classes, which keeps the admin system checks satisfied.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.api_prefix = settings.API_PATH_PREFIX
+
+    def is_api(self, request):
+        return request.path_info.startswith(self.api_prefix)
+
+    def __call__(self, request):
+        #A coroutine under an async stack, awaited by the caller
+        if self.is_api(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class BrowserSessionMiddleware(APIPassthroughMixin, SessionMiddleware):
+    pass
+
+
+class BrowserCsrfViewMiddleware(APIPassthroughMixin, CsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        #The handler calls process_view directly, outside __call__
+        if self.is_api(request):
+            return None
+        return super().process_view(
+            request, callback, callback_args, callback_kwargs,
+        )
+
+
+class BrowserAuthenticationMiddleware(APIPassthroughMixin,
+                                      AuthenticationMiddleware):
+    pass
+
+
+class BrowserMessageMiddleware(APIPassthroughMixin, MessageMiddleware):
+    pass
@@ -0,0 +1,44 @@
+# Generated by Django 4.0.10 on 2026-10-19 09:00
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_user(apps, schema_editor):
+    """Copy the recipe owner onto the through rows in short batches"""
+    Recipe = apps.get_model('core', 'Recipe')
+    owner = Subquery(
+        Recipe.objects.filter(pk=OuterRef('recipe_id')).values('user_id')[:1]
+    )
+
+    for model_name in ('RecipeTag', 'RecipeIngredient'):
+        model = apps.get_model('core', model_name)
+        last_id = 0
+        while True:
+            ids = list(
+                model.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                break
+            model.objects.filter(
+                id__gte=ids[0],
+                id__lte=ids[-1],
+                user__isnull=True,
+            ).update(user_id=owner)
+            last_id = ids[-1]
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so the tables are never locked as a whole
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_recipe_link_through_models'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user, migrations.RunPython.noop),
+    ]
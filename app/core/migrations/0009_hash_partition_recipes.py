@@ -0,0 +1,29 @@
+# Generated by Django 4.0.10 on 2026-10-19 09:00
+
+from django.conf import settings
+from django.db import migrations
+
+from core.partitioning import partition_recipe_tables
+
+
+def partition_tables(apps, schema_editor):
+    """Partition the recipe tables when RECIPE_HASH_PARTITIONS is set"""
+    connection = schema_editor.connection
+    if settings.RECIPE_HASH_PARTITIONS and connection.vendor == 'postgresql':
+        partition_recipe_tables(
+            settings.RECIPE_HASH_PARTITIONS,
+            using=connection.alias,
+        )
+
+
+class Migration(migrations.Migration):
+    # Rows are copied in batches that commit individually
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_recipe_link_user_required'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
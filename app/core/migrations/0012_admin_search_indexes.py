@@ -0,0 +1,42 @@
+# Generated by Django 4.0.10 on 2026-10-19 09:30
+
+from django.db import migrations
+
+# Trigram indexes on the expressions Django's icontains compiles to, so the
+# admin search does not scan the tables
+SEARCH_INDEXES = [
+    ('core_recipe_title_trgm_idx', 'core_recipe', 'title'),
+    ('core_tag_name_trgm_idx', 'core_tag', 'name'),
+    ('core_ingredient_name_trgm_idx', 'core_ingredient', 'name'),
+    ('core_user_email_trgm_idx', 'core_user', 'email'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    """Add the trigram search indexes on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_deletion_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.0.10 on 2026-10-19 09:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def backfill_recipe_count(apps, schema_editor):
+    """Count the links of every tag and ingredient in short batches"""
+    for model_name, link_name, field in (
+        ('Tag', 'RecipeTag', 'tag'),
+        ('Ingredient', 'RecipeIngredient', 'ingredient'),
+    ):
+        model = apps.get_model('core', model_name)
+        link = apps.get_model('core', link_name)
+        links = link.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(n=Count('pk')).values('n')
+
+        last_id = 0
+        while True:
+            ids = list(
+                model.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:BATCH_SIZE]
+            )
+            if not ids:
+                break
+            model.objects.filter(id__gte=ids[0], id__lte=ids[-1]).update(
+                recipe_count=Coalesce(Subquery(links), 0),
+            )
+            last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so the tables are never locked as a whole
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            backfill_recipe_count,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count'], name='ingr_user_recipe_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count'], name='tag_user_recipe_count_idx'),
+        ),
+    ]
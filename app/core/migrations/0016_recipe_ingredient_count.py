@@ -0,0 +1,51 @@
+# Generated by Django 4.0.10 on 2026-10-19 09:37
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def backfill_ingredient_count(apps, schema_editor):
+    """Count the ingredient links of every recipe in short batches"""
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+    links = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk'),
+    ).order_by().values('recipe').annotate(n=Count('pk')).values('n')
+
+    last_id = 0
+    while True:
+        ids = list(
+            Recipe.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        Recipe.objects.filter(id__gte=ids[0], id__lte=ids[-1]).update(
+            ingredient_count=Coalesce(Subquery(links), 0),
+        )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so the table is never locked as a whole
+    atomic = False
+
+    dependencies = [
+        ('core', '0015_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            backfill_ingredient_count,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 4.0.10 on 2026-10-19 09:41
+
+import bisect
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import F
+
+BATCH_SIZE = 5000
+#settings.STATS_PRICE_BUCKET_CENTS and STATS_TIME_BUCKETS as of this
+#migration, so replaying it always gives the same rows
+PRICE_BUCKET_CENTS = 100
+TIME_BUCKETS = [0, 15, 30, 45, 60, 90, 120, 180, 240]
+
+
+def deltas(rows):
+    """Copy of core.stats.deltas() as of this migration"""
+    width = PRICE_BUCKET_CENTS
+    edges = TIME_BUCKETS
+    result = {}
+    for price, minutes, created_at in rows:
+        for key, value in (
+            (('price', int(price * 100) // width * width), price),
+            (('time', edges[max(bisect.bisect_right(edges, minutes) - 1, 0)]),
+             minutes),
+            (('month', created_at.year * 100 + created_at.month), 0),
+        ):
+            entry = result.setdefault(key, [0, 0])
+            entry[0] += 1
+            entry[1] += value
+    return result
+
+
+def backfill_stats(apps, schema_editor):
+    """Date existing recipes and count them into RecipeStat, user by user"""
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeStat = apps.get_model('core', 'RecipeStat')
+
+    #updated_at is the oldest date known for recipes made before this.
+    #Recipes not edited since 0015 added it all land in the month it ran
+    last_id = 0
+    while True:
+        ids = list(
+            Recipe.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        Recipe.objects.filter(id__gte=ids[0], id__lte=ids[-1]).update(
+            created_at=F('updated_at'),
+        )
+        last_id = ids[-1]
+
+    user_ids = Recipe.objects.order_by().values_list(
+        'user_id', flat=True,
+    ).distinct()
+    for user_id in user_ids.iterator():
+        rows = Recipe.objects.filter(user_id=user_id).values_list(
+            'price', 'time_minutes', 'created_at',
+        )
+        changes = deltas(rows.iterator(chunk_size=BATCH_SIZE))
+        #Replaces rows left by an interrupted earlier run
+        with transaction.atomic():
+            RecipeStat.objects.filter(user_id=user_id).delete()
+            RecipeStat.objects.bulk_create(
+                RecipeStat(
+                    user_id=user_id,
+                    kind=kind,
+                    bucket=bucket,
+                    recipes=recipes,
+                    total=total,
+                )
+                for (kind, bucket), (recipes, total) in sorted(
+                    changes.items()
+                )
+            )
+
+
+class Migration(migrations.Migration):
+    # Each batch and each user's rows commit on their own
+    atomic = False
+
+    dependencies = [
+        ('core', '0016_recipe_ingredient_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='RecipeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('price', 'Price'), ('time', 'Time'), ('month', 'Month')], max_length=20)),
+                ('bucket', models.IntegerField()),
+                ('recipes', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'kind', 'bucket')},
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
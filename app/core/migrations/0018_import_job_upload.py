@@ -0,0 +1,29 @@
+# Generated by Django 4.0.10 on 2026-10-19 11:02
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_recipe_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='upload',
+            field=models.FileField(blank=True, storage=core.models.import_storage, upload_to=core.models.import_file_path),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='status',
+            field=models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=20),
+        ),
+    ]
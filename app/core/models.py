@@ -1,13 +1,19 @@
 import uuid
 import os
 
-from django.db import models # noqa
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 from django.conf import settings
+from django.utils.functional import cached_property
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
@@ -19,6 +25,31 @@ def recipe_image_file_path(instance, filename):
 
     return os.path.join('uploads', 'recipe', filename)
 
+
+def import_file_path(instance, filename):
+    """Generate file path for an uploaded import file"""
+    ext = os.path.splitext(filename)[1]
+    return f'{uuid.uuid4()}{ext}'
+
+
+class ImportStorage(FileSystemStorage):
+    """Uploaded import files in IMPORT_UPLOAD_ROOT, which isn't served"""
+
+    #Follows setting changes like the default storage follows MEDIA_ROOT
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'IMPORT_UPLOAD_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+
+    @cached_property
+    def base_location(self):
+        return settings.IMPORT_UPLOAD_ROOT
+
+
+def import_storage():
+    return ImportStorage()
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -50,6 +81,41 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = "email"
 
+class RecipeQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Add bulk inserted recipes to the library statistics"""
+        #core.stats needs the models defined here
+        from core import stats
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, *args, **kwargs)
+            by_user = {}
+            for recipe in created:
+                by_user.setdefault(recipe.user_id, []).append(
+                    stats.recipe_row(recipe)
+                )
+            for user_id, rows in by_user.items():
+                stats.apply(user_id, stats.deltas(rows))
+        return created
+
+    #EXISTS over the user's links, no join and DISTINCT on the recipes
+    def with_tags(self, user, tag_ids):
+        """Recipes with any of the tags"""
+        return self.filter(Exists(RecipeTag.objects.filter(
+            user=user,
+            recipe=OuterRef('pk'),
+            tag_id__in=tag_ids,
+        )))
+
+    def with_ingredients(self, user, ingredient_ids):
+        """Recipes with any of the ingredients"""
+        return self.filter(Exists(RecipeIngredient.objects.filter(
+            user=user,
+            recipe=OuterRef('pk'),
+            ingredient_id__in=ingredient_ids,
+        )))
+
+
 class Recipe(models.Model):
     """Recipe Object"""
     #AUTH_USER_MODEL = 'core.User' in settings.py
@@ -62,12 +128,38 @@ class Recipe(models.Model):
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
-    tags = models.ManyToManyField('Tag')
-    ingredients = models.ManyToManyField('Ingredient')
+    tags = models.ManyToManyField('Tag', through='RecipeTag')
+    ingredients = models.ManyToManyField(
+        'Ingredient',
+        through='RecipeIngredient',
+    )
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    #Ingredients of the recipe, maintained with the RecipeIngredient rows
+    ingredient_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    #Delta sync reads the user's changes in (updated_at, id) order
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            #Lists are per user, newest first
+            models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+            models.Index(
+                fields=['user', 'updated_at', 'id'],
+                name='recipe_user_updated_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        #Commit the row together with the statistics upsert in post_save
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
 class Tag(models.Model):
     """Tag Object for filtering recipes"""
     user = models.ForeignKey(
@@ -75,6 +167,21 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    #Recipes using the tag, maintained with the RecipeTag rows
+    recipe_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe_count'],
+                name='tag_user_recipe_count_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at', 'id'],
+                name='tag_user_updated_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -85,6 +192,360 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    #Recipes using the ingredient, maintained with the RecipeIngredient rows
+    recipe_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe_count'],
+                name='ingr_user_recipe_count_idx',
+            ),
+            models.Index(
+                fields=['user', 'updated_at', 'id'],
+                name='ingr_user_updated_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+def _adjust_counts(model, field, deltas):
+    by_delta = {}
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(pk)
+    #One UPDATE per distinct change, in id order to keep lock order stable
+    for delta, ids in sorted(by_delta.items()):
+        model.objects.filter(id__in=sorted(ids)).update(
+            **{field: F(field) + delta},
+        )
+
+
+def adjust_recipe_counts(link_model, deltas):
+    """Add {target id: change} to the recipe_count of tags/ingredients"""
+    _adjust_counts(link_model.target_model(), 'recipe_count', deltas)
+
+
+def adjust_ingredient_counts(deltas):
+    """Add {recipe id: change} to Recipe.ingredient_count"""
+    _adjust_counts(Recipe, 'ingredient_count', deltas)
+
+
+def _subtract_links(model, field, links, key):
+    """Take the links off field of the model rows they point to with key
+
+    One UPDATE whatever the number of links, e.g. for a tag used by 100k
+    recipes.
+    """
+    removed = links.filter(
+        **{key: OuterRef('pk')}
+    ).order_by().values(key).annotate(n=Count('pk')).values('n')
+    return model.objects.filter(
+        id__in=links.order_by().values(key),
+    ).update(**{field: F(field) - Subquery(removed)})
+
+
+def uncount_recipe_links(link_model, links):
+    """Take links about to be deleted off their targets' recipe_count"""
+    return _subtract_links(
+        link_model.target_model(),
+        'recipe_count',
+        links,
+        link_model.target_field,
+    )
+
+
+def uncount_ingredient_links(links):
+    """Take RecipeIngredient links about to be deleted off ingredient_count"""
+    return _subtract_links(Recipe, 'ingredient_count', links, 'recipe')
+
+
+def delete_links(link_model, links):
+    """Delete the links queryset, taking it off the counts first"""
+    with transaction.atomic(using=links.db, savepoint=False):
+        uncount_recipe_links(link_model, links)
+        if link_model is RecipeIngredient:
+            uncount_ingredient_links(links)
+        return links.delete()
+
+
+def recount_recipe_counts(link_model, targets):
+    """Set recipe_count of the targets queryset from the link rows"""
+    field = link_model.target_field
+    links = link_model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(n=Count('pk')).values('n')
+    return targets.update(recipe_count=Coalesce(Subquery(links), 0))
+
+
+def recount_ingredient_counts(recipes):
+    """Set ingredient_count of the recipes queryset from the link rows"""
+    links = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk'),
+    ).order_by().values('recipe').annotate(n=Count('pk')).values('n')
+    return recipes.update(ingredient_count=Coalesce(Subquery(links), 0))
+
+
+class RecipeLinkQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Fill in the owning user for links added through the M2M managers"""
+        objs = list(objs)
+        recipe_ids = {obj.recipe_id for obj in objs if obj.user_id is None}
+        if recipe_ids:
+            owners = dict(
+                Recipe.objects.filter(id__in=recipe_ids).values_list(
+                    'id', 'user_id'
+                )
+            )
+            for obj in objs:
+                if obj.user_id is None:
+                    obj.user_id = owners.get(obj.recipe_id)
+
+        #M2M add() also inserts through here, so counts follow every insert
+        field = f'{self.model.target_field}_id'
+        target_ids = [getattr(obj, field) for obj in objs]
+        recipe_ids = [obj.recipe_id for obj in objs]
+        counts_ingredients = self.model is RecipeIngredient
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts'):
+                #Skipped rows are unknown, count the targets again
+                recount_recipe_counts(
+                    self.model,
+                    self.model.target_model().objects.filter(
+                        id__in=set(target_ids)
+                    ),
+                )
+                if counts_ingredients:
+                    recount_ingredient_counts(
+                        Recipe.objects.filter(id__in=set(recipe_ids)),
+                    )
+            else:
+                adjust_recipe_counts(self.model, Counter(target_ids))
+                if counts_ingredients:
+                    adjust_ingredient_counts(Counter(recipe_ids))
+        return created
+
+
+class RecipeLink(models.Model):
+    """Base for the recipe M2M through tables.
+
+    The owning user is copied onto every row so the tables can be hash
+    partitioned by user_id alongside core_recipe.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+
+    objects = RecipeLinkQuerySet.as_manager()
+
+    #Name of the Tag/Ingredient foreign key, set by the subclasses
+    target_field = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def target_model(cls):
+        return cls._meta.get_field(cls.target_field).related_model
+
+    def save(self, *args, **kwargs):
+        if self.user_id is None:
+            self.user_id = self.recipe.user_id
+        #Commit the row together with the recipe_count update in post_save
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        #Not a post_delete receiver, that would stop the collector from
+        #fast deleting links when a recipe, tag or ingredient cascades
+        return delete_links(
+            type(self),
+            type(self).objects.using(using).filter(pk=self.pk),
+        )
+
+
+class RecipeTag(RecipeLink):
+    """Tag assigned to a recipe"""
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    target_field = 'tag'
+
+    class Meta:
+        db_table = 'core_recipe_tags'
+        unique_together = [('recipe', 'tag')]
+        indexes = [
+            models.Index(
+                fields=['user', 'tag'],
+                name='recipe_tag_user_tag_idx',
+            ),
+        ]
+
+
+class RecipeIngredient(RecipeLink):
+    """Ingredient assigned to a recipe"""
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+
+    target_field = 'ingredient'
+
+    class Meta:
+        db_table = 'core_recipe_ingredients'
+        unique_together = [('recipe', 'ingredient')]
+        indexes = [
+            models.Index(
+                fields=['user', 'ingredient'],
+                name='recipe_ingr_user_ingr_idx',
+            ),
+        ]
+
+
+class ImportJob(models.Model):
+    """Progress of a recipe import, saved with every committed batch"""
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    source = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=RUNNING,
+    )
+    #Input lines already committed, a resumed import skips them
+    lines = models.IntegerField(default=0)
+    imported = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    errors = models.JSONField(default=list)
+    #The upload a background run reads, removed once it is done
+    upload = models.FileField(
+        upload_to=import_file_path,
+        storage=import_storage,
+        blank=True,
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.source} ({self.status})'
+
+
+class DeletionJob(models.Model):
+    """Batched deletion of a user or a set of recipes"""
+    USER = 'user'
+    RECIPES = 'recipes'
+    KIND_CHOICES = [(USER, 'User'), (RECIPES, 'Recipes')]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    #Kept once a deleted user is gone, email says whose data it was
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+    )
+    email = models.EmailField(max_length=255)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    recipe_ids = models.JSONField(null=True, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    deleted = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.kind} {self.email} ({self.status})'
+
+
+class Tombstone(models.Model):
+    """A deleted recipe, tag or ingredient, kept for delta sync clients"""
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    KIND_CHOICES = [
+        (RECIPE, 'Recipe'),
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+    ]
+
+    #No constraint: a cascading user delete writes tombstones for rows it
+    #removes after the user's own ones are gone, pruning clears them later
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'deleted_at', 'id'],
+                name='tombstone_user_deleted_idx',
+            ),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+class RecipeStat(models.Model):
+    """Recipes of a user in one price, time or creation month bucket"""
+    PRICE = 'price'
+    TIME = 'time'
+    MONTH = 'month'
+    KIND_CHOICES = [(PRICE, 'Price'), (TIME, 'Time'), (MONTH, 'Month')]
+
+    #No constraint, like Tombstone: a cascading user delete adjusts the
+    #rows after the user's own ones are gone
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    #Lower bound of the bucket: cents, minutes or year * 100 + month
+    bucket = models.IntegerField()
+    recipes = models.IntegerField(default=0)
+    #Sum of the prices or times of the recipes in the bucket
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('user', 'kind', 'bucket')]
+
+    def __str__(self):
+        return f'{self.kind} {self.bucket}: {self.recipes}'
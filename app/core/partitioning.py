@@ -0,0 +1,264 @@
+"""
+Optional PostgreSQL hash partitioning of the recipe tables by user_id
+
+Every recipe query is scoped to one user, so partitioning core_recipe and its
+M2M through tables by HASH (user_id) lets the planner prune each query to a
+single partition and keeps vacuum/index maintenance per partition.
+
+Existing tables are converted online: a partitioned copy is created, a
+trigger mirrors concurrent writes into it while rows are copied over in
+short batches, and the two tables are swapped in one brief transaction.
+Indexes the migrations created on the old table are rebuilt on the copy
+and take over their names at the swap, so each exists once.
+
+Only queries with a user_id predicate are pruned. Prefetches of a recipe's
+tags and ingredients, and other lookups of the link tables by recipe_id
+alone, still visit every partition of the (recipe_id) index.
+"""
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.utils import NotSupportedError
+
+# Parent table first so the through tables can reference its new primary key
+PARTITIONED_TABLES = {
+    'core_recipe': {
+        'unique': None,
+        'indexes': [],
+        'named_indexes': [
+            ('recipe_user_id_idx', '(user_id, id)'),
+            ('recipe_user_updated_idx', '(user_id, updated_at, id)'),
+            # See migration 0012_admin_search_indexes
+            ('core_recipe_title_trgm_idx',
+             'USING gin (UPPER(title::text) gin_trgm_ops)'),
+        ],
+        'foreign_keys': [
+            (('user_id',), 'core_user', ('id',)),
+        ],
+    },
+    'core_recipe_tags': {
+        'unique': ('user_id', 'recipe_id', 'tag_id'),
+        'indexes': [('recipe_id',)],
+        'named_indexes': [
+            ('recipe_tag_user_tag_idx', '(user_id, tag_id)'),
+        ],
+        'foreign_keys': [
+            (('user_id',), 'core_user', ('id',)),
+            (('recipe_id', 'user_id'), 'core_recipe', ('id', 'user_id')),
+            (('tag_id',), 'core_tag', ('id',)),
+        ],
+    },
+    'core_recipe_ingredients': {
+        'unique': ('user_id', 'recipe_id', 'ingredient_id'),
+        'indexes': [('recipe_id',)],
+        'named_indexes': [
+            ('recipe_ingr_user_ingr_idx', '(user_id, ingredient_id)'),
+        ],
+        'foreign_keys': [
+            (('user_id',), 'core_user', ('id',)),
+            (('recipe_id', 'user_id'), 'core_recipe', ('id', 'user_id')),
+            (('ingredient_id',), 'core_ingredient', ('id',)),
+        ],
+    },
+}
+
+
+def is_partitioned(table, using=DEFAULT_DB_ALIAS):
+    """Return True if table is already a partitioned table"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+            [table],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partition_recipe_tables(partitions, batch_size=5000, keep_old=False,
+                            using=DEFAULT_DB_ALIAS, log=None):
+    """Convert the recipe tables to HASH (user_id) partitioned tables"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        raise NotSupportedError(
+            'Hash partitioning is only supported on PostgreSQL'
+        )
+    if partitions < 2:
+        raise ValueError('At least 2 partitions are required')
+
+    log = log or (lambda message: None)
+    for table, spec in PARTITIONED_TABLES.items():
+        if is_partitioned(table, using):
+            log(f'{table} is already partitioned')
+            continue
+        log(f'Partitioning {table} into {partitions} partitions')
+        _partition_table(
+            connection, table, spec, partitions, batch_size, keep_old, log,
+        )
+
+
+def _columns(cursor, table):
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s "
+        "ORDER BY ordinal_position",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _index_names(cursor, table):
+    cursor.execute(
+        "SELECT indexname FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s",
+        [table],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _partition_table(connection, table, spec, partitions, batch_size,
+                     keep_old, log):
+    qn = connection.ops.quote_name
+    using = connection.alias
+    new = f'{table}_hashed'
+    sync = f'{new}_sync'
+
+    with transaction.atomic(using), connection.cursor() as cursor:
+        # Clean up after a previous run that did not finish
+        cursor.execute(f'DROP TRIGGER IF EXISTS {qn(sync)} ON {qn(table)}')
+        cursor.execute(f'DROP FUNCTION IF EXISTS {qn(sync)}()')
+        cursor.execute(f'DROP TABLE IF EXISTS {qn(new)} CASCADE')
+
+        cursor.execute(
+            f'CREATE TABLE {qn(new)} '
+            f'(LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY HASH (user_id)'
+        )
+        # Unique constraints on a partitioned table must include the key, so
+        # a foreign key to core_recipe has to reference (id, user_id)
+        cursor.execute(f'ALTER TABLE {qn(new)} ADD PRIMARY KEY (id, user_id)')
+        if spec['unique']:
+            cursor.execute(
+                f'ALTER TABLE {qn(new)} ADD CONSTRAINT {qn(new + "_uniq")} '
+                f'UNIQUE ({", ".join(spec["unique"])})'
+            )
+        for columns in spec['indexes']:
+            name = '_'.join((new,) + columns + ('idx',))
+            cursor.execute(
+                f'CREATE INDEX {qn(name)} ON {qn(new)} ({", ".join(columns)})'
+            )
+        # Only those the migrations run so far created, renamed at the swap
+        existing = _index_names(cursor, table)
+        named_indexes = [
+            (name, definition) for name, definition in spec['named_indexes']
+            if name in existing
+        ]
+        for name, definition in named_indexes:
+            cursor.execute(
+                f'CREATE INDEX {qn(f"{name}_hashed")} ON {qn(new)} '
+                f'{definition}'
+            )
+        for remainder in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE {qn(f"{new}_p{remainder}")} '
+                f'PARTITION OF {qn(new)} FOR VALUES '
+                f'WITH (MODULUS {partitions}, REMAINDER {remainder})'
+            )
+
+        # Mirror every write made while the copy runs
+        assignments = ', '.join(
+            f'{qn(column)} = EXCLUDED.{qn(column)}'
+            for column in _columns(cursor, table)
+            if column not in ('id', 'user_id')
+        )
+        cursor.execute(f"""
+            CREATE FUNCTION {qn(sync)}() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM {qn(new)}
+                    WHERE id = OLD.id AND user_id = OLD.user_id;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO {qn(new)} SELECT (NEW).*
+                    ON CONFLICT (id, user_id) DO UPDATE SET {assignments};
+                END IF;
+                RETURN NULL;
+            END $$
+        """)
+        cursor.execute(
+            f'CREATE TRIGGER {qn(sync)} '
+            f'AFTER INSERT OR UPDATE OR DELETE ON {qn(table)} '
+            f'FOR EACH ROW EXECUTE FUNCTION {qn(sync)}()'
+        )
+
+    # FOR SHARE keeps a concurrent DELETE from resurrecting a row in the copy
+    copied = 0
+    last_id = 0
+    while True:
+        with transaction.atomic(using), connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH batch AS (
+                    SELECT * FROM {qn(table)} WHERE id > %s
+                    ORDER BY id LIMIT %s FOR SHARE
+                ), copied AS (
+                    INSERT INTO {qn(new)} SELECT * FROM batch
+                    ON CONFLICT DO NOTHING
+                )
+                SELECT max(id), count(*) FROM batch
+            """, [last_id, batch_size])
+            batch_max, batch_count = cursor.fetchone()
+        if batch_max is None:
+            break
+        last_id = batch_max
+        copied += batch_count
+        log(f'  copied {copied} rows of {table}')
+
+    old = f'{table}_unpartitioned'
+    with transaction.atomic(using), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'DROP TRIGGER {qn(sync)} ON {qn(table)}')
+        cursor.execute(f'DROP FUNCTION {qn(sync)}()')
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+
+        # Foreign keys from and to the old table cannot follow the swap
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND (conrelid = to_regclass(%s) "
+            "OR confrelid = to_regclass(%s))",
+            [table, table],
+        )
+        for relation, constraint in cursor.fetchall():
+            cursor.execute(
+                f'ALTER TABLE {relation} DROP CONSTRAINT {qn(constraint)}'
+            )
+
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}')
+        cursor.execute(f'ALTER TABLE {qn(new)} RENAME TO {qn(table)}')
+        for remainder in range(partitions):
+            cursor.execute(
+                f'ALTER TABLE {qn(f"{new}_p{remainder}")} '
+                f'RENAME TO {qn(f"{table}_p{remainder}")}'
+            )
+        for name, definition in named_indexes:
+            cursor.execute(
+                f'ALTER INDEX {qn(name)} '
+                f'RENAME TO {qn(f"{name}_unpartitioned")}'
+            )
+            cursor.execute(
+                f'ALTER INDEX {qn(f"{name}_hashed")} RENAME TO {qn(name)}'
+            )
+        if sequence:
+            cursor.execute(
+                f'ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.id'
+            )
+
+        for columns, target, target_columns in spec['foreign_keys']:
+            name = '_'.join((table,) + columns + ('fk', target))
+            cursor.execute(
+                f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} '
+                f'FOREIGN KEY ({", ".join(columns)}) '
+                f'REFERENCES {qn(target)} ({", ".join(target_columns)}) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+
+        if not keep_old:
+            cursor.execute(f'DROP TABLE {qn(old)}')
@@ -0,0 +1,400 @@
+"""
+Query plan audit for the API routes
+
+Every route of recipe.urls and user.urls is requested with a representative
+request set against a seeded database. Each request runs in a transaction
+that is rolled back, so writes never change the data the next route sees.
+The SELECT statements a request issues are explained: on PostgreSQL with
+EXPLAIN (ANALYZE, BUFFERS), elsewhere with the backend's plan output. Large
+sequential scans and sorts that spill to disk become findings, with an
+index suggested where the plan shows the filter columns. Statements
+repeated SQL_PROFILER_N_PLUS_ONE times in one request are reported too.
+"""
+
+import io
+import json
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.client import MULTIPART_CONTENT
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from PIL import Image
+
+from core.models import DeletionJob, ImportJob, Ingredient, Recipe, Tag
+from core.profiling import fingerprint
+from recipe import sync
+
+AUDITED_URLCONFS = ('recipe.urls', 'user.urls')
+
+AuditRequest = namedtuple(
+    'AuditRequest',
+    ['method', 'args', 'data', 'content_type'],
+)
+
+_FILTER_COLUMN = re.compile(r'\(?(\w+)\s*(?:=|<|>|<=|>=|~~|IN\b|= ANY)')
+_SORT_COLUMN = re.compile(r'(?:\w+\.)?(\w+)(?: DESC)?$')
+
+
+def route_names(urlconfs=AUDITED_URLCONFS):
+    """Namespaced names of every route in urlconfs"""
+    names = []
+
+    def walk(patterns, namespace):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, namespace)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                name = f'{namespace}:{pattern.name}'
+                if name not in names:
+                    names.append(name)
+
+    for urlconf in urlconfs:
+        module = __import__(urlconf, fromlist=['urlpatterns'])
+        walk(module.urlpatterns, module.app_name)
+    return names
+
+
+def _image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    buffer.seek(0)
+    buffer.name = 'audit.jpg'
+    return buffer
+
+
+def requests_for(user, password):
+    """Representative requests per route, as {route name: [AuditRequest]}"""
+    recipe = Recipe.objects.filter(user=user).order_by('id').first()
+    tag_ids = list(
+        Tag.objects.filter(user=user).values_list('id', flat=True)[:2]
+    )
+    ingredient_ids = list(
+        Ingredient.objects.filter(user=user).values_list('id', flat=True)[:2]
+    )
+    since = sync.encode_cursor(
+        sync.Cursor(timezone.now() - timedelta(days=1), 0, 0)
+    )
+    job = DeletionJob.objects.create(
+        user=user,
+        email=user.email,
+        kind=DeletionJob.RECIPES,
+        recipe_ids=[],
+        status=DeletionJob.DONE,
+    )
+    import_job = ImportJob.objects.create(
+        user=user,
+        source='audit',
+        status=ImportJob.DONE,
+    )
+
+    def get(args=(), **params):
+        return AuditRequest('GET', args, params, None)
+
+    def send(method, data, args=(), content_type='application/json'):
+        return AuditRequest(method, args, data, content_type)
+
+    return {
+        'recipe:api-root': [get()],
+        'recipe:recipe-list': [
+            get(),
+            get(tags=','.join(map(str, tag_ids))),
+            get(ingredients=','.join(map(str, ingredient_ids))),
+        ],
+        'recipe:recipe-detail': [
+            get(args=[recipe.id]),
+            send('PATCH', {'title': 'Audited'}, args=[recipe.id]),
+            send('DELETE', None, args=[recipe.id]),
+        ],
+        'recipe:recipe-changes': [get(), get(since=since)],
+        'recipe:recipe-shopping-list': [get(ids=str(recipe.id))],
+        'recipe:recipe-similar': [get(args=[recipe.id])],
+        'recipe:recipe-pantry': [
+            get(ingredients=','.join(map(str, ingredient_ids)), missing=1),
+        ],
+        'recipe:recipe-stats': [get()],
+        'recipe:recipe-multi-get': [get(ids=f'{recipe.id},0')],
+        'recipe:recipe-export': [get()],
+        'recipe:recipe-import': [
+            send(
+                'POST',
+                {'file': io.BytesIO(b'{"title": "Audit", '
+                                    b'"time_minutes": 1, "price": "1.00", '
+                                    b'"tags": ["Audit"]}\n')},
+                content_type=MULTIPART_CONTENT,
+            ),
+        ],
+        'recipe:recipe-bulk-delete': [
+            send('POST', {'ids': [recipe.id]}),
+        ],
+        'recipe:recipe-upload-image': [
+            send(
+                'POST',
+                {'image': _image()},
+                args=[recipe.id],
+                content_type=MULTIPART_CONTENT,
+            ),
+        ],
+        'recipe:tag-list': [
+            get(),
+            get(assigned_only=1),
+            get(ordering='-recipe_count'),
+        ],
+        'recipe:tag-multi-get': [get(ids=','.join(map(str, tag_ids)))],
+        'recipe:tag-assign': [
+            send('POST', {'tags': tag_ids[1:]}, args=[tag_ids[0]]),
+        ],
+        'recipe:tag-unassign': [
+            send('POST', {'all': True}, args=[tag_ids[0]]),
+        ],
+        'recipe:tag-merge': [
+            send('POST', {'sources': tag_ids[1:]}, args=[tag_ids[0]]),
+        ],
+        'recipe:tag-detail': [
+            send('PATCH', {'name': 'Audited'}, args=[tag_ids[0]]),
+            send('DELETE', None, args=[tag_ids[0]]),
+        ],
+        'recipe:ingredient-list': [get(), get(assigned_only=1)],
+        'recipe:ingredient-multi-get': [
+            get(ids=','.join(map(str, ingredient_ids))),
+        ],
+        'recipe:ingredient-assign': [
+            send('POST', {'ids': [recipe.id]}, args=[ingredient_ids[0]]),
+        ],
+        'recipe:ingredient-unassign': [
+            send('POST', {'ids': [recipe.id]}, args=[ingredient_ids[0]]),
+        ],
+        'recipe:ingredient-merge': [
+            send(
+                'POST',
+                {'sources': ingredient_ids[1:]},
+                args=[ingredient_ids[0]],
+            ),
+        ],
+        'recipe:ingredient-detail': [
+            send('PATCH', {'name': 'Audited'}, args=[ingredient_ids[0]]),
+        ],
+        'recipe:importjob-list': [get()],
+        'recipe:importjob-detail': [get(args=[import_job.id])],
+        'recipe:deletionjob-list': [get()],
+        'recipe:deletionjob-detail': [get(args=[job.id])],
+        'user:create': [
+            send('POST', {
+                'email': 'audit-new@example.com',
+                'password': 'audit-pass-123',
+                'name': 'Audit',
+            }),
+        ],
+        'user:token': [
+            send('POST', {'email': user.email, 'password': password}),
+        ],
+        'user:me': [get(), send('PATCH', {'name': 'Audited'})],
+    }
+
+
+class StatementRecorder:
+    """Execute wrapper keeping the SELECT statements of a request"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params):
+    """Return the plan of a statement in the backend's own format"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}',
+                params,
+            )
+            plan = cursor.fetchone()[0]
+            return json.loads(plan) if isinstance(plan, str) else plan
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def _suggest_index(table, filter_text, sort_keys=()):
+    columns = []
+    for column in _FILTER_COLUMN.findall(filter_text or ''):
+        if column not in columns:
+            columns.append(column)
+    for key in sort_keys:
+        match = _SORT_COLUMN.search(key)
+        if match and match.group(1) not in columns:
+            columns.append(match.group(1))
+    return f'{table}({", ".join(columns)})' if columns else None
+
+
+def _postgres_findings(plan, min_rows):
+    findings = []
+
+    def walk(node, sort_keys):
+        if node.get('Node Type') == 'Sort':
+            sort_keys = node.get('Sort Key', [])
+            if node.get('Sort Space Type') == 'Disk':
+                findings.append({
+                    'kind': 'disk_sort',
+                    'table': None,
+                    'rows': node.get('Actual Rows'),
+                    'detail': f'{node.get("Sort Method")}, '
+                              f'{node.get("Sort Space Used")} kB',
+                    'suggested_index': None,
+                })
+        if node.get('Node Type') == 'Seq Scan':
+            loops = node.get('Actual Loops', 1) or 1
+            scanned = (
+                node.get('Actual Rows', 0)
+                + node.get('Rows Removed by Filter', 0)
+            ) * loops
+            if scanned >= min_rows:
+                table = node.get('Relation Name')
+                findings.append({
+                    'kind': 'seq_scan',
+                    'table': table,
+                    'rows': scanned,
+                    'detail': node.get('Filter'),
+                    'suggested_index': _suggest_index(
+                        table, node.get('Filter'), sort_keys,
+                    ),
+                })
+        for child in node.get('Plans', []):
+            walk(child, sort_keys)
+
+    walk(plan[0]['Plan'], ())
+    return findings
+
+
+def _table_rows(table, cache):
+    if table not in cache:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {connection.ops.quote_name(table)}'
+            )
+            cache[table] = cursor.fetchone()[0]
+    return cache[table]
+
+
+def _generic_findings(plan, min_rows, row_cache):
+    # e.g. SQLite: "SCAN core_recipe" is a full scan of the table
+    findings = []
+    for detail in plan:
+        words = detail.split()
+        if len(words) >= 2 and words[0] == 'SCAN':
+            table = words[1]
+            if table.startswith('('):
+                continue
+            rows = _table_rows(table, row_cache)
+            if rows >= min_rows:
+                findings.append({
+                    'kind': 'seq_scan',
+                    'table': table,
+                    'rows': rows,
+                    'detail': detail,
+                    'suggested_index': None,
+                })
+    return findings
+
+
+def find_problems(plan, min_rows, row_cache=None):
+    """Findings for one plan from explain()"""
+    if connection.vendor == 'postgresql':
+        return _postgres_findings(plan, min_rows)
+    return _generic_findings(plan, min_rows, {} if row_cache is None
+                             else row_cache)
+
+
+def audit_request(client, name, request, min_rows, row_cache):
+    """Run one request, explain its SELECTs, then roll everything back"""
+    recorder = StatementRecorder()
+    url = reverse(name, args=request.args)
+    kwargs = {}
+    if request.method == 'GET':
+        kwargs['data'] = request.data
+    elif request.data is not None:
+        kwargs['data'] = request.data
+        if request.content_type != MULTIPART_CONTENT:
+            kwargs['data'] = json.dumps(request.data)
+        kwargs['content_type'] = request.content_type
+
+    with transaction.atomic():
+        with connection.execute_wrapper(recorder):
+            response = getattr(client, request.method.lower())(url, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        statements = {}
+        repeats = {}
+        for sql, params in recorder.statements:
+            key = fingerprint(sql)
+            statements.setdefault(key, (sql, params))
+            repeats[key] = repeats.get(key, 0) + 1
+        findings = [
+            {
+                'kind': 'n_plus_one',
+                'table': None,
+                'rows': count,
+                'detail': f'{count} executions in one request',
+                'suggested_index': None,
+                'sql': statements[key][0],
+            }
+            for key, count in repeats.items()
+            if count >= settings.SQL_PROFILER_N_PLUS_ONE
+        ]
+        for key, (sql, params) in statements.items():
+            for finding in find_problems(
+                explain(sql, params), min_rows, row_cache,
+            ):
+                finding['sql'] = sql
+                findings.append(finding)
+        transaction.set_rollback(True)
+
+    return {
+        'method': request.method,
+        'path': url,
+        'status': response.status_code,
+        'statements': len(recorder.statements),
+        'explained': len(statements),
+        'findings': findings,
+    }
+
+
+def run_audit(user, password, token_key, min_rows=1000, log=None):
+    """Audit every route, return the report"""
+    log = log or (lambda message: None)
+    client = Client(HTTP_AUTHORIZATION=f'Token {token_key}')
+    planned = requests_for(user, password)
+    row_cache = {}
+
+    routes = {}
+    uncovered = []
+    for name in route_names():
+        if name not in planned:
+            uncovered.append(name)
+            continue
+        results = [
+            audit_request(client, name, request, min_rows, row_cache)
+            for request in planned[name]
+        ]
+        routes[name] = results
+        count = sum(len(result['findings']) for result in results)
+        log(f'{name:<32} {len(results)} requests, {count} findings')
+
+    return {
+        'vendor': connection.vendor,
+        'min_rows': min_rows,
+        'routes': routes,
+        'uncovered': uncovered,
+        'findings': sum(
+            len(result['findings'])
+            for results in routes.values() for result in results
+        ),
+    }
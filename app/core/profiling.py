@@ -0,0 +1,185 @@
+"""
+Opt-in per-request SQL profiler
+
+Enabled for a random SQL_PROFILER_SAMPLE_RATE share of requests, or for a
+request carrying the X-Profile-SQL header set to SQL_PROFILER_TOKEN. Every
+statement is timed together with the project call site that issued it, and
+statements sharing a fingerprint are flagged as N+1 candidates. Requests
+slower than SQL_PROFILER_SLOW_MS are written to a rotating NDJSON log.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connection
+
+PROFILE_HEADER = 'X-Profile-SQL'
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r'\s+')
+
+# Frames of the ORM and of the execute wrappers say nothing about the caller
+_SKIP_FRAMES = (
+    os.path.join('django', 'db', ''),
+    os.path.join('core', 'profiling.py'),
+    os.path.join('core', 'metrics.py'),
+)
+
+_logger = None
+
+
+def fingerprint(sql):
+    """Return a stable id for statements that differ only in values"""
+    normalized = _STRING.sub('?', sql)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _SPACE.sub(' ', normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def get_logger():
+    """Logger writing one JSON document per line to SQL_PROFILER_LOG"""
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger('core.sql_profiler')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(
+            settings.SQL_PROFILER_LOG,
+            maxBytes=settings.SQL_PROFILER_LOG_MAX_BYTES,
+            backupCount=settings.SQL_PROFILER_LOG_BACKUPS,
+            delay=True,
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+class SQLProfile:
+    """Statements run during one request, installed as an execute wrapper"""
+
+    def __init__(self):
+        self.statements = []
+        self.groups = {}
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_statements = settings.SQL_PROFILER_MAX_STATEMENTS
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total_seconds += elapsed
+            # Past the cap only totals are kept to bound the overhead
+            if len(self.statements) < self.max_statements:
+                self.record(sql, elapsed)
+
+    def record(self, sql, elapsed):
+        key = fingerprint(sql)
+        ms = elapsed * 1000
+        stack = call_site()
+        group = self.groups.setdefault(key, {
+            'fingerprint': key,
+            'sql': sql,
+            'count': 0,
+            'ms': 0.0,
+            'stack': stack,
+        })
+        group['count'] += 1
+        group['ms'] += ms
+        self.statements.append({
+            'sql': sql,
+            'fingerprint': key,
+            'ms': round(ms, 3),
+            'stack': stack,
+        })
+
+    def n_plus_one(self):
+        """Statements repeated often enough to look like a loop"""
+        return sorted(
+            (
+                dict(group, ms=round(group['ms'], 3))
+                for group in self.groups.values()
+                if group['count'] >= settings.SQL_PROFILER_N_PLUS_ONE
+            ),
+            key=lambda group: group['count'],
+            reverse=True,
+        )
+
+    def report(self, request, response, elapsed):
+        return {
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 3),
+            'queries': self.count,
+            'sql_ms': round(self.total_seconds * 1000, 3),
+            'n_plus_one': self.n_plus_one(),
+            'statements': self.statements,
+        }
+
+
+def call_site():
+    """Innermost frames that led to the query, minus the DB layer"""
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if not any(part in frame.filename for part in _SKIP_FRAMES)
+    ]
+    return [
+        f'{frame.filename}:{frame.lineno} in {frame.name}'
+        for frame in frames[-settings.SQL_PROFILER_STACK_DEPTH:]
+    ]
+
+
+class SQLProfilerMiddleware:
+    """Profile SQL for sampled or explicitly requested requests"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_requested(self, request):
+        """Whether a privileged client asked for this request's profile"""
+        token = settings.SQL_PROFILER_TOKEN
+        #Constant time, so response times don't give the token away
+        return bool(token) and hmac.compare_digest(
+            request.headers.get(PROFILE_HEADER, '').encode(),
+            token.encode(),
+        )
+
+    def __call__(self, request):
+        requested = self.is_requested(request)
+        rate = settings.SQL_PROFILER_SAMPLE_RATE
+        if not requested and not (rate > 0 and random.random() < rate):
+            return self.get_response(request)
+
+        profile = SQLProfile()
+        started = time.perf_counter()
+        with connection.execute_wrapper(profile):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        if requested:
+            response['X-SQL-Queries'] = str(profile.count)
+            response['X-SQL-Time-Ms'] = f'{profile.total_seconds * 1000:.3f}'
+            response['X-SQL-N-Plus-One'] = str(len(profile.n_plus_one()))
+        if elapsed * 1000 >= settings.SQL_PROFILER_SLOW_MS:
+            get_logger().info(json.dumps(
+                profile.report(request, response, elapsed)
+            ))
+
+        return response
@@ -0,0 +1,84 @@
+"""
+Prebuilt OpenAPI schema artifacts
+
+Generating the schema introspects every viewset and serializer, so it is
+done once at build time by the build_schema command and the files are
+served as-is by core.views.SchemaView.
+"""
+
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+MANIFEST_NAME = 'manifest.json'
+RENDERERS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+
+# (manifest mtime, artifacts) per schema directory, read from disk again
+# only when the manifest is replaced
+_artifacts = {}
+
+
+def build_schema(output_dir=None):
+    """Write the schema in every format and return the manifest"""
+    output_dir = output_dir or settings.SCHEMA_DIR
+    os.makedirs(output_dir, exist_ok=True)
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+
+    manifest = {}
+    for schema_format, renderer_class in RENDERERS.items():
+        content = renderer_class().render(schema, renderer_context={})
+        etag = hashlib.sha256(content).hexdigest()[:16]
+        # The content hash in the name versions the file for static serving
+        name = f'openapi.{etag}.{schema_format}'
+        with open(os.path.join(output_dir, name), 'wb') as f:
+            f.write(content)
+        manifest[schema_format] = {'file': name, 'etag': etag}
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    _artifacts.pop(output_dir, None)
+
+    return manifest
+
+
+def load_artifact(schema_format, schema_dir=None):
+    """Return (content, etag) for schema_format, or None if not built"""
+    schema_dir = schema_dir or settings.SCHEMA_DIR
+    try:
+        mtime = os.stat(os.path.join(schema_dir, MANIFEST_NAME)).st_mtime_ns
+    except OSError:
+        # Not built yet, a later build is picked up without a restart
+        return None
+
+    cached = _artifacts.get(schema_dir)
+    if cached is None or cached[0] != mtime:
+        cached = _artifacts[schema_dir] = (mtime, _read_artifacts(schema_dir))
+    return cached[1].get(schema_format)
+
+
+def _read_artifacts(schema_dir):
+    try:
+        with open(os.path.join(schema_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    artifacts = {}
+    for schema_format, entry in manifest.items():
+        try:
+            with open(os.path.join(schema_dir, entry['file']), 'rb') as f:
+                artifacts[schema_format] = (f.read(), entry['etag'])
+        except OSError:
+            continue
+    return artifacts
@@ -0,0 +1,287 @@
+"""
+Fast synthetic data generation
+
+Builds users, recipes, tags, ingredients and their links with Zipfian
+library sizes and tag/ingredient popularity. Rows are written in batches,
+with COPY on PostgreSQL (ids are reserved from the sequences up front) and
+bulk_create elsewhere. On PostgreSQL the users are split across worker
+processes, each with its own connection.
+"""
+
+import bisect
+import csv
+import io
+import itertools
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+
+from core import stats
+from core.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+    User,
+    recount_ingredient_counts,
+    recount_recipe_counts,
+)
+
+WORDS = (
+    'apple basil bean beef bread butter carrot cheese chicken chili '
+    'chocolate coconut corn cream curry egg fennel garlic ginger honey '
+    'lamb lemon lentil lime mango mint mushroom noodle oat olive onion '
+    'orange pasta pea pepper pork potato pumpkin rice salmon spinach '
+    'squash thyme tofu tomato tuna vanilla walnut yogurt zucchini'
+).split()
+TAG_WORDS = (
+    'vegan vegetarian quick dinner lunch breakfast dessert spicy healthy '
+    'comfort baking grill summer winter party budget family keto soup'
+).split()
+
+
+class ZipfSampler:
+    """Draw ranks 0..n-1 with probability proportional to 1 / (rank+1)^s"""
+
+    def __init__(self, n, s, rng):
+        self.rng = rng
+        weights = [1 / (rank + 1) ** s for rank in range(n)]
+        self.cumulative = list(itertools.accumulate(weights))
+        self.total = self.cumulative[-1] if weights else 0
+
+    def sample(self):
+        return bisect.bisect(self.cumulative, self.rng.random() * self.total)
+
+    def sample_distinct(self, k):
+        k = min(k, len(self.cumulative))
+        chosen = set()
+        while len(chosen) < k:
+            chosen.add(self.sample())
+        return chosen
+
+
+def library_sizes(users, recipes, skew, seed):
+    """Split recipes over users with a Zipfian library size"""
+    sampler = ZipfSampler(users, skew, random.Random(seed))
+    sizes = [0] * users
+    for _ in range(recipes):
+        sizes[sampler.sample()] += 1
+    return sizes
+
+
+class RowWriter:
+    """Insert model instances with COPY or bulk_create"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.use_copy = connection.vendor == 'postgresql'
+
+    def reserve_ids(self, model, count):
+        """Take count ids from the table sequence (PostgreSQL only)"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                "FROM generate_series(1, %s)",
+                [model._meta.db_table, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def write(self, model, objs):
+        """Insert objs, assigning primary keys where the DB can't"""
+        if not objs:
+            return
+        if not self.use_copy:
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+            return
+
+        if objs[0].pk is None:
+            for obj, pk in zip(objs, self.reserve_ids(model, len(objs))):
+                obj.pk = pk
+        fields = model._meta.concrete_fields
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        for obj in objs:
+            row = []
+            for field in fields:
+                value = field.get_db_prep_save(
+                    field.pre_save(obj, True),
+                    connection,
+                )
+                row.append('\\N' if value is None else value)
+            writer.writerow(row)
+        buffer.seek(0)
+
+        columns = ', '.join(
+            connection.ops.quote_name(field.column) for field in fields
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+                f"({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+
+
+def seed_users(first_user, sizes, options):
+    """Generate the libraries of users first_user.. with the given sizes"""
+    rng = random.Random(options['seed'] * 1000003 + first_user)
+    writer = RowWriter(options['batch_size'])
+    counts = dict.fromkeys(
+        ('users', 'tags', 'ingredients', 'recipes', 'recipe_tags',
+         'recipe_ingredients'),
+        0,
+    )
+    tag_sampler = ZipfSampler(options['tags_per_user'], options['skew'], rng)
+    ingredient_sampler = ZipfSampler(
+        options['ingredients_per_user'], options['skew'], rng,
+    )
+
+    for offset, size in enumerate(sizes):
+        number = first_user + offset
+        with transaction.atomic():
+            user = User(
+                email=f'seed-{options["seed"]}-user-{number}@example.com',
+                name=f'Seed User {number}',
+                password=options['password_hash'],
+            )
+            writer.write(User, [user])
+            tags = [
+                Tag(user=user, name=_name(TAG_WORDS, i))
+                for i in range(options['tags_per_user'])
+            ]
+            writer.write(Tag, tags)
+            ingredients = [
+                Ingredient(user=user, name=_name(WORDS, i))
+                for i in range(options['ingredients_per_user'])
+            ]
+            writer.write(Ingredient, ingredients)
+        counts['users'] += 1
+        counts['tags'] += len(tags)
+        counts['ingredients'] += len(ingredients)
+
+        for start in range(0, size, options['batch_size']):
+            batch = min(options['batch_size'], size - start)
+            with transaction.atomic():
+                recipes = [
+                    Recipe(
+                        user=user,
+                        title=f'{rng.choice(WORDS).title()} '
+                              f'{rng.choice(WORDS)} {start + i}',
+                        time_minutes=rng.randint(5, 240),
+                        price=Decimal(rng.randint(100, 9999)) / 100,
+                    )
+                    for i in range(batch)
+                ]
+                writer.write(Recipe, recipes)
+                recipe_tags = [
+                    RecipeTag(user=user, recipe=recipe, tag=tags[rank])
+                    for recipe in recipes
+                    for rank in tag_sampler.sample_distinct(
+                        rng.randint(0, options['tags_per_recipe'])
+                    )
+                ]
+                writer.write(RecipeTag, recipe_tags)
+                recipe_ingredients = [
+                    RecipeIngredient(
+                        user=user,
+                        recipe=recipe,
+                        ingredient=ingredients[rank],
+                    )
+                    for recipe in recipes
+                    for rank in ingredient_sampler.sample_distinct(
+                        rng.randint(1, options['ingredients_per_recipe'])
+                    )
+                ]
+                writer.write(RecipeIngredient, recipe_ingredients)
+            counts['recipes'] += len(recipes)
+            counts['recipe_tags'] += len(recipe_tags)
+            counts['recipe_ingredients'] += len(recipe_ingredients)
+
+        if writer.use_copy:
+            #COPY bypasses the count and statistics bookkeeping of
+            #bulk_create
+            recount_recipe_counts(RecipeTag, Tag.objects.filter(user=user))
+            recount_recipe_counts(
+                RecipeIngredient,
+                Ingredient.objects.filter(user=user),
+            )
+            recount_ingredient_counts(Recipe.objects.filter(user=user))
+            stats.rebuild(user)
+
+    return counts
+
+
+def _name(words, i):
+    """Distinct, readable names: 'vegan', ..., 'vegan 2', ..."""
+    word = words[i % len(words)]
+    return word if i < len(words) else f'{word} {i // len(words) + 1}'
+
+
+def _seed_chunk(args):
+    # Runs in a forked worker, which must not share the parent's connection
+    connections.close_all()
+    try:
+        return seed_users(*args)
+    finally:
+        connections.close_all()
+
+
+def seed(users=100, recipes=10000, tags_per_user=30,
+         ingredients_per_user=100, tags_per_recipe=3,
+         ingredients_per_recipe=8, skew=1.1, batch_size=5000, workers=1,
+         seed=0, password='seedpass123', log=None):
+    """Seed the database and return row counts and throughput"""
+    log = log or (lambda message: None)
+    started = time.perf_counter()
+    options = {
+        'tags_per_user': tags_per_user,
+        'ingredients_per_user': ingredients_per_user,
+        'tags_per_recipe': tags_per_recipe,
+        'ingredients_per_recipe': ingredients_per_recipe,
+        'skew': skew,
+        'batch_size': batch_size,
+        'seed': seed,
+        # Hashing is deliberately slow, so every seeded user shares one hash
+        'password_hash': make_password(password),
+    }
+    sizes = library_sizes(users, recipes, skew, seed)
+
+    if connection.vendor != 'postgresql':
+        workers = 1
+    # Contiguous user ranges, one per worker
+    step = -(-users // max(workers, 1))
+    chunks = [
+        (first, sizes[first:first + step], options)
+        for first in range(0, users, step)
+    ]
+
+    totals = {}
+    if workers > 1:
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+        ) as executor:
+            results = executor.map(_seed_chunk, chunks)
+            for counts in results:
+                for table, count in counts.items():
+                    totals[table] = totals.get(table, 0) + count
+                log(f'  {totals["recipes"]} recipes written')
+    else:
+        for chunk in chunks:
+            for table, count in seed_users(*chunk).items():
+                totals[table] = totals.get(table, 0) + count
+
+    elapsed = time.perf_counter() - started
+    rows = sum(totals.values())
+    return {
+        'rows': totals,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else None,
+    }
@@ -0,0 +1,49 @@
+"""
+Serializers for the core API views
+"""
+
+from django.conf import settings
+
+from rest_framework import serializers
+
+from core import batch
+
+
+class BatchSubRequestSerializer(serializers.Serializer):
+    """One API call of a batch"""
+    method = serializers.ChoiceField(
+        choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'],
+        default='GET',
+    )
+    #Path of the route, with its query string
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+    def validate_path(self, value):
+        try:
+            batch.check_path(value)
+        except batch.BatchError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """API calls to run in one request"""
+    requests = serializers.ListField(
+        child=BatchSubRequestSerializer(),
+        min_length=1,
+        max_length=settings.BATCH_MAX_REQUESTS,
+    )
+    #Only applies when every sub-request is a GET
+    concurrent = serializers.BooleanField(default=False)
+
+
+class BatchSubResponseSerializer(serializers.Serializer):
+    status = serializers.IntegerField()
+    headers = serializers.DictField(child=serializers.CharField())
+    body = serializers.JSONField(allow_null=True)
+
+
+class BatchResponseSerializer(serializers.Serializer):
+    """Responses of the sub-requests in request order"""
+    responses = BatchSubResponseSerializer(many=True)
@@ -0,0 +1,185 @@
+"""
+Keep Tag.recipe_count, Ingredient.recipe_count and Recipe.ingredient_count
+in step with the links
+
+Bulk inserts, including M2M add(), are counted in RecipeLinkQuerySet and
+single link deletes in RecipeLink.delete(). The receivers here cover links
+saved one at a time (e.g. the admin inlines), M2M remove() and clear(), and
+the links a recipe or ingredient delete cascades to. Deleted links are
+taken off the counts with one grouped UPDATE before they go, and there is
+no post_delete receiver on the link models, so the collector still fast
+deletes them in one statement. All of them run inside the transaction of
+the write.
+
+Deleted recipes, tags and ingredients also leave a Tombstone for delta
+sync clients, see recipe/sync.py, and recipes whose tags or ingredients
+change through the M2M managers get a new updated_at.
+
+Recipes saved one at a time or deleted by the collector are counted into
+the library statistics, see core/stats.py.
+"""
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import stats
+from core.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+    Tombstone,
+    adjust_ingredient_counts,
+    adjust_recipe_counts,
+    uncount_ingredient_links,
+    uncount_recipe_links,
+)
+
+
+def _target_id(instance):
+    return getattr(instance, f'{instance.target_field}_id')
+
+
+@receiver(pre_save, sender=RecipeTag)
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_target(sender, instance, **kwargs):
+    """Note the tag/ingredient an existing link pointed to before saving"""
+    if not instance._state.adding:
+        instance._previous_target_id = sender.objects.filter(
+            pk=instance.pk,
+        ).values_list(f'{sender.target_field}_id', flat=True).first()
+
+
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_save, sender=RecipeIngredient)
+def count_saved_link(sender, instance, created, **kwargs):
+    target_id = _target_id(instance)
+    if created:
+        adjust_recipe_counts(sender, {target_id: 1})
+        if sender is RecipeIngredient:
+            adjust_ingredient_counts({instance.recipe_id: 1})
+        return
+    previous = getattr(instance, '_previous_target_id', None)
+    if previous is not None and previous != target_id:
+        adjust_recipe_counts(sender, {previous: -1, target_id: 1})
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def count_removed_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """Take the links remove() and clear() are about to delete off counts"""
+    if action not in ('pre_remove', 'pre_clear'):
+        return
+    own, other = (sender.target_field, 'recipe') if reverse else \
+        ('recipe', sender.target_field)
+    links = sender.objects.filter(user_id=instance.user_id, **{own: instance})
+    if action == 'pre_remove':
+        links = links.filter(**{f'{other}__in': pk_set})
+    uncount_recipe_links(sender, links)
+    if sender is RecipeIngredient:
+        uncount_ingredient_links(links)
+
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_recipe(sender, instance, **kwargs):
+    """Release the tags and ingredients of a recipe about to be deleted"""
+    for link_model in (RecipeTag, RecipeIngredient):
+        uncount_recipe_links(
+            link_model,
+            link_model.objects.filter(user_id=instance.user_id,
+                                      recipe=instance),
+        )
+
+
+@receiver(pre_delete, sender=Ingredient)
+def uncount_ingredient(sender, instance, **kwargs):
+    """Take an ingredient about to be deleted off its recipes"""
+    uncount_ingredient_links(
+        RecipeIngredient.objects.filter(user_id=instance.user_id,
+                                        ingredient=instance),
+    )
+
+
+_STAT_FIELDS = {'price', 'time_minutes'}
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_stat_row(sender, instance, update_fields=None, **kwargs):
+    """Note the statistics row of an existing recipe before saving"""
+    if instance._state.adding:
+        return
+    if update_fields is not None and not _STAT_FIELDS & set(update_fields):
+        return
+    #Locked until Recipe.save() commits, so a concurrent edit can't apply
+    #its deltas against the same previous row
+    instance._previous_stat_row = sender.objects.select_for_update().filter(
+        pk=instance.pk,
+    ).values_list('price', 'time_minutes', 'created_at').first()
+
+
+@receiver(post_save, sender=Recipe)
+def count_saved_recipe(sender, instance, created, **kwargs):
+    row = stats.recipe_row(instance)
+    if created:
+        stats.apply(instance.user_id, stats.deltas([row]))
+        return
+    previous = instance.__dict__.pop('_previous_stat_row', None)
+    #Most saves change neither price, time nor month
+    if previous is not None and stats.recipe_row_changed(previous, row):
+        stats.apply(instance.user_id, stats.merge(
+            stats.deltas([previous], sign=-1),
+            stats.deltas([row]),
+        ))
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    stats.apply(
+        instance.user_id,
+        stats.deltas([stats.recipe_row(instance)], sign=-1),
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        kind=sender._meta.model_name,
+        object_id=instance.pk,
+    )
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def touch_recipes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Move updated_at of recipes whose tags or ingredients changed"""
+    if reverse:
+        #instance is the tag/ingredient, a clear() affects all its recipes
+        if action == 'pre_clear':
+            instance._cleared_recipe_ids = list(
+                sender.objects.filter(
+                    **{sender.target_field: instance},
+                ).values_list('recipe_id', flat=True)
+            )
+            return
+        if action == 'post_clear':
+            recipe_ids = instance.__dict__.pop('_cleared_recipe_ids', [])
+        else:
+            recipe_ids = pk_set
+    else:
+        recipe_ids = [instance.pk]
+
+    if action in ('post_add', 'post_remove', 'post_clear') and recipe_ids:
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            updated_at=timezone.now(),
+        )
@@ -0,0 +1,211 @@
+"""
+Per-user library statistics kept in rollup rows
+
+RecipeStat rows hold, per user, the number of recipes and the sum of the
+bucketed value for every price bucket, time_minutes bucket and creation
+month. They are adjusted in the transaction of each recipe write: bulk
+inserts in RecipeQuerySet, single saves (Recipe.save() opens one) and
+collector deletes in core/signals.py and batched deletes in
+core/deletion.py. A summary reads
+a number of rows bounded by the buckets, whatever the library size.
+rebuild() recomputes a user's rows from the recipes.
+"""
+
+import bisect
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.models import Recipe, RecipeStat, Tag
+
+
+def recipe_row(recipe):
+    """The (price, time_minutes, created_at) statistics look at"""
+    return (Decimal(str(recipe.price)), recipe.time_minutes,
+            recipe.created_at)
+
+
+def recipe_row_changed(previous, row):
+    """True when the statistics of two recipe_row() tuples differ"""
+    (old_price, old_minutes, old_created), (price, minutes, created) = \
+        previous, row
+    return (
+        Decimal(str(old_price)) != price
+        or old_minutes != minutes
+        or month_bucket(old_created) != month_bucket(created)
+    )
+
+
+def price_bucket(price):
+    width = settings.STATS_PRICE_BUCKET_CENTS
+    return int(price * 100) // width * width
+
+
+def time_bucket(minutes):
+    edges = settings.STATS_TIME_BUCKETS
+    return edges[max(bisect.bisect_right(edges, minutes) - 1, 0)]
+
+
+def month_bucket(created_at):
+    return created_at.year * 100 + created_at.month
+
+
+def deltas(rows, sign=1):
+    """{(kind, bucket): [recipes, total]} for recipe_row() tuples"""
+    result = {}
+    for price, minutes, created_at in rows:
+        for key, value in (
+            ((RecipeStat.PRICE, price_bucket(price)), price),
+            ((RecipeStat.TIME, time_bucket(minutes)), minutes),
+            ((RecipeStat.MONTH, month_bucket(created_at)), 0),
+        ):
+            entry = result.setdefault(key, [0, 0])
+            entry[0] += sign
+            entry[1] += sign * value
+    return result
+
+
+def merge(*changes):
+    """Sum several deltas() results"""
+    result = {}
+    for change in changes:
+        for key, (recipes, total) in change.items():
+            entry = result.setdefault(key, [0, 0])
+            entry[0] += recipes
+            entry[1] += total
+    return result
+
+
+def apply(user_id, changes):
+    """Add deltas() to the user's rows with one upsert"""
+    #In key order so concurrent writers lock the rows in the same order
+    changes = sorted(
+        (key, change) for key, change in changes.items()
+        if change[0] or change[1]
+    )
+    if not changes:
+        return
+    table = connection.ops.quote_name(RecipeStat._meta.db_table)
+    rows = ', '.join(['(%s, %s, %s, %s, %s)'] * len(changes))
+    params = [
+        value
+        for (kind, bucket), (recipes, total) in changes
+        for value in (user_id, kind, bucket, recipes, total)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, kind, bucket, recipes, total) '
+            f'VALUES {rows} '
+            'ON CONFLICT (user_id, kind, bucket) DO UPDATE SET '
+            f'recipes = {table}.recipes + EXCLUDED.recipes, '
+            f'total = {table}.total + EXCLUDED.total',
+            params,
+        )
+
+
+def rebuild(user):
+    """Recompute the user's rows from their recipes"""
+    rows = Recipe.objects.filter(user=user).values_list(
+        'price', 'time_minutes', 'created_at',
+    )
+    with transaction.atomic():
+        RecipeStat.objects.filter(user=user).delete()
+        changes = deltas(rows.iterator(chunk_size=10000))
+        RecipeStat.objects.bulk_create(
+            RecipeStat(
+                user=user,
+                kind=kind,
+                bucket=bucket,
+                recipes=recipes,
+                total=total,
+            )
+            for (kind, bucket), (recipes, total) in sorted(changes.items())
+            if recipes
+        )
+    return len(changes)
+
+
+def _median(buckets, count, upper):
+    """Median of [(lower bound, recipes)], interpolated inside its bucket"""
+    middle = count / 2
+    seen = 0
+    for lower, recipes in buckets:
+        if seen + recipes >= middle:
+            end = upper(lower)
+            if end is None:
+                return lower
+            return lower + (end - lower) * (middle - seen) / recipes
+        seen += recipes
+    return None
+
+
+def _time_upper(lower):
+    #Rows written with other STATS_TIME_BUCKETS keep working until rebuilt
+    edges = settings.STATS_TIME_BUCKETS
+    index = bisect.bisect_right(edges, lower)
+    return edges[index] if index < len(edges) else None
+
+
+def summary(user):
+    """Library statistics of the user from the rollup rows"""
+    rows = {RecipeStat.PRICE: [], RecipeStat.TIME: [], RecipeStat.MONTH: []}
+    for kind, bucket, recipes, total in RecipeStat.objects.filter(
+        user=user,
+        recipes__gt=0,
+    ).order_by('kind', 'bucket').values_list(
+        'kind', 'bucket', 'recipes', 'total',
+    ):
+        rows[kind].append((bucket, recipes, total))
+
+    count = sum(recipes for bucket, recipes, total in rows[RecipeStat.PRICE])
+    result = {'recipes': count, 'price': None, 'time_minutes': None}
+    if count:
+        width = settings.STATS_PRICE_BUCKET_CENTS
+        prices = rows[RecipeStat.PRICE]
+        times = rows[RecipeStat.TIME]
+        result['price'] = {
+            'average': round(sum(t for b, r, t in prices) / count, 2),
+            'median': round(Decimal(_median(
+                [(bucket, recipes) for bucket, recipes, total in prices],
+                count,
+                lambda lower: lower + width,
+            )) / 100, 2),
+        }
+        result['time_minutes'] = {
+            'average': round(float(sum(t for b, r, t in times)) / count, 1),
+            'median': round(float(_median(
+                [(bucket, recipes) for bucket, recipes, total in times],
+                count,
+                _time_upper,
+            )), 1),
+            'distribution': [
+                {
+                    'min_minutes': bucket,
+                    'max_minutes': _time_upper(bucket),
+                    'recipes': recipes,
+                }
+                for bucket, recipes, total in times
+            ],
+        }
+
+    result['tags'] = [
+        {'id': id, 'name': name, 'recipes': recipes}
+        for id, name, recipes in Tag.objects.filter(
+            user=user,
+            recipe_count__gt=0,
+        ).order_by('-recipe_count', 'name').values_list(
+            'id', 'name', 'recipe_count',
+        )[:settings.STATS_TOP_TAGS]
+    ]
+
+    result['growth'] = []
+    cumulative = 0
+    for month, recipes, total in rows[RecipeStat.MONTH]:
+        cumulative += recipes
+        result['growth'].append({
+            'month': f'{month // 100:04d}-{month % 100:02d}',
+            'recipes': recipes,
+            'total': cumulative,
+        })
+    return result
@@ -1,7 +1,18 @@
+import io
+import tempfile
+from decimal import Decimal
+
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 
+from core import admin, models
+
 class AdminSiteTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -32,4 +43,248 @@ class AdminSiteTests(TestCase):
         url = reverse("admin:core_user_add")
         res = self.client.get(url)
 
-        self.assertEqual(res.status_code, 200)
\ No newline at end of file
+        self.assertEqual(res.status_code, 200)
+
+    def test_delete_user_confirmation_counts(self):
+        """Test the confirmation page counts the data instead of listing it"""
+        for title in ('Curry', 'Toast'):
+            models.Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=5,
+                price=Decimal('1.00'),
+            )
+        url = reverse('admin:core_user_delete', args=[self.user.id])
+
+        res = self.client.get(url)
+
+        self.assertContains(res, 'Recipes: 2')
+        self.assertNotContains(res, 'Curry')
+
+    def test_delete_user_queues_job(self):
+        """Test deleting a user in the admin queues a deletion job"""
+        url = reverse('admin:core_user_delete', args=[self.user.id])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(url, {'post': 'yes'})
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(len(callbacks), 1)
+        job = models.DeletionJob.objects.get()
+        self.assertEqual(job.kind, models.DeletionJob.USER)
+        self.assertEqual(job.status, models.DeletionJob.PENDING)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+
+class RecipeAdminTests(TestCase):
+    """Test the changelists of the per-user tables"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@example.com",
+            password="testpass123"
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.other = get_user_model().objects.create_user(
+            email="other@example.com",
+            password="testpass123",
+        )
+        for user, title in [(self.user, 'Curry'), (self.other, 'Toast')]:
+            recipe = models.Recipe.objects.create(
+                user=user,
+                title=title,
+                time_minutes=5,
+                price=Decimal('1.00'),
+            )
+            recipe.tags.add(models.Tag.objects.create(user=user, name=title))
+
+    def test_changelists(self):
+        """Test the changelists render with their owners"""
+        for name in ('recipe', 'tag', 'ingredient'):
+            res = self.client.get(reverse(f'admin:core_{name}_changelist'))
+
+            self.assertEqual(res.status_code, 200)
+        res = self.client.get(reverse('admin:core_recipe_changelist'))
+        self.assertContains(res, f'?user={self.user.id}')
+
+    def test_changelist_queries_do_not_grow(self):
+        """Test owners are joined rather than fetched per row"""
+        url = reverse('admin:core_recipe_changelist')
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        for i in range(5):
+            models.Recipe.objects.create(
+                user=self.other,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('1.00'),
+            )
+
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(url)
+
+        self.assertEqual(len(before), len(after))
+
+    def test_filter_by_user(self):
+        """Test filtering the changelist by owner"""
+        url = reverse('admin:core_recipe_changelist')
+
+        res = self.client.get(url, {'user': self.user.id})
+
+        self.assertContains(res, 'Curry')
+        self.assertNotContains(res, 'Toast')
+
+    def test_search(self):
+        """Test searching recipes by title"""
+        url = reverse('admin:core_recipe_changelist')
+
+        res = self.client.get(url, {'q': 'curr'})
+
+        self.assertContains(res, 'Curry')
+        self.assertNotContains(res, 'Toast')
+
+    def test_small_results_are_counted(self):
+        """Test results below the threshold get an exact count"""
+        queryset = models.Recipe.objects.all()
+
+        self.assertEqual(admin.estimated_count(queryset), 2)
+
+
+class RecipeChangeFormTests(TestCase):
+    """Test the recipe change form stays small"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@example.com",
+            password="testpass123"
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.other = get_user_model().objects.create_user(
+            email="other@example.com",
+            password="testpass123",
+        )
+        self.recipe = models.Recipe.objects.create(
+            user=self.user,
+            title='Curry',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        self.tag = models.Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(self.tag)
+        self.foreign_tag = models.Tag.objects.create(
+            user=self.other,
+            name='Secret Tag',
+        )
+        self.url = reverse('admin:core_recipe_change', args=[self.recipe.id])
+
+    def form_data(self, tag_id):
+        return {
+            'user': self.user.id,
+            'title': 'Curry',
+            'description': '',
+            'time_minutes': 5,
+            'price': '1.00',
+            'link': '',
+            'recipetag_set-TOTAL_FORMS': 1,
+            'recipetag_set-INITIAL_FORMS': 0,
+            'recipetag_set-0-tag': tag_id,
+            'recipeingredient_set-TOTAL_FORMS': 0,
+            'recipeingredient_set-INITIAL_FORMS': 0,
+        }
+
+    def test_change_form_is_lazy(self):
+        """Test users, tags and ingredients are not rendered as choices"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotContains(res, 'Secret Tag')
+        self.assertNotContains(res, 'other@example.com')
+        self.assertContains(res, 'admin-autocomplete')
+        self.assertContains(res, f'_to_field=id&amp;user={self.user.id}')
+
+    def test_foreign_tag_rejected(self):
+        """Test another user's tag can't be linked to the recipe"""
+        self.recipe.tags.clear()
+
+        res = self.client.post(self.url, self.form_data(self.foreign_tag.id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, 'Must belong to the owner of the recipe.')
+        self.assertFalse(self.recipe.tags.exists())
+
+    def test_own_tag_linked(self):
+        """Test the owner's tag is linked with the owner on the row"""
+        self.recipe.tags.clear()
+        image = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(image, format='JPEG')
+        data = self.form_data(self.tag.id)
+        data['image'] = SimpleUploadedFile('curry.jpg', image.getvalue())
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                self.settings(MEDIA_ROOT=media_root):
+            res = self.client.post(self.url, data)
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(
+            models.RecipeTag.objects.get(recipe=self.recipe).user,
+            self.user,
+        )
+
+    def test_removed_link_touches_recipe(self):
+        """Test links removed in the inline update counts and updated_at"""
+        link = models.RecipeTag.objects.get(recipe=self.recipe)
+        data = self.form_data(self.tag.id)
+        data.update({
+            'recipetag_set-INITIAL_FORMS': 1,
+            'recipetag_set-0-id': link.id,
+            'recipetag_set-0-recipe': self.recipe.id,
+            'recipetag_set-0-DELETE': 'on',
+        })
+        image = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(image, format='JPEG')
+        data['image'] = SimpleUploadedFile('curry.jpg', image.getvalue())
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                self.settings(MEDIA_ROOT=media_root), \
+                CaptureQueriesContext(connection) as queries:
+            res = self.client.post(self.url, data)
+
+        self.assertEqual(res.status_code, 302)
+        self.assertFalse(self.recipe.tags.exists())
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 0)
+        sql = [query['sql'] for query in queries]
+        link_delete = max(
+            i for i, query in enumerate(sql)
+            if query.startswith('DELETE FROM "core_recipe_tags"')
+        )
+        touch = max(
+            i for i, query in enumerate(sql)
+            if query.startswith('UPDATE "core_recipe" SET "updated_at"')
+        )
+        self.assertGreater(touch, link_delete)
+
+    def test_user_autocomplete(self):
+        """Test users are looked up with paginated JSON"""
+        res = self.client.get(reverse('admin:autocomplete'), {
+            'term': 'other',
+            'app_label': 'core',
+            'model_name': 'recipe',
+            'field_name': 'user',
+        })
+
+        self.assertEqual(
+            [r['text'] for r in res.json()['results']],
+            ['other@example.com'],
+        )
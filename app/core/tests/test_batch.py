@@ -0,0 +1,127 @@
+"""
+Tests for the batch endpoint
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.tests.helpers import create_recipe
+
+BATCH_URL = reverse('batch')
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+ME_URL = reverse('user:me')
+
+
+class BatchApiTests(TestCase):
+    """Test dispatching sub-requests through the batch endpoint"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+            name='Test Name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        Tag.objects.create(user=self.user, name='Vegan')
+
+    def batch(self, *requests, **options):
+        return self.client.post(
+            BATCH_URL,
+            {'requests': list(requests), **options},
+            format='json',
+        )
+
+    def test_responses_in_order(self):
+        """Test each sub-request gets the response of its own call"""
+        res = self.batch(
+            {'path': ME_URL},
+            {'path': f'{TAGS_URL}?assigned_only=0'},
+            {
+                'method': 'POST',
+                'path': RECIPES_URL,
+                'body': {
+                    'title': 'Curry',
+                    'time_minutes': 10,
+                    'price': '4.00',
+                },
+            },
+            {'path': f'{RECIPES_URL}0/'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        me, tags, created, missing = res.data['responses']
+        self.assertEqual(me['status'], 200)
+        self.assertEqual(me['body']['name'], 'Test Name')
+        self.assertEqual([tag['name'] for tag in tags['body']], ['Vegan'])
+        self.assertEqual(created['status'], 201)
+        self.assertTrue(Recipe.objects.filter(user=self.user).exists())
+        self.assertEqual(missing['status'], 404)
+
+    def test_authenticated_once(self):
+        """Test sub-requests reuse the batch's authentication"""
+        #Token lookup, then one query per listing
+        with self.assertNumQueries(3):
+            res = self.batch({'path': TAGS_URL}, {'path': RECIPES_URL})
+
+        self.assertEqual(
+            [item['status'] for item in res.data['responses']],
+            [200, 200],
+        )
+
+    def test_rejected_batches(self):
+        """Test non-API paths, nested batches and oversized batches"""
+        for path in ('/admin/', BATCH_URL):
+            res = self.batch({'path': path})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.batch(*[{'path': TAGS_URL}] * 21)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_streaming_not_batched(self):
+        """Test streaming responses are refused per sub-request"""
+        res = self.batch({'path': reverse('recipe:recipe-export')})
+
+        self.assertEqual(res.data['responses'][0]['status'], 400)
+
+    def test_auth_required(self):
+        """Test the batch needs authentication"""
+        res = APIClient().post(
+            BATCH_URL,
+            {'requests': [{'path': ME_URL}]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ConcurrentBatchTests(TransactionTestCase):
+    """Test GET-only batches run concurrently on their own connections"""
+
+    def test_concurrent_gets(self):
+        user = get_user_model().objects.create_user('user@example.com')
+        create_recipe(user, 'Curry')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.post(
+            BATCH_URL,
+            {
+                'requests': [{'path': RECIPES_URL}, {'path': ME_URL}] * 3,
+                'concurrent': True,
+            },
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        responses = res.data['responses']
+        self.assertEqual([item['status'] for item in responses], [200] * 6)
+        self.assertEqual(responses[4]['body'][0]['title'], 'Curry')
+        self.assertEqual(responses[5]['body']['email'], 'user@example.com')
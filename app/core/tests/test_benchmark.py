@@ -0,0 +1,88 @@
+"""
+Tests for the API benchmark harness
+"""
+import tempfile
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from core import benchmark
+
+
+def endpoint_result(queries=2, p95_ms=10.0, rps=100.0):
+    return {
+        'queries': queries,
+        'concurrency': {'1': {'p95_ms': p95_ms, 'rps': rps}},
+    }
+
+
+class BenchmarkStatsTests(SimpleTestCase):
+    """Test percentile and baseline comparison"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        samples = list(range(1, 101))
+
+        self.assertEqual(benchmark.percentile(samples, 50), 50)
+        self.assertEqual(benchmark.percentile(samples, 99), 99)
+        self.assertEqual(benchmark.percentile([5], 95), 5)
+
+    def test_compare_within_tolerance(self):
+        """Test small changes are not reported"""
+        regressions = benchmark.compare(
+            {'tags': endpoint_result(p95_ms=11.0)},
+            {'tags': endpoint_result(p95_ms=10.0)},
+            tolerance=0.2,
+        )
+
+        self.assertEqual(regressions, [])
+
+    def test_compare_reports_regressions(self):
+        """Test latency, throughput and query regressions are reported"""
+        regressions = benchmark.compare(
+            {'tags': endpoint_result(queries=3, p95_ms=20.0, rps=50.0)},
+            {'tags': endpoint_result()},
+            tolerance=0.2,
+        )
+
+        self.assertEqual(len(regressions), 3)
+
+
+class BenchmarkRunTests(TransactionTestCase):
+    """Test a small benchmark run end to end"""
+
+    def test_run_benchmark(self):
+        """Test every endpoint is driven without errors"""
+        user, token = benchmark.seed_dataset(recipes=3, tags=2, ingredients=2)
+        recipe_id = user.recipe_set.values_list('id', flat=True).first()
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(
+                    ALLOWED_HOSTS=['127.0.0.1', 'testserver'],
+                    MEDIA_ROOT=media_root,
+                ):
+            results = benchmark.run_benchmark(
+                token,
+                recipe_id,
+                concurrency=[2],
+                requests=2,
+            )
+
+        self.assertEqual(set(results), set(benchmark.endpoints(recipe_id)))
+        for result in results.values():
+            self.assertEqual(result['concurrency']['2']['errors'], 0)
+            self.assertGreater(result['queries'], 0)
+
+    def test_compare_middleware(self):
+        """Test both middleware stacks are timed per endpoint"""
+        user, token = benchmark.seed_dataset(recipes=3, tags=2, ingredients=2)
+        recipe_id = user.recipe_set.values_list('id', flat=True).first()
+
+        results = benchmark.compare_middleware(
+            token,
+            recipe_id,
+            names=['tags'],
+            requests=3,
+        )
+
+        self.assertEqual(set(results['tags']), {'full', 'lean', 'saving_ms'})
+        self.assertGreater(results['tags']['lean'], 0)
@@ -1,3 +1,5 @@
+import json
+from io import StringIO
 from unittest.mock import patch
 
 # Connecting to db before its ready
@@ -5,6 +7,7 @@ from psycopg2 import OperationalError as Psycog2Error
 
 # Calling command by name
 from django.core.management import call_command
+from django.core.management.base import CommandError
 
 # Database exception
 from django.db.utils import OperationalError
@@ -13,27 +16,82 @@ from django.db.utils import OperationalError
 from django.test import SimpleTestCase
 
 
-@patch("core.management.commands.wait_for_db.Command.check")
+@patch("core.management.commands.wait_for_db.Command.probe")
 class CommandTests(SimpleTestCase):
-    def test_wait_for_db_ready(self, patched_check):
+    def test_wait_for_db_ready(self, patched_probe):
         """Test Waiting for db if db already ready"""
-        patched_check.return_value = True
+        patched_probe.return_value = None
 
-        call_command("wait_for_db")
-        patched_check.assert_called_once_with(databases=["default"])
+        call_command("wait_for_db", stdout=StringIO())
+        patched_probe.assert_called_once_with("default")
 
     # Usually there is a sleep interval each time database is called
     # This is useful in production
     # However in testing , it slows test down so we remove it
     @patch("time.sleep")
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
+    def test_wait_for_db_delay(self, patched_sleep, patched_probe):
         """Test Waiting for database when getting OperationalError"""
         # 2 times psycog2Error is called to check if postgres is initialized
         # and 3 times OperationalError is called to check if devdb is created
-        # in 6th time, True returns db successfully launched
-        patched_check.side_effect = [Psycog2Error] * 2 + \
-            [OperationalError] * 3 + [True]
-        call_command("wait_for_db")
-        # 6 times patched_check is called, 2+3+1
-        self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=["default"])
+        # in 6th time, None returns db successfully launched
+        patched_probe.side_effect = [Psycog2Error] * 2 + \
+            [OperationalError] * 3 + [None]
+        call_command("wait_for_db", stdout=StringIO())
+        # 6 times patched_probe is called, 2+3+1
+        self.assertEqual(patched_probe.call_count, 6)
+        self.assertEqual(patched_sleep.call_count, 5)
+        patched_probe.assert_called_with("default")
+
+    @patch("time.sleep")
+    def test_wait_for_db_backoff_is_capped(self, patched_sleep, patched_probe):
+        """Test retry delays never exceed the maximum delay"""
+        patched_probe.side_effect = [OperationalError] * 8 + [None]
+
+        call_command(
+            "wait_for_db",
+            initial_delay=1,
+            max_delay=2,
+            stdout=StringIO(),
+        )
+
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(len(delays), 8)
+        self.assertTrue(all(0 <= delay <= 2 for delay in delays))
+
+    def test_wait_for_db_timeout(self, patched_probe):
+        """Test the command fails once the timeout is exhausted"""
+        patched_probe.side_effect = OperationalError
+
+        with self.assertRaises(CommandError):
+            call_command("wait_for_db", timeout=0, stdout=StringIO())
+
+    def test_wait_for_db_report(self, patched_probe):
+        """Test the JSON report lists every probed database"""
+        out = StringIO()
+
+        call_command("wait_for_db", report=True, stdout=out)
+
+        report = json.loads(out.getvalue().splitlines()[1])
+        self.assertEqual(report['phase'], 'wait_for_db')
+        self.assertTrue(report['databases']['default']['available'])
+        self.assertEqual(report['databases']['default']['attempts'], 1)
+
+
+@patch("core.management.commands.startup.call_command")
+class StartupCommandTests(SimpleTestCase):
+    def test_startup_runs_phases_in_order(self, patched_call):
+        """Test startup runs each phase and reports its timing"""
+        out = StringIO()
+
+        call_command("startup", stdout=out)
+
+        names = [c.args[0] for c in patched_call.call_args_list]
+        self.assertEqual(
+            names,
+            ['wait_for_db', 'collectstatic', 'build_schema', 'migrate'],
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            [phase['name'] for phase in report['phases']],
+            names,
+        )
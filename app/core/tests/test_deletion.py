@@ -0,0 +1,121 @@
+"""
+Tests for batched deletion
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import deletion
+from core.models import (
+    DeletionJob,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+
+
+def create_library(user, recipes=5):
+    tag = Tag.objects.create(user=user, name='Vegan')
+    ingredient = Ingredient.objects.create(user=user, name='Rice')
+    for i in range(recipes):
+        recipe = Recipe.objects.create(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+
+class DeletionTests(TestCase):
+    """Test deleting users and recipes in batches"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        create_library(self.user)
+        create_library(self.other)
+
+    def test_delete_recipes_in_batches(self):
+        """Test recipes and links go in batches of the given size"""
+        batches = []
+
+        deleted = deletion.delete_recipes(
+            self.user,
+            batch_size=2,
+            progress=batches.append,
+        )
+
+        self.assertEqual(deleted, 5)
+        # Each recipe takes its tag and ingredient link with it
+        self.assertEqual(batches, [6, 6, 3])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        self.assertFalse(RecipeTag.objects.filter(user=self.user).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 5)
+
+    def test_delete_selected_recipes(self):
+        """Test only the user's own selected recipes are deleted"""
+        own = list(Recipe.objects.filter(user=self.user)[:2])
+        foreign = Recipe.objects.filter(user=self.other).first()
+
+        deleted = deletion.delete_recipes(
+            self.user,
+            [own[0].id, own[1].id, foreign.id],
+            batch_size=1,
+        )
+
+        self.assertEqual(deleted, 2)
+        self.assertTrue(Recipe.objects.filter(id=foreign.id).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+
+    def test_delete_user(self):
+        """Test the user and everything they own is removed"""
+        deletion.delete_user(self.user, batch_size=2)
+
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        for model in (Recipe, Tag, Ingredient, RecipeIngredient):
+            self.assertFalse(model.objects.filter(user=self.user.id).exists())
+        self.assertEqual(Tag.objects.filter(user=self.other).count(), 1)
+
+    def test_run_job_keeps_status(self):
+        """Test a finished user job outlives the user"""
+        job = DeletionJob.objects.create(
+            user=self.user,
+            email=self.user.email,
+            kind=DeletionJob.USER,
+        )
+
+        deletion.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertIsNone(job.user)
+        # 5 recipes, 10 links, the tag, the ingredient, the user and the
+        # price, time and month statistics rows
+        self.assertEqual(job.deleted, 21)
+
+    def test_run_deletion_jobs_command(self):
+        """Test the command queues and runs a user deletion"""
+        call_command(
+            'run_deletion_jobs', email='user@example.com', stdout=StringIO(),
+        )
+
+        self.assertEqual(
+            DeletionJob.objects.get().status,
+            DeletionJob.DONE,
+        )
+        self.assertFalse(Recipe.objects.filter(user=self.user.id).exists())
@@ -1,13 +1,20 @@
 """
 Test for the health check API
 """
+import tempfile
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+READINESS_URL = reverse('readiness-check')
+
+
 class HealthCheckTests(TestCase):
     """Test the health check API"""
 
@@ -17,4 +24,75 @@ class HealthCheckTests(TestCase):
         url = reverse('health-check')
         res = client.get(url)
 
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'healthy': True})
+
+    @override_settings(MIDDLEWARE=[])
+    def test_health_check_without_middleware(self):
+        """Test the liveness view answers when the middleware is off"""
+        client = APIClient()
+        res = client.get(reverse('health-check'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'healthy': True})
+
+
+class ReadinessCheckTests(TestCase):
+    """Test the readiness probe"""
+
+    def setUp(self):
+        self.client = APIClient()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def test_readiness_check(self):
+        """Test readiness reports database and media checks"""
+        res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        body = res.json()
+        self.assertTrue(body['ready'])
+        self.assertIn('latency_ms', body['checks']['database'])
+        self.assertTrue(body['checks']['media']['ok'])
+
+    @patch('core.health.check_readiness')
+    def test_readiness_is_cached(self, patched_check):
+        """Test repeated probes reuse the cached result"""
+        patched_check.return_value = {'ready': True, 'checks': {}}
+
+        self.client.get(READINESS_URL)
+        self.client.get(READINESS_URL)
+
+        patched_check.assert_called_once()
+
+    @patch('core.health.connection')
+    def test_readiness_fails_without_database(self, patched_connection):
+        """Test readiness returns 503 when the database is down"""
+        patched_connection.vendor = 'postgresql'
+        patched_connection.cursor.side_effect = OperationalError('down')
+
+        with self.assertLogs('core.health', level='ERROR'):
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(
+            res.json()['checks']['database'],
+            {'ok': False, 'error': 'database_unavailable'},
+        )
+
+    def test_readiness_fails_when_media_unwritable(self):
+        """Test readiness returns 503 when media can't be written"""
+        with override_settings(MEDIA_ROOT='/nonexistent/media'), \
+                self.assertLogs('core.health', level='ERROR'):
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(
+            res.json()['checks']['media'],
+            {'ok': False, 'error': 'media_unwritable'},
+        )
+        self.assertNotIn('nonexistent', res.content.decode())
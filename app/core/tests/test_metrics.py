@@ -0,0 +1,120 @@
+"""
+Tests for the metrics middleware and endpoint
+"""
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+
+METRICS_URL = reverse('metrics')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class MetricsTests(TestCase):
+    """Test request metrics collection"""
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_request_recorded_per_view(self):
+        """Test requests are counted under their resolved view name"""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        counters, histograms = metrics.collect()
+        labels = (('view', 'recipe:recipe-list'), ('method', 'GET'))
+        self.assertEqual(
+            counters[('requests_total', labels + (('status', '200'),))],
+            2,
+        )
+        self.assertEqual(
+            histograms[('request_duration_seconds', labels)][-1],
+            2,
+        )
+        # Token lookup plus the recipe query
+        self.assertGreaterEqual(histograms[('db_queries', labels)][-2], 4)
+        self.assertGreater(
+            histograms[('serializer_duration_seconds', labels)][-2],
+            0,
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        """Test the endpoint exposes counters and histograms"""
+        self.client.get(RECIPES_URL)
+
+        res = APIClient().get(
+            METRICS_URL,
+            HTTP_AUTHORIZATION='Bearer secret',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        body = res.content.decode()
+        self.assertIn(
+            'recipe_api_requests_total{view="recipe:recipe-list",'
+            'method="GET",status="200"} 1',
+            body,
+        )
+        self.assertIn('recipe_api_response_bytes_bucket{', body)
+        self.assertIn('le="+Inf"', body)
+
+    def test_metrics_summed_across_workers(self):
+        """Test snapshots written by other processes are aggregated"""
+        labels = [['view', 'recipe:recipe-list'], ['method', 'GET']]
+        other = {
+            'counters': [
+                ['requests_total', labels + [['status', '200']], 5],
+            ],
+            'histograms': [],
+        }
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with open(os.path.join(metrics_dir, 'metrics-1.json'), 'w') as f:
+                json.dump(other, f)
+            with override_settings(METRICS_DIR=metrics_dir):
+                self.client.get(RECIPES_URL)
+                counters, histograms = metrics.collect()
+
+        key = ('requests_total', tuple(map(tuple, labels)) + (
+            ('status', '200'),
+        ))
+        self.assertEqual(counters[key], 6)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_required(self):
+        """Test the endpoint checks the token when one is configured"""
+        client = APIClient()
+
+        res = client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_without_token_only_in_debug(self):
+        """Test the endpoint is closed without a token outside DEBUG"""
+        client = APIClient()
+
+        res = client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(DEBUG=True):
+            res = client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
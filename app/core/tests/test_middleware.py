@@ -0,0 +1,71 @@
+"""
+Tests for skipping browser middleware on API routes
+"""
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.middleware import BrowserCsrfViewMiddleware
+
+
+def view(request):
+    return HttpResponse()
+
+
+class APIPassthroughTests(TestCase):
+    """Test API requests skip sessions, CSRF, auth and messages"""
+
+    def test_api_request_skips_browser_middleware(self):
+        """Test an API request gets no session, messages or lazy user"""
+        user = get_user_model().objects.create_user('user@example.com')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(reverse('recipe:tag-list'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(hasattr(res.wsgi_request, 'session'))
+        self.assertFalse(hasattr(res.wsgi_request, '_messages'))
+        self.assertNotIn('csrftoken', res.cookies)
+
+    def test_admin_keeps_browser_middleware(self):
+        """Test admin pages still use the session and CSRF"""
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com',
+            'testpass123',
+        )
+        self.client.force_login(admin)
+
+        res = self.client.get(reverse('admin:index'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.wsgi_request.user, admin)
+        self.assertTrue(hasattr(res.wsgi_request, '_messages'))
+
+    def test_csrf_view_check_skipped_for_api(self):
+        """Test process_view only enforces CSRF outside the API"""
+        middleware = BrowserCsrfViewMiddleware(view)
+        factory = RequestFactory()
+
+        api = middleware.process_view(
+            factory.post('/api/user/create/'), view, (), {},
+        )
+        admin = middleware.process_view(
+            factory.post('/admin/login/'), view, (), {},
+        )
+
+        self.assertIsNone(api)
+        self.assertEqual(admin.status_code, 403)
+
+    def test_admin_checks_pass(self):
+        """Test the subclasses satisfy the admin middleware checks"""
+        errors = [
+            message.id for message in checks.run_checks()
+            if message.id.startswith('admin.E4')
+        ]
+
+        self.assertEqual(errors, [])
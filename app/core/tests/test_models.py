@@ -78,6 +78,29 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_recipe_links_copy_recipe_owner(self):
+        """Test tag/ingredient links added to a recipe carry its user"""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Sample recipe name',
+            time_minutes=5,
+            price=Decimal('5.50'),
+        )
+        tag = models.Tag.objects.create(user=user, name='Tag1')
+        ingredient = models.Ingredient.objects.create(user=user, name='Salt')
+
+        recipe.tags.add(tag)
+        ingredient.recipe_set.add(recipe)
+
+        link = models.RecipeTag.objects.get(recipe=recipe, tag=tag)
+        self.assertEqual(link.user, user)
+        link = models.RecipeIngredient.objects.get(
+            recipe=recipe,
+            ingredient=ingredient,
+        )
+        self.assertEqual(link.user, user)
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path"""
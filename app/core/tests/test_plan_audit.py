@@ -0,0 +1,98 @@
+"""
+Tests for the query plan audit
+"""
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import benchmark, plan_audit
+
+
+def plan(*nodes):
+    return [{'Plan': {'Node Type': 'Limit', 'Plans': list(nodes)}}]
+
+
+class PlanFindingsTests(SimpleTestCase):
+    """Test findings extracted from PostgreSQL plans"""
+
+    def test_route_names(self):
+        """Test every API route is listed"""
+        names = plan_audit.route_names()
+
+        self.assertIn('recipe:recipe-list', names)
+        self.assertIn('recipe:tag-detail', names)
+        self.assertIn('user:me', names)
+
+    def test_seq_scan_suggests_index(self):
+        """Test large sequential scans suggest filter and sort columns"""
+        findings = plan_audit._postgres_findings(plan({
+            'Node Type': 'Sort',
+            'Sort Key': ['core_recipe.id DESC'],
+            'Sort Space Type': 'Memory',
+            'Plans': [{
+                'Node Type': 'Seq Scan',
+                'Relation Name': 'core_recipe',
+                'Filter': '(user_id = 7)',
+                'Actual Rows': 50,
+                'Rows Removed by Filter': 99950,
+                'Actual Loops': 1,
+            }],
+        }), min_rows=1000)
+
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings[0]['kind'], 'seq_scan')
+        self.assertEqual(findings[0]['rows'], 100000)
+        self.assertEqual(
+            findings[0]['suggested_index'],
+            'core_recipe(user_id, id)',
+        )
+
+    def test_small_scans_ignored(self):
+        """Test sequential scans below min_rows are not reported"""
+        findings = plan_audit._postgres_findings(plan({
+            'Node Type': 'Seq Scan',
+            'Relation Name': 'core_tag',
+            'Actual Rows': 10,
+            'Actual Loops': 1,
+        }), min_rows=1000)
+
+        self.assertEqual(findings, [])
+
+    def test_disk_sort(self):
+        """Test sorts spilling to disk are reported"""
+        findings = plan_audit._postgres_findings(plan({
+            'Node Type': 'Sort',
+            'Sort Key': ['core_recipe.title'],
+            'Sort Method': 'external merge',
+            'Sort Space Type': 'Disk',
+            'Sort Space Used': 4096,
+            'Actual Rows': 200000,
+        }), min_rows=1000)
+
+        self.assertEqual([f['kind'] for f in findings], ['disk_sort'])
+
+
+class PlanAuditRunTests(TestCase):
+    """Test an audit run against a small dataset"""
+
+    def test_run_audit(self):
+        """Test every route is requested, succeeds and is rolled back"""
+        user, token = benchmark.seed_dataset(recipes=3, tags=2, ingredients=2)
+        recipes = user.recipe_set.count()
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(
+                    MEDIA_ROOT=media_root,
+                    IMPORT_UPLOAD_ROOT=media_root,
+                ):
+            report = plan_audit.run_audit(
+                user,
+                benchmark.BENCHMARK_PASSWORD,
+                token.key,
+            )
+
+        self.assertEqual(report['uncovered'], [])
+        for results in report['routes'].values():
+            for result in results:
+                self.assertLess(result['status'], 300, result['path'])
+        self.assertEqual(user.recipe_set.count(), recipes)
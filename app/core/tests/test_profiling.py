@@ -0,0 +1,93 @@
+"""
+Tests for the SQL profiler middleware
+"""
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.profiling import fingerprint
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class FingerprintTests(SimpleTestCase):
+    """Test SQL fingerprinting"""
+
+    def test_values_do_not_change_fingerprint(self):
+        """Test statements differing only in values match"""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) LIMIT 5"),
+        )
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE name = 'a'"),
+            fingerprint("SELECT  *  FROM t WHERE name = 'b'"),
+        )
+
+    def test_different_tables_differ(self):
+        """Test statements against different tables don't match"""
+        self.assertNotEqual(
+            fingerprint("SELECT * FROM a WHERE id = %s"),
+            fingerprint("SELECT * FROM b WHERE id = %s"),
+        )
+
+
+@override_settings(
+    SQL_PROFILER_TOKEN='secret',
+    SQL_PROFILER_SAMPLE_RATE=0,
+    SQL_PROFILER_N_PLUS_ONE=3,
+    SQL_PROFILER_SLOW_MS=0,
+)
+@patch('core.profiling.get_logger')
+class SQLProfilerTests(TestCase):
+    """Test profiling recipe list requests"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('5.00'),
+            )
+            recipe.tags.add(tag)
+
+    def test_profile_not_recorded_without_header(self, patched_logger):
+        """Test requests are not profiled unless sampled or requested"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('X-SQL-Queries', res)
+        patched_logger.assert_not_called()
+
+    def test_wrong_token_ignored(self, patched_logger):
+        """Test the header only works with the configured token"""
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE_SQL='guess')
+
+        self.assertNotIn('X-SQL-Queries', res)
+
+    def test_n_plus_one_detected(self, patched_logger):
+        """Test per-recipe tag and ingredient queries are flagged"""
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE_SQL='secret')
+
+        self.assertEqual(res['X-SQL-N-Plus-One'], '2')
+        report = json.loads(patched_logger.return_value.info.call_args[0][0])
+        self.assertEqual(report['queries'], int(res['X-SQL-Queries']))
+        flagged = report['n_plus_one'][0]
+        self.assertEqual(flagged['count'], 3)
+        self.assertTrue(
+            any('serializers.py' in frame for frame in flagged['stack'])
+        )
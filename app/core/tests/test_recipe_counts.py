@@ -0,0 +1,283 @@
+"""
+Tests for the maintained recipe_count of tags and ingredients
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import deletion
+from core.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+
+
+class RecipeCountTests(TestCase):
+    """Test recipe_count follows every kind of link change"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.other_tag = Tag.objects.create(user=self.user, name='Quick')
+        self.r1 = self.create_recipe('Curry')
+        self.r2 = self.create_recipe('Salad')
+
+    def create_recipe(self, title):
+        return Recipe.objects.create(
+            user=self.user,
+            title=title,
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+    def assertCount(self, obj, expected):
+        obj.refresh_from_db()
+        self.assertEqual(obj.recipe_count, expected)
+
+    def test_add_and_remove(self):
+        """Test M2M add, remove and clear on both sides"""
+        self.r1.tags.add(self.tag, self.other_tag)
+        self.tag.recipe_set.add(self.r2)
+        self.assertCount(self.tag, 2)
+        self.assertCount(self.other_tag, 1)
+
+        self.r1.tags.add(self.tag)
+        self.r1.tags.remove(self.tag)
+        self.assertCount(self.tag, 1)
+
+        self.tag.recipe_set.clear()
+        self.r1.tags.clear()
+        self.assertCount(self.tag, 0)
+        self.assertCount(self.other_tag, 0)
+
+    def test_set(self):
+        """Test replacing the tags of a recipe"""
+        self.r1.tags.set([self.tag])
+
+        self.r1.tags.set([self.other_tag])
+
+        self.assertCount(self.tag, 0)
+        self.assertCount(self.other_tag, 1)
+
+    def test_single_link_saves(self):
+        """Test links created or moved one at a time"""
+        link = RecipeTag.objects.create(recipe=self.r1, tag=self.tag)
+        self.assertCount(self.tag, 1)
+
+        link.tag = self.other_tag
+        link.save()
+
+        self.assertCount(self.tag, 0)
+        self.assertCount(self.other_tag, 1)
+
+        link.delete()
+
+        self.assertCount(self.other_tag, 0)
+
+    def test_recipe_delete(self):
+        """Test deleting a recipe releases its tags and ingredients"""
+        ingredient = Ingredient.objects.create(user=self.user, name='Rice')
+        self.r1.tags.add(self.tag)
+        self.r1.ingredients.add(ingredient)
+
+        self.r1.delete()
+
+        self.assertCount(self.tag, 0)
+        self.assertCount(ingredient, 0)
+
+    def test_ignore_conflicts(self):
+        """Test skipped duplicate links are not counted"""
+        self.r1.tags.add(self.tag)
+
+        RecipeTag.objects.bulk_create(
+            [
+                RecipeTag(recipe=self.r1, tag=self.tag),
+                RecipeTag(recipe=self.r2, tag=self.tag),
+            ],
+            ignore_conflicts=True,
+        )
+
+        self.assertCount(self.tag, 2)
+
+    def test_batched_recipe_delete(self):
+        """Test the batched deletion path updates the counts"""
+        self.r1.tags.add(self.tag)
+        self.r2.tags.add(self.tag)
+
+        deletion.delete_recipes(self.user, [self.r1.id])
+
+        self.assertCount(self.tag, 1)
+
+    def test_reconcile(self):
+        """Test the command reports and repairs drift"""
+        self.r1.tags.add(self.tag)
+        Tag.objects.filter(id=self.tag.id).update(recipe_count=7)
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', dry_run=True, stdout=out)
+
+        self.assertIn('tags: 1 with a wrong recipe_count', out.getvalue())
+        self.assertCount(self.tag, 7)
+
+        call_command('reconcile_recipe_counts', stdout=StringIO())
+
+        self.assertCount(self.tag, 1)
+
+
+class IngredientCountTests(TestCase):
+    """Test Recipe.ingredient_count follows the ingredient links"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.rice, self.egg = (
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Egg')
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Fried rice',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+    def assertCount(self, expected):
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.ingredient_count, expected)
+
+    def test_links_added_and_removed(self):
+        """Test M2M changes, single links and ingredient deletes"""
+        self.recipe.ingredients.add(self.rice, self.egg)
+        self.assertCount(2)
+
+        self.recipe.ingredients.remove(self.rice)
+        self.assertCount(1)
+
+        RecipeIngredient.objects.create(
+            recipe=self.recipe,
+            ingredient=self.rice,
+        )
+        self.assertCount(2)
+
+        self.egg.delete()
+        self.assertCount(1)
+
+    def test_ignore_conflicts(self):
+        """Test skipped duplicate links are not counted"""
+        self.recipe.ingredients.add(self.rice)
+
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(recipe=self.recipe, ingredient=self.rice),
+                RecipeIngredient(recipe=self.recipe, ingredient=self.egg),
+            ],
+            ignore_conflicts=True,
+        )
+
+        self.assertCount(2)
+
+    def test_reconcile(self):
+        """Test the command repairs a drifted ingredient_count"""
+        self.recipe.ingredients.add(self.rice)
+        Recipe.objects.update(ingredient_count=5)
+        out = StringIO()
+
+        call_command('reconcile_recipe_counts', stdout=out)
+
+        self.assertIn('recipes: 1 with a wrong ingredient_count',
+                      out.getvalue())
+        self.assertCount(1)
+
+
+class LinkDeleteQueryTests(TestCase):
+    """Test deleting links costs the same whatever their number"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count):
+        return [
+            Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('1.00'),
+            )
+            for i in range(count)
+        ]
+
+    def create_tags(self, count, prefix='Tag'):
+        return [
+            Tag.objects.create(user=self.user, name=f'{prefix} {i}')
+            for i in range(count)
+        ]
+
+    def test_tag_delete(self):
+        """Test the links of a deleted tag go in one DELETE"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for recipe in self.create_recipes(50):
+            recipe.tags.add(tag)
+
+        #The links, the tag and its tombstone
+        with self.assertNumQueries(3):
+            tag.delete()
+
+        self.assertFalse(RecipeTag.objects.exists())
+
+    def test_recipe_delete(self):
+        """Test a recipe with many links is released in grouped UPDATEs"""
+        recipe = self.create_recipes(1)[0]
+        tags = self.create_tags(10)
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'Ingredient {i}')
+            for i in range(10)
+        ]
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(*ingredients)
+
+        #2 recipe_count UPDATEs, 2 link DELETEs, the recipe, the library
+        #statistics upsert and the tombstone
+        with self.assertNumQueries(7):
+            recipe.delete()
+
+        for obj in tags + ingredients:
+            obj.refresh_from_db()
+            self.assertEqual(obj.recipe_count, 0)
+
+    def test_replace_tags(self):
+        """Test a PATCH replacing 10 tags doesn't delete links one by one"""
+        recipe = self.create_recipes(1)[0]
+        old_tags = self.create_tags(10)
+        recipe.tags.add(*old_tags)
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        payload = {'tags': [{'name': f'New {i}'} for i in range(10)]}
+
+        #4 per new tag for get_or_create, 1 for the recipe, 3 for clear()
+        #(counts, links, updated_at), 4 for add() (existing links, INSERT,
+        #counts, updated_at), 2 for the save and 2 for the response
+        with self.assertNumQueries(52):
+            res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for tag in old_tags:
+            tag.refresh_from_db()
+            self.assertEqual(tag.recipe_count, 0)
+        self.assertEqual(
+            set(Tag.objects.filter(recipe_count=1).values_list(
+                'name', flat=True,
+            )),
+            {f'New {i}' for i in range(10)},
+        )
@@ -0,0 +1,78 @@
+"""
+Tests for the prebuilt OpenAPI schema
+"""
+import json
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class SchemaTests(TestCase):
+    """Test building and serving the schema artifact"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.schema_dir.cleanup)
+
+    def test_build_schema_writes_versioned_files(self):
+        """Test build writes one content-addressed file per format"""
+        manifest = schema.build_schema(self.schema_dir.name)
+
+        self.assertEqual(set(manifest), {'yaml', 'json'})
+        with open(os.path.join(
+            self.schema_dir.name,
+            manifest['json']['file'],
+        )) as f:
+            self.assertIn('/api/recipe/recipes/', json.load(f)['paths'])
+        self.assertIn(manifest['json']['etag'], manifest['json']['file'])
+
+    def test_schema_served_from_artifact(self):
+        """Test the view serves the artifact with caching headers"""
+        manifest = schema.build_schema(self.schema_dir.name)
+
+        with override_settings(SCHEMA_DIR=self.schema_dir.name, DEBUG=False):
+            res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['ETag'], f'"{manifest["json"]["etag"]}"')
+        self.assertIn('max-age', res['Cache-Control'])
+
+    def test_schema_not_modified(self):
+        """Test a matching If-None-Match returns 304"""
+        manifest = schema.build_schema(self.schema_dir.name)
+        etag = f'"{manifest["yaml"]["etag"]}"'
+
+        with override_settings(SCHEMA_DIR=self.schema_dir.name, DEBUG=False):
+            res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_schema_generated_live_without_artifact(self):
+        """Test the view falls back to live generation"""
+        with override_settings(SCHEMA_DIR=self.schema_dir.name, DEBUG=False):
+            res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
+
+    def test_artifact_built_after_a_miss(self):
+        """Test a schema built after a lookup found none is served"""
+        self.assertIsNone(schema.load_artifact('json', self.schema_dir.name))
+
+        # As if built by another process, which can't clear this cache
+        cached = dict(schema._artifacts)
+        manifest = schema.build_schema(self.schema_dir.name)
+        schema._artifacts.update(cached)
+
+        content, etag = schema.load_artifact('json', self.schema_dir.name)
+        self.assertEqual(etag, manifest['json']['etag'])
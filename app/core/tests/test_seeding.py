@@ -0,0 +1,78 @@
+"""
+Tests for the synthetic data seeding
+"""
+import random
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+
+from core import models
+from core.seeding import ZipfSampler, library_sizes
+
+
+class ZipfSamplerTests(SimpleTestCase):
+    """Test the skewed samplers"""
+
+    def test_low_ranks_are_most_common(self):
+        """Test rank 0 is drawn more often than the tail"""
+        sampler = ZipfSampler(50, 1.1, random.Random(0))
+        draws = [sampler.sample() for _ in range(5000)]
+
+        self.assertTrue(all(0 <= rank < 50 for rank in draws))
+        self.assertGreater(draws.count(0), draws.count(49) * 10)
+
+    def test_sample_distinct(self):
+        """Test distinct samples never exceed the population"""
+        sampler = ZipfSampler(3, 1.1, random.Random(0))
+
+        self.assertEqual(len(sampler.sample_distinct(2)), 2)
+        self.assertEqual(sampler.sample_distinct(10), {0, 1, 2})
+
+    def test_library_sizes(self):
+        """Test every recipe is assigned and runs are reproducible"""
+        sizes = library_sizes(10, 1000, 1.1, seed=3)
+
+        self.assertEqual(sum(sizes), 1000)
+        self.assertEqual(sizes, library_sizes(10, 1000, 1.1, seed=3))
+        self.assertEqual(max(sizes), sizes[0])
+
+
+class SeedDataCommandTests(TestCase):
+    """Test the seed_data command"""
+
+    def test_seed_data(self):
+        """Test the requested rows are created with owned links"""
+        out = StringIO()
+        call_command(
+            'seed_data',
+            users=3,
+            recipes=40,
+            tags_per_user=4,
+            ingredients_per_user=6,
+            batch_size=7,
+            workers=4,
+            stdout=out,
+        )
+
+        self.assertEqual(models.User.objects.count(), 3)
+        self.assertEqual(models.Recipe.objects.count(), 40)
+        self.assertEqual(models.Tag.objects.count(), 12)
+        self.assertEqual(models.Ingredient.objects.count(), 18)
+        self.assertTrue(models.RecipeIngredient.objects.exists())
+        for model in (models.RecipeTag, models.RecipeIngredient):
+            self.assertFalse(
+                model.objects.exclude(user=F('recipe__user')).exists()
+            )
+        self.assertIn('rows/sec', out.getvalue())
+
+    def test_seeded_user_can_log_in(self):
+        """Test seeded users share the given password"""
+        call_command(
+            'seed_data', users=1, recipes=1, password='pass-1234',
+            stdout=StringIO(),
+        )
+
+        user = models.User.objects.get()
+        self.assertTrue(user.check_password('pass-1234'))
@@ -0,0 +1,191 @@
+"""
+Tests for the library statistics rollup rows
+"""
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from core import deletion, stats
+from core.models import Recipe, RecipeStat
+
+
+def stat_rows(user):
+    return sorted(
+        RecipeStat.objects.filter(user=user, recipes__gt=0).values_list(
+            'kind', 'bucket', 'recipes', 'total',
+        )
+    )
+
+
+class RecipeStatTests(TestCase):
+    """Test the rows follow recipe writes and match a rebuild"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+
+    def create_recipe(self, price='5.50', time_minutes=20):
+        return Recipe.objects.create(
+            user=self.user,
+            title='Curry',
+            time_minutes=time_minutes,
+            price=Decimal(price),
+        )
+
+    def assertMatchesRebuild(self):
+        maintained = stat_rows(self.user)
+        stats.rebuild(self.user)
+        self.assertEqual(maintained, stat_rows(self.user))
+
+    def test_buckets(self):
+        """Test prices, times and months fall in the expected buckets"""
+        self.assertEqual(stats.price_bucket(Decimal('5.99')), 500)
+        self.assertEqual(stats.time_bucket(0), 0)
+        self.assertEqual(stats.time_bucket(44), 30)
+        self.assertEqual(stats.time_bucket(1000), 240)
+        self.assertEqual(
+            stats.month_bucket(datetime(2026, 3, 1, tzinfo=dt_timezone.utc)),
+            202603,
+        )
+
+    def test_create_update_delete(self):
+        """Test single saves and collector deletes adjust the rows"""
+        recipe = self.create_recipe()
+        self.create_recipe(price='12.00', time_minutes=90)
+        self.assertMatchesRebuild()
+
+        recipe.price = Decimal('7.25')
+        recipe.time_minutes = 50
+        recipe.save()
+        self.assertMatchesRebuild()
+
+        recipe.title = 'Stew'
+        with self.assertNumQueries(1):
+            recipe.save(update_fields=['title'])
+
+        #The statistics row is read, but unchanged so not written
+        recipe.title = 'Curry'
+        with self.assertNumQueries(2):
+            recipe.save()
+
+        recipe.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(
+            [row[:3] for row in stat_rows(self.user)
+             if row[0] == RecipeStat.PRICE],
+            [(RecipeStat.PRICE, 1200, 1)],
+        )
+
+    def test_bulk_create_and_batched_delete(self):
+        """Test bulk inserts and raw batch deletes adjust the rows"""
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=i * 10,
+                price=Decimal(i),
+            )
+            for i in range(1, 8)
+        )
+        self.assertMatchesRebuild()
+
+        deletion.delete_recipes(
+            self.user,
+            [recipe.id for recipe in recipes[:3]],
+            batch_size=2,
+        )
+        self.assertMatchesRebuild()
+        self.assertEqual(
+            sum(row[2] for row in stat_rows(self.user)
+                if row[0] == RecipeStat.PRICE),
+            4,
+        )
+
+    def test_summary(self):
+        """Test averages, interpolated medians and growth"""
+        march = datetime(2026, 3, 10, tzinfo=dt_timezone.utc)
+        april = datetime(2026, 4, 2, tzinfo=dt_timezone.utc)
+        for price, minutes, created_at in (
+            ('2.00', 10, march),
+            ('4.00', 20, march),
+            ('9.00', 100, april),
+        ):
+            with mock.patch('django.utils.timezone.now',
+                            return_value=created_at):
+                self.create_recipe(price=price, time_minutes=minutes)
+
+        with self.assertNumQueries(2):
+            summary = stats.summary(self.user)
+
+        self.assertEqual(summary['recipes'], 3)
+        self.assertEqual(summary['price']['average'], Decimal('5.00'))
+        self.assertEqual(summary['price']['median'], Decimal('4.50'))
+        self.assertEqual(summary['time_minutes']['average'], 43.3)
+        self.assertEqual(summary['time_minutes']['median'], 22.5)
+        self.assertEqual(
+            summary['time_minutes']['distribution'],
+            [
+                {'min_minutes': 0, 'max_minutes': 15, 'recipes': 1},
+                {'min_minutes': 15, 'max_minutes': 30, 'recipes': 1},
+                {'min_minutes': 90, 'max_minutes': 120, 'recipes': 1},
+            ],
+        )
+        self.assertEqual(summary['growth'], [
+            {'month': '2026-03', 'recipes': 2, 'total': 2},
+            {'month': '2026-04', 'recipes': 1, 'total': 3},
+        ])
+
+    def test_summary_after_bucket_change(self):
+        """Test rows of earlier time buckets still summarise"""
+        self.create_recipe(time_minutes=20)
+
+        with self.settings(STATS_TIME_BUCKETS=[0, 10, 60]):
+            summary = stats.summary(self.user)
+
+        self.assertEqual(
+            summary['time_minutes']['distribution'],
+            [{'min_minutes': 15, 'max_minutes': 60, 'recipes': 1}],
+        )
+
+    def test_rebuild_command(self):
+        """Test the command repairs drifted rows"""
+        self.create_recipe()
+        RecipeStat.objects.filter(user=self.user).update(recipes=9)
+        out = StringIO()
+
+        call_command('rebuild_recipe_stats', stdout=out)
+
+        self.assertIn('1 users rebuilt', out.getvalue())
+        self.assertEqual(
+            {row[2] for row in stat_rows(self.user)},
+            {1},
+        )
+
+
+class RecipeStatTransactionTests(TransactionTestCase):
+    """Test the rows commit or roll back with the recipe write"""
+
+    def test_failed_upsert_rolls_back_save(self):
+        """Test a recipe isn't saved without its statistics"""
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+
+        with mock.patch.object(stats, 'apply', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Recipe.objects.create(
+                    user=user,
+                    title='Curry',
+                    time_minutes=20,
+                    price=Decimal('5.50'),
+                )
+
+        self.assertFalse(Recipe.objects.exists())
@@ -1,11 +1,105 @@
 """
 Core view for app
 """
+import hmac
 
-from rest_framework.decorators import api_view
+from django.conf import settings
+from django.http import (
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotModified,
+    JsonResponse,
+)
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-@api_view(['GET'])
+from core import batch, health, metrics, schema
+from core.middleware import LIVENESS_BODY
+from core.serializers import BatchRequestSerializer, BatchResponseSerializer
+
+
+#Usually answered by HealthCheckMiddleware before reaching this view
+@require_GET
 def health_check(request):
-    """Returns successful response"""
-    return Response({'healthy':True})
\ No newline at end of file
+    """Liveness probe, returns successful response"""
+    return HttpResponse(LIVENESS_BODY, content_type='application/json')
+
+
+@require_GET
+def readiness_check(request):
+    """Readiness probe covering the database and media volume"""
+    result = health.readiness()
+    return JsonResponse(result, status=200 if result['ready'] else 503)
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus metrics aggregated over every worker process"""
+    token = settings.METRICS_TOKEN
+    if not token:
+        #Open only for local development, the proxy exposes /api/
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f'Bearer {token}'.encode(),
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+class SchemaView(SpectacularAPIView):
+    """Serve the prebuilt schema, generating it live in DEBUG"""
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        artifact = None
+        if not settings.DEBUG:
+            artifact = schema.load_artifact(renderer.format)
+        if artifact is None:
+            return super().get(request, *args, **kwargs)
+
+        content, etag = artifact
+        etag = f'"{etag}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=renderer.media_type)
+        response['ETag'] = etag
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.SCHEMA_CACHE_MAX_AGE,
+        )
+        return response
+
+
+#Screens that need several resources at startup make a single round trip
+class BatchView(APIView):
+    """Run several API requests with one authentication"""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=BatchRequestSerializer,
+        responses=BatchResponseSerializer,
+    )
+    def post(self, request):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        responses = batch.run(
+            request,
+            serializer.validated_data['requests'],
+            concurrent=serializer.validated_data['concurrent'],
+        )
+        return Response({'responses': responses})
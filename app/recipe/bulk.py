@@ -0,0 +1,165 @@
+"""
+Assign a tag or ingredient to many recipes at once, or take it away
+
+Each operation is one INSERT ... SELECT ... ON CONFLICT DO NOTHING or one
+DELETE against the link table. Both the recipes and the tag/ingredient
+are matched on the user inside that statement, so another user's rows can
+never be linked or unlinked. RETURNING gives the recipes that actually
+changed; in the same transaction the target's recipe_count and, for
+ingredients, the recipes' ingredient_count are adjusted, and the recipes
+get a new updated_at for delta sync and the caches built on it.
+
+merge() folds duplicate tags or ingredients into one the same way: the
+source links are copied onto the target with ON CONFLICT DO NOTHING and
+deleted, then the sources themselves, which leaves tombstones for sync.
+"""
+
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import (
+    Recipe,
+    RecipeIngredient,
+    adjust_ingredient_counts,
+    adjust_recipe_counts,
+)
+
+
+def select_recipes(user, ids=None, tags=None, ingredients=None):
+    """The user's recipes with any of the ids, tags and ingredients given"""
+    recipes = Recipe.objects.filter(user=user)
+    if ids is not None:
+        recipes = recipes.filter(id__in=ids)
+    if tags:
+        recipes = recipes.with_tags(user, tags)
+    if ingredients:
+        recipes = recipes.with_ingredients(user, ingredients)
+    return recipes
+
+
+def _names(link_model):
+    qn = connection.ops.quote_name
+    target = link_model.target_model()
+    column = link_model._meta.get_field(link_model.target_field).column
+    return (
+        qn(link_model._meta.db_table),
+        qn(column),
+        qn(Recipe._meta.db_table),
+        qn(target._meta.db_table),
+    )
+
+
+def _update_recipes(recipe_ids, **changes):
+    """Apply changes to the recipes in batches the backend accepts"""
+    recipe_ids = sorted(recipe_ids)
+    batch_size = connection.ops.bulk_batch_size(['id'], recipe_ids) or 1
+    for start in range(0, len(recipe_ids), batch_size):
+        Recipe.objects.filter(
+            id__in=recipe_ids[start:start + batch_size],
+        ).update(**changes)
+
+
+def _touch(link_model, recipe_ids, delta):
+    """Move updated_at, and ingredient_count by delta, of changed recipes"""
+    changes = {'updated_at': timezone.now()}
+    if link_model is RecipeIngredient:
+        changes['ingredient_count'] = F('ingredient_count') + delta
+    _update_recipes(recipe_ids, **changes)
+
+
+def _returned_recipe_ids(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _run(link_model, target_id, sql, params, delta):
+    with transaction.atomic():
+        recipe_ids = _returned_recipe_ids(sql, params)
+        adjust_recipe_counts(link_model, {target_id: delta * len(recipe_ids)})
+        _touch(link_model, recipe_ids, delta)
+    return len(recipe_ids)
+
+
+def assign(user, link_model, target_id, recipes):
+    """Link the tag/ingredient to the recipes, return how many were new"""
+    links, column, recipe_table, target_table = _names(link_model)
+    selection, selection_params = recipes.filter(user=user).order_by() \
+        .values('id').query.sql_with_params()
+    sql = (
+        f'INSERT INTO {links} (user_id, recipe_id, {column}) '
+        f'SELECT r.user_id, r.id, t.id FROM {recipe_table} r '
+        f'JOIN {target_table} t ON t.id = %s AND t.user_id = %s '
+        f'WHERE r.user_id = %s AND r.id IN ({selection}) '
+        'ON CONFLICT DO NOTHING RETURNING recipe_id'
+    )
+    params = [target_id, user.id, user.id, *selection_params]
+    return _run(link_model, target_id, sql, params, 1)
+
+
+def unassign(user, link_model, target_id, recipes=None):
+    """Unlink the tag/ingredient from the recipes (default all of them)"""
+    links, column, recipe_table, target_table = _names(link_model)
+    sql = f'DELETE FROM {links} WHERE user_id = %s AND {column} = %s'
+    params = [user.id, target_id]
+    if recipes is not None:
+        selection, selection_params = recipes.filter(user=user).order_by() \
+            .values('id').query.sql_with_params()
+        sql += f' AND recipe_id IN ({selection})'
+        params.extend(selection_params)
+    return _run(link_model, target_id, sql + ' RETURNING recipe_id', params,
+                -1)
+
+
+def merge(user, link_model, target_id, source_ids):
+    """Fold the source tags/ingredients into the target, in one transaction
+
+    Returns the number of recipes that used a source. Raises ValueError
+    when the target is among the sources, or the target or a source is not
+    one of the user's.
+    """
+    if target_id in source_ids:
+        raise ValueError(f'Cannot merge {target_id} into itself')
+    links, column, recipe_table, target_table = _names(link_model)
+    target_model = link_model.target_model()
+    wanted = {target_id, *source_ids}
+    with transaction.atomic():
+        #Concurrent merges of the same rows wait for this one
+        locked = target_model.objects.select_for_update().filter(
+            user=user,
+            id__in=wanted,
+        ).order_by('id').values_list('id', flat=True)
+        missing = wanted - set(locked)
+        if missing:
+            raise ValueError(f'Not found: {sorted(missing)}')
+
+        sources = ', '.join(['%s'] * len(source_ids))
+        #A recipe with several of the sources gets the target once
+        linked = _returned_recipe_ids(
+            f'INSERT INTO {links} (user_id, recipe_id, {column}) '
+            f'SELECT DISTINCT user_id, recipe_id, %s FROM {links} '
+            f'WHERE user_id = %s AND {column} IN ({sources}) '
+            'ON CONFLICT DO NOTHING RETURNING recipe_id',
+            [target_id, user.id, *source_ids],
+        )
+        unlinked = _returned_recipe_ids(
+            f'DELETE FROM {links} '
+            f'WHERE user_id = %s AND {column} IN ({sources}) '
+            'RETURNING recipe_id',
+            [user.id, *source_ids],
+        )
+
+        adjust_recipe_counts(link_model, {target_id: len(linked)})
+        if link_model is RecipeIngredient:
+            deltas = Counter(linked)
+            deltas.subtract(Counter(unlinked))
+            adjust_ingredient_counts(deltas)
+        affected = set(unlinked)
+        _update_recipes(affected, updated_at=timezone.now())
+
+        #Their links are gone, the collector only records the tombstones
+        target_model.objects.filter(user=user, id__in=source_ids).delete()
+    return len(affected)
@@ -0,0 +1,122 @@
+"""
+Streaming export of a user's recipe library
+
+Recipes are read with QuerySet.iterator(), which uses a server-side cursor
+on PostgreSQL, and their tag and ingredient names are fetched with one
+query per chunk. Output is produced chunk by chunk, optionally gzipped on
+the fly, so memory use depends on the chunk size and not on the library.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from django.conf import settings
+
+from core.models import Recipe, RecipeIngredient, RecipeTag
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+FIELDS = [
+    'id', 'title', 'description', 'time_minutes', 'price', 'link', 'image',
+]
+CSV_HEADER = FIELDS + ['tags', 'ingredients']
+# Separator for tag and ingredient names inside a CSV cell
+CSV_LIST_SEPARATOR = '|'
+
+
+def _names_by_recipe(model, name_field, user, recipe_ids):
+    names = {}
+    rows = model.objects.filter(
+        user=user,
+        recipe_id__in=recipe_ids,
+    ).values_list('recipe_id', name_field).order_by(name_field)
+    for recipe_id, name in rows:
+        names.setdefault(recipe_id, []).append(name)
+    return names
+
+
+def _with_links(user, rows):
+    ids = [row['id'] for row in rows]
+    tags = _names_by_recipe(RecipeTag, 'tag__name', user, ids)
+    ingredients = _names_by_recipe(
+        RecipeIngredient, 'ingredient__name', user, ids,
+    )
+    for row in rows:
+        row['price'] = str(row['price'])
+        row['image'] = row['image'] or None
+        row['tags'] = tags.get(row['id'], [])
+        row['ingredients'] = ingredients.get(row['id'], [])
+    return rows
+
+
+def iter_chunks(user, chunk_size=None):
+    """Yield lists of recipe dicts, including tag and ingredient names"""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    recipes = Recipe.objects.filter(user=user).order_by('id').values(*FIELDS)
+
+    chunk = []
+    for row in recipes.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _with_links(user, chunk)
+            chunk = []
+    if chunk:
+        yield _with_links(user, chunk)
+
+
+def ndjson_stream(chunks):
+    """One JSON document per recipe and line"""
+    for chunk in chunks:
+        yield ''.join(json.dumps(row) + '\n' for row in chunk).encode()
+
+
+def csv_stream(chunks):
+    """CSV with a header row, names joined by CSV_LIST_SEPARATOR"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow(
+                [row[field] for field in FIELDS] + [
+                    CSV_LIST_SEPARATOR.join(row['tags']),
+                    CSV_LIST_SEPARATOR.join(row['ingredients']),
+                ]
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only for an empty library
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_stream(stream):
+    """Compress a byte stream on the fly"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for data in stream:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(user, format='ndjson', compress=False, chunk_size=None):
+    """Byte stream of the user's recipes in format"""
+    if format not in FORMATS:
+        raise ValueError(f'Unknown export format: {format}')
+    chunks = iter_chunks(user, chunk_size)
+    if format == 'ndjson':
+        stream = ndjson_stream(chunks)
+    else:
+        stream = csv_stream(chunks)
+    return gzip_stream(stream) if compress else stream
+
+
+def filename(format, compress=False):
+    return f'recipes.{format}' + ('.gz' if compress else '')
@@ -0,0 +1,232 @@
+"""
+Batched NDJSON recipe import
+
+Input is parsed line by line and validated in batches. For each batch,
+tag and ingredient names are resolved with one query per model, and the
+missing ones are created. Recipes and their links are then inserted with
+bulk_create. The batch commits together with its ImportJob, so a crashed
+import resumes after the last committed line. Invalid lines are recorded
+on the job and skipped. The job row is locked for every batch, and a run
+that finds another run of the job committed first stops without writing.
+The API stores the upload on the job and imports it in a background
+thread, see start_job().
+"""
+
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from core.models import (
+    ImportJob,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ImportConflict(Exception):
+    """Another run of the job committed since this one read it"""
+
+
+class NameField(serializers.CharField):
+    """A tag or ingredient given as "name" or {"name": "..."}"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            data = data.get('name')
+        return super().to_internal_value(data)
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Validate one imported recipe without touching the database"""
+    tags = serializers.ListField(
+        child=NameField(max_length=255),
+        required=False,
+    )
+    ingredients = serializers.ListField(
+        child=NameField(max_length=255),
+        required=False,
+    )
+
+    class Meta:
+        model = Recipe
+        fields = [
+            'title', 'description', 'time_minutes', 'price', 'link', 'tags',
+            'ingredients',
+        ]
+
+
+def parse(lines, skip=0):
+    """Yield (line number, record, error) for each non-blank line"""
+    for number, line in enumerate(lines, start=1):
+        if number <= skip:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, {'json': [str(e)]}
+            continue
+        if not isinstance(record, dict):
+            yield number, None, {'json': ['Expected an object']}
+            continue
+        yield number, record, None
+
+
+def resolve(model, user, names):
+    """Map names to ids for the user, creating the missing objects"""
+    ids = dict(
+        model.objects.filter(user=user, name__in=names)
+        .order_by('-id')
+        .values_list('name', 'id')
+    )
+    missing = [name for name in names if name not in ids]
+    if missing:
+        created = model.objects.bulk_create(
+            model(user=user, name=name) for name in missing
+        )
+        ids.update((obj.name, obj.id) for obj in created)
+    return ids
+
+
+def write_batch(user, records):
+    """Insert validated records with their links, return the recipe count"""
+    tag_ids = resolve(Tag, user, sorted({
+        name for record in records for name in record.get('tags', [])
+    }))
+    ingredient_ids = resolve(Ingredient, user, sorted({
+        name for record in records for name in record.get('ingredients', [])
+    }))
+
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            user=user,
+            **{
+                key: value for key, value in record.items()
+                if key not in ('tags', 'ingredients')
+            },
+        )
+        for record in records
+    )
+    RecipeTag.objects.bulk_create(
+        RecipeTag(user=user, recipe=recipe, tag_id=tag_id)
+        for recipe, record in zip(recipes, records)
+        for tag_id in {tag_ids[name] for name in record.get('tags', [])}
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            user=user,
+            recipe=recipe,
+            ingredient_id=ingredient_id,
+        )
+        for recipe, record in zip(recipes, records)
+        for ingredient_id in {
+            ingredient_ids[name] for name in record.get('ingredients', [])
+        }
+    )
+    return len(recipes)
+
+
+def commit_batch(job, batch, errors, last_line, done=False):
+    """Write a batch and advance the job in one transaction"""
+    with transaction.atomic():
+        #Two runs of one job would otherwise both import the same lines
+        locked = ImportJob.objects.select_for_update().only(
+            'lines', 'status',
+        ).get(pk=job.pk)
+        if locked.lines != job.lines or locked.status == ImportJob.DONE:
+            raise ImportConflict(
+                f'Import {job.pk} is being run elsewhere, now at line '
+                f'{locked.lines}'
+            )
+        imported = write_batch(job.user, batch) if batch else 0
+        job.lines = last_line
+        job.imported += imported
+        job.failed += len(errors)
+        room = settings.IMPORT_MAX_ERRORS - len(job.errors)
+        job.errors.extend(errors[:max(room, 0)])
+        if done:
+            job.status = ImportJob.DONE
+        job.save(update_fields=[
+            'lines', 'imported', 'failed', 'errors', 'status', 'updated_at',
+        ])
+
+
+def run_import(job, lines, batch_size=None, log=None):
+    """Import lines into job.user, resuming after job.lines
+
+    Raises ImportConflict when another run of the job gets ahead of it.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    log = log or (lambda message: None)
+    batch, errors, last_line = [], [], job.lines
+
+    for number, record, error in parse(lines, skip=job.lines):
+        last_line = number
+        if error is None:
+            serializer = RecipeImportSerializer(data=record)
+            if serializer.is_valid():
+                batch.append(serializer.validated_data)
+            else:
+                error = serializer.errors
+        if error is not None:
+            errors.append({'line': number, 'errors': error})
+
+        if len(batch) + len(errors) >= batch_size:
+            commit_batch(job, batch, errors, last_line)
+            log(f'line {job.lines}: {job.imported} imported, '
+                f'{job.failed} failed')
+            batch, errors = [], []
+
+    commit_batch(job, batch, errors, last_line, done=True)
+    return job
+
+
+def run_job(job):
+    """Import the job's stored upload, recording a failure on the job"""
+    try:
+        with job.upload.open('rb') as upload:
+            run_import(job, upload)
+    except ImportConflict:
+        #The run that got ahead owns the job's outcome
+        raise
+    except Exception as e:
+        job.status = ImportJob.FAILED
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+
+    job.upload.delete(save=False)
+    job.save(update_fields=['upload', 'updated_at'])
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(ImportJob.objects.get(id=job_id))
+    except Exception:
+        logger.exception('Import job %s failed', job_id)
+    finally:
+        connection.close()
+
+
+def start_job(job):
+    """Run the job in a thread once the current transaction commits"""
+    thread = threading.Thread(
+        target=_run_in_thread,
+        args=(job.id,),
+        daemon=True,
+    )
+    transaction.on_commit(thread.start)
+    return job
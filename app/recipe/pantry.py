@@ -0,0 +1,38 @@
+"""
+"What can I cook" query over a pantry of ingredients
+
+Recipe.ingredient_count is maintained with the links, so a recipe is
+covered when the number of its links to pantry ingredients reaches that
+count. Only the links of the pantry ingredients are read, through the
+(user, ingredient) index of core_recipe_ingredients, and grouped per
+recipe; the user's other recipes are never scanned. Recipes without any
+pantry ingredient are not returned, even if they miss no more than the
+allowed number. Neither are recipes whose ingredient_count is 0, which
+only happens through drift (see reconcile_recipe_counts) and would divide
+by zero.
+"""
+
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Cast
+
+from core.models import RecipeIngredient
+
+
+def cookable(user, ingredient_ids, missing=0, limit=100):
+    """[(recipe id, matched, ingredient count)] best covered first"""
+    rows = RecipeIngredient.objects.filter(
+        user=user,
+        ingredient_id__in=ingredient_ids,
+    ).values('recipe_id', 'recipe__ingredient_count').annotate(
+        matched=Count('id'),
+    ).filter(
+        recipe__ingredient_count__gt=0,
+        recipe__ingredient_count__lte=F('matched') + missing,
+    ).annotate(
+        coverage=Cast('matched', FloatField())
+        / F('recipe__ingredient_count'),
+    ).order_by('-coverage', '-matched', '-recipe_id')
+    return [
+        (row['recipe_id'], row['matched'], row['recipe__ingredient_count'])
+        for row in rows[:limit]
+    ]
@@ -3,24 +3,29 @@ Serializers for Recipe API
 """
 
 from rest_framework import serializers
-from core.models import Ingredient, Recipe, Tag
+from core.metrics import TimedListSerializer, TimedSerializerMixin
+from core.models import DeletionJob, ImportJob, Ingredient, Recipe, Tag
+from recipe import export as recipe_export
 
 #Serializer for an specific Model
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for tags"""
     class Meta:
         model= Tag
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     """Serializer for ingredients"""
     class Meta:
         model = Ingredient
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for recipes"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -29,25 +34,34 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags as needed"""
         auth_user = self.context['request'].user
+        tag_objs = []
         for tag in tags:
             tag_obj, created = Tag.objects.get_or_create(
                 user=auth_user,
                 **tag,
             )
-            recipe.tags.add(tag_obj)
+            tag_objs.append(tag_obj)
+        #One add() inserts and counts all the links together
+        recipe.tags.add(*tag_objs, through_defaults={'user': auth_user})
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         auth_user = self.context['request'].user
+        ingredient_objs = []
         for ingredient in ingredients:
             ingredient_obj, created = Ingredient.objects.get_or_create(
                 user=auth_user,
                 **ingredient,
             )
-            recipe.ingredients.add(ingredient_obj)
+            ingredient_objs.append(ingredient_obj)
+        recipe.ingredients.add(
+            *ingredient_objs,
+            through_defaults={'user': auth_user},
+        )
 
     def create(self, validated_data):
         """Create a recipe"""
@@ -94,11 +108,234 @@ class RecipeDetailSerializer(RecipeSerializer):
 
 
 #Seperate serializer/api since we should use different apis for different data
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin,
+                            serializers.ModelSerializer):
     """Serializers for uploading image to recipe"""
 
     class Meta:
         model = Recipe
         fields = ['id', 'image']
         read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
\ No newline at end of file
+        extra_kwargs = {'image': {'required': 'True'}}
+
+    def update(self, instance, validated_data):
+        #Only the image changes, so the statistics row isn't read and locked
+        instance.image = validated_data['image']
+        instance.save(update_fields=['image', 'updated_at'])
+        return instance
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of a recipe import"""
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'source', 'status', 'lines', 'imported', 'failed',
+            'errors', 'error', 'created_at', 'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class RecipeImportRequestSerializer(serializers.Serializer):
+    """Serializer for an NDJSON upload, optionally resuming a job"""
+    file = serializers.FileField()
+    job = serializers.IntegerField(required=False)
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of a batched deletion"""
+
+    class Meta:
+        model = DeletionJob
+        fields = [
+            'id', 'kind', 'status', 'deleted', 'error', 'created_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class RecipeBulkDeleteSerializer(serializers.Serializer):
+    """Serializer for deleting many recipes at once"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+    )
+    background = serializers.BooleanField(default=False)
+
+
+class RecipeExportParamsSerializer(serializers.Serializer):
+    """Query parameters of a recipe export"""
+    export_format = serializers.ChoiceField(
+        choices=list(recipe_export.FORMATS),
+        default='ndjson',
+    )
+    gzip = serializers.BooleanField(default=False)
+
+
+class SyncParamsSerializer(serializers.Serializer):
+    """Query parameters of a delta sync"""
+    since = serializers.CharField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1)
+
+    def validate_since(self, value):
+        #recipe.sync serializes with the classes here
+        from recipe import sync
+
+        try:
+            sync.decode_cursor(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+
+class SyncChangeSerializer(serializers.Serializer):
+    """A created, updated or deleted recipe, tag or ingredient"""
+    kind = serializers.ChoiceField(choices=['recipe', 'tag', 'ingredient'])
+    id = serializers.IntegerField()
+    deleted = serializers.BooleanField()
+    data = serializers.JSONField(allow_null=True)
+
+
+class SyncPageSerializer(serializers.Serializer):
+    """A page of changes and the cursor to continue from"""
+    changes = SyncChangeSerializer(many=True)
+    cursor = serializers.CharField(allow_null=True)
+    has_more = serializers.BooleanField()
+
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    """An ingredient and how many of the selected recipes use it"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    """Merged ingredients of a set of recipes"""
+    ingredients = ShoppingListItemSerializer(many=True)
+
+
+class SimilarRecipeSerializer(serializers.Serializer):
+    """A recipe and its similarity to the requested one"""
+    score = serializers.FloatField()
+    recipe = RecipeSerializer()
+
+
+class PantryRecipeSerializer(serializers.Serializer):
+    """A recipe with how much of it the pantry covers"""
+    missing = serializers.IntegerField()
+    coverage = serializers.FloatField()
+    recipe = RecipeSerializer()
+
+
+class PriceStatsSerializer(serializers.Serializer):
+    average = serializers.DecimalField(max_digits=12, decimal_places=2)
+    median = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class TimeBucketSerializer(serializers.Serializer):
+    """Recipes taking from min_minutes up to max_minutes"""
+    min_minutes = serializers.IntegerField()
+    max_minutes = serializers.IntegerField(allow_null=True)
+    recipes = serializers.IntegerField()
+
+
+class TimeStatsSerializer(serializers.Serializer):
+    average = serializers.FloatField()
+    median = serializers.FloatField()
+    distribution = TimeBucketSerializer(many=True)
+
+
+class TagStatsSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipes = serializers.IntegerField()
+
+
+class GrowthSerializer(serializers.Serializer):
+    """Recipes added in a month and the library size at its end"""
+    month = serializers.CharField()
+    recipes = serializers.IntegerField()
+    total = serializers.IntegerField()
+
+
+class LibraryStatsSerializer(serializers.Serializer):
+    """Statistics of the user's recipe library"""
+    recipes = serializers.IntegerField()
+    price = PriceStatsSerializer(allow_null=True)
+    time_minutes = TimeStatsSerializer(allow_null=True)
+    tags = TagStatsSerializer(many=True)
+    growth = GrowthSerializer(many=True)
+
+
+class MultiGetSerializer(serializers.Serializer):
+    """Objects found by a multi-get and the ids that were not"""
+    missing = serializers.ListField(child=serializers.IntegerField())
+
+
+class RecipeMultiGetSerializer(MultiGetSerializer):
+    results = RecipeDetailSerializer(many=True)
+
+
+class TagMultiGetSerializer(MultiGetSerializer):
+    results = TagSerializer(many=True)
+
+
+class IngredientMultiGetSerializer(MultiGetSerializer):
+    results = IngredientSerializer(many=True)
+
+
+class RecipeSelectionSerializer(serializers.Serializer):
+    """Recipes to assign a tag/ingredient to, or to take it from"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+    )
+    #Recipes having any of these tags or ingredients, like the list filter
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+    )
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+    )
+    #Required to select every recipe, so an empty body changes nothing
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        chosen = any(
+            field in attrs for field in ('ids', 'tags', 'ingredients')
+        )
+        if chosen == attrs['all']:
+            raise serializers.ValidationError(
+                'Give ids, tags or ingredients, or all: true'
+            )
+        return attrs
+
+
+class BulkAssignResultSerializer(serializers.Serializer):
+    """Number of recipes that gained or lost the tag/ingredient"""
+    recipes = serializers.IntegerField()
+
+
+class MergeSerializer(serializers.Serializer):
+    """Tags or ingredients to fold into the one of the URL"""
+    sources = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+    )
+
+    def validate_sources(self, value):
+        #Checked before the merge opens its transaction and takes locks
+        if self.context['target_id'] in value:
+            raise serializers.ValidationError(
+                'Cannot merge a tag or ingredient into itself.'
+            )
+        return value
+
+
+class MergeResultSerializer(serializers.Serializer):
+    """Number of recipes that used a merged tag/ingredient"""
+    recipes = serializers.IntegerField()
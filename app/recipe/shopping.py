@@ -0,0 +1,58 @@
+"""
+Shopping list for a set of recipes
+
+The ingredients of the selected recipes are merged in one aggregate query
+over core_recipe_ingredients. Results are cached per user data version
+(see recipe/sync.py), so an unchanged library is answered from the cache
+and any change to it makes the old entries unreachable.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from core.models import RecipeIngredient
+from recipe import sync
+
+
+def _cache_key(user, version, recipe_ids):
+    digest = hashlib.sha1(','.join(
+        [str(timestamp and timestamp.timestamp()) for timestamp in version]
+        + [str(recipe_id) for recipe_id in recipe_ids]
+    ).encode()).hexdigest()
+    return f'shopping-list:{user.id}:{digest}'
+
+
+def aggregate(user, recipe_ids):
+    """Ingredients of the recipes with the number of recipes using each"""
+    rows = RecipeIngredient.objects.filter(
+        user=user,
+        recipe_id__in=recipe_ids,
+    ).values_list('ingredient_id', 'ingredient__name').annotate(
+        recipe_count=Count('recipe_id'),
+    ).order_by('ingredient__name', 'ingredient_id')
+    return [
+        {'id': id, 'name': name, 'recipe_count': recipe_count}
+        for id, name, recipe_count in rows
+    ]
+
+
+def shopping_list(user, recipe_ids):
+    """Cached aggregate() for the user's current data"""
+    recipe_ids = sorted(set(recipe_ids))
+    version = sync.data_version(user)
+    #Until then a late commit could change the data without a new version
+    cacheable = sync.settled(version)
+
+    key = _cache_key(user, version, recipe_ids)
+    if cacheable:
+        ingredients = cache.get(key)
+        if ingredients is not None:
+            return ingredients
+
+    ingredients = aggregate(user, recipe_ids)
+    if cacheable:
+        cache.set(key, ingredients, settings.SHOPPING_LIST_CACHE_TTL)
+    return ingredients
@@ -0,0 +1,247 @@
+"""
+Similar recipes by weighted Jaccard similarity of tags and ingredients
+
+Each user's library is indexed in memory: the features (tags and
+ingredients) of every recipe and, per feature, an array of the recipes
+having it. The similarity of two recipes is the weight of their shared
+features over the weight of all their features, with tags and ingredients
+weighted by SIMILAR_TAG_WEIGHT and SIMILAR_INGREDIENT_WEIGHT. A query only
+walks the postings of the recipe's own features, and features found in
+more than SIMILAR_MAX_POSTINGS recipes (salt, "dinner") only add to
+candidates found through rarer ones.
+
+Indexes live in the process, at most SIMILAR_INDEX_CACHE_USERS of them.
+Before each query the index applies the changes since it was last
+refreshed, read from updated_at and the tombstones like delta sync does
+(see recipe/sync.py). Libraries larger than
+SIMILAR_INLINE_BUILD_MAX_RECIPES are built in a background thread.
+"""
+
+import heapq
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from core.models import Recipe, RecipeIngredient, RecipeTag, Tombstone
+
+logger = logging.getLogger(__name__)
+
+_indexes = OrderedDict()
+_building = set()
+_lock = threading.Lock()
+
+
+def tag_feature(tag_id):
+    return tag_id * 2
+
+
+def ingredient_feature(ingredient_id):
+    return ingredient_id * 2 + 1
+
+
+def feature_weight(feature):
+    if feature % 2:
+        return settings.SIMILAR_INGREDIENT_WEIGHT
+    return settings.SIMILAR_TAG_WEIGHT
+
+
+def _horizon():
+    return timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+
+def read_features(user_id, recipe_ids=None):
+    """{recipe id: [feature]} from the link tables"""
+    features = {}
+    for model, field, to_feature in (
+        (RecipeTag, 'tag_id', tag_feature),
+        (RecipeIngredient, 'ingredient_id', ingredient_feature),
+    ):
+        links = model.objects.filter(user_id=user_id)
+        if recipe_ids is not None:
+            links = links.filter(recipe_id__in=recipe_ids)
+        for recipe_id, target_id in links.values_list(
+            'recipe_id', field,
+        ).iterator(chunk_size=10000):
+            features.setdefault(recipe_id, []).append(to_feature(target_id))
+    return features
+
+
+class SimilarityIndex:
+    """Recipe features and feature postings of one user's library"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.features = {}
+        self.totals = {}
+        self.postings = {}
+        self.synced_at = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, user_id):
+        index = cls(user_id)
+        synced_at = _horizon()
+        for recipe_id, features in read_features(user_id).items():
+            index.set_features(recipe_id, features)
+        index.synced_at = synced_at
+        return index
+
+    def set_features(self, recipe_id, features):
+        """Replace the features of a recipe"""
+        self.remove(recipe_id)
+        features = tuple(sorted(set(features)))
+        if not features:
+            return
+        self.features[recipe_id] = features
+        self.totals[recipe_id] = sum(map(feature_weight, features))
+        for feature in features:
+            self.postings.setdefault(feature, array('q')).append(recipe_id)
+
+    def remove(self, recipe_id):
+        features = self.features.pop(recipe_id, ())
+        self.totals.pop(recipe_id, None)
+        for feature in features:
+            postings = self.postings[feature]
+            postings.remove(recipe_id)
+            if not postings:
+                del self.postings[feature]
+
+    def remove_feature(self, feature):
+        """Drop a deleted tag or ingredient from every recipe"""
+        for recipe_id in self.postings.pop(feature, ()):
+            features = tuple(f for f in self.features[recipe_id]
+                             if f != feature)
+            if features:
+                self.features[recipe_id] = features
+                self.totals[recipe_id] -= feature_weight(feature)
+            else:
+                del self.features[recipe_id]
+                del self.totals[recipe_id]
+
+    def refresh(self):
+        """Apply changes made since the last refresh"""
+        with self.lock:
+            # Changes younger than the settle time are read again next time
+            synced_at = _horizon()
+            changed = list(Recipe.objects.filter(
+                user_id=self.user_id,
+                updated_at__gt=self.synced_at,
+            ).values_list('id', flat=True))
+            deleted = Tombstone.objects.filter(
+                user_id=self.user_id,
+                deleted_at__gt=self.synced_at,
+            ).values_list('kind', 'object_id')
+
+            for kind, object_id in deleted:
+                if kind == Tombstone.RECIPE:
+                    self.remove(object_id)
+                elif kind == Tombstone.TAG:
+                    self.remove_feature(tag_feature(object_id))
+                else:
+                    self.remove_feature(ingredient_feature(object_id))
+            if changed:
+                features = read_features(self.user_id, changed)
+                for recipe_id in changed:
+                    self.set_features(recipe_id, features.get(recipe_id, ()))
+            self.synced_at = synced_at
+
+    def similar(self, recipe_id, k):
+        """[(score, recipe id)] of the k most similar recipes"""
+        with self.lock:
+            features = self.features.get(recipe_id, ())
+            total = self.totals.get(recipe_id)
+            # Rare features first, they find the candidates
+            ordered = sorted(features, key=lambda f: len(self.postings[f]))
+
+            shared = {}
+            for feature in ordered:
+                weight = feature_weight(feature)
+                postings = self.postings[feature]
+                # The recipe itself is always in shared
+                if len(shared) > 1 and \
+                        len(postings) > settings.SIMILAR_MAX_POSTINGS:
+                    if len(postings) < len(shared):
+                        for other in postings:
+                            if other in shared:
+                                shared[other] += weight
+                    else:
+                        for other in shared:
+                            if feature in self.features[other]:
+                                shared[other] += weight
+                else:
+                    for other in postings:
+                        shared[other] = shared.get(other, 0) + weight
+            shared.pop(recipe_id, None)
+
+            totals = self.totals
+            return heapq.nlargest(k, (
+                (weight / (total + totals[other] - weight), other)
+                for other, weight in shared.items()
+            ))
+
+
+def _register(index):
+    with _lock:
+        _indexes[index.user_id] = index
+        _indexes.move_to_end(index.user_id)
+        while len(_indexes) > settings.SIMILAR_INDEX_CACHE_USERS:
+            _indexes.popitem(last=False)
+
+
+def _build_in_thread(user_id):
+    try:
+        _register(SimilarityIndex.build(user_id))
+    except Exception:
+        logger.exception('Similarity index of user %s failed', user_id)
+    finally:
+        with _lock:
+            _building.discard(user_id)
+        connection.close()
+
+
+def get_index(user):
+    """The user's refreshed index, or None while it is built in background"""
+    with _lock:
+        index = _indexes.get(user.id)
+        if index is not None:
+            _indexes.move_to_end(user.id)
+    if index is not None:
+        index.refresh()
+        return index
+
+    recipes = Recipe.objects.filter(user=user).count()
+    if recipes <= settings.SIMILAR_INLINE_BUILD_MAX_RECIPES:
+        index = SimilarityIndex.build(user.id)
+        _register(index)
+        return index
+
+    with _lock:
+        if user.id in _building:
+            return None
+        _building.add(user.id)
+    threading.Thread(
+        target=_build_in_thread,
+        args=(user.id,),
+        daemon=True,
+    ).start()
+    return None
+
+
+def similar_recipes(user, recipe_id, k):
+    """[(score, recipe id)] most similar to recipe_id, None while building"""
+    index = get_index(user)
+    if index is None:
+        return None
+    return index.similar(recipe_id, k)
+
+
+def clear():
+    """Forget every index of this process"""
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,208 @@
+"""
+Delta sync for offline-first clients
+
+Recipes, tags and ingredients carry updated_at, and deletes leave a
+Tombstone. A client keeps the cursor of its last sync and asks for what
+changed after it. The four sources are read with keyset queries and merged
+in (timestamp, kind, id) order, which is what the cursor encodes, so pages
+never skip or repeat a change. Changes younger than SYNC_SETTLE_SECONDS
+are left for the next sync, so a transaction that commits an older
+timestamp late is still picked up.
+"""
+
+import heapq
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, Tag, Tombstone
+from recipe import serializers
+
+Cursor = namedtuple('Cursor', ['timestamp', 'rank', 'id'])
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Merge order for changes with the same timestamp; tags and ingredients
+# come before the recipes that use them
+KINDS = [
+    ('tag', Tag, 'updated_at', serializers.TagSerializer),
+    ('ingredient', Ingredient, 'updated_at', serializers.IngredientSerializer),
+    ('recipe', Recipe, 'updated_at', serializers.RecipeDetailSerializer),
+    ('deleted', Tombstone, 'deleted_at', None),
+]
+
+
+class CursorExpired(Exception):
+    """The cursor is older than the tombstones kept, a full sync is needed"""
+
+
+def encode_cursor(cursor):
+    microseconds = (cursor.timestamp - EPOCH) // timedelta(microseconds=1)
+    return f'{microseconds}.{cursor.rank}.{cursor.id}'
+
+
+def decode_cursor(value):
+    """Parse a cursor from encode_cursor, raising ValueError if invalid"""
+    try:
+        microseconds, rank, id = (int(part) for part in value.split('.'))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not 0 <= rank < len(KINDS):
+        raise ValueError('Invalid cursor')
+    return Cursor(EPOCH + timedelta(microseconds=microseconds), rank, id)
+
+
+def _after(queryset, field, rank, cursor):
+    """Rows of the source with this rank that sort after cursor"""
+    if cursor is None:
+        return queryset
+    if rank < cursor.rank:
+        return queryset.filter(**{f'{field}__gt': cursor.timestamp})
+    if rank > cursor.rank:
+        return queryset.filter(**{f'{field}__gte': cursor.timestamp})
+    return queryset.filter(
+        Q(**{f'{field}__gt': cursor.timestamp})
+        | Q(**{field: cursor.timestamp, 'id__gt': cursor.id})
+    )
+
+
+def _positions(user, cursor, horizon, limit):
+    """Yield sorted (timestamp, rank, id) of every source, limit+1 each"""
+    for rank, (kind, model, field, serializer) in enumerate(KINDS):
+        #A first sync has nothing to delete
+        if serializer is None and cursor is None:
+            continue
+        queryset = _after(
+            model.objects.filter(user=user, **{f'{field}__lte': horizon}),
+            field,
+            rank,
+            cursor,
+        )
+        yield [
+            Cursor(timestamp, rank, id)
+            for timestamp, id in queryset.order_by(field, 'id').values_list(
+                field, 'id',
+            )[:limit + 1]
+        ]
+
+
+def _changes(request, page):
+    """Serialize the rows at the page positions, in page order"""
+    ids_by_rank = {}
+    for position in page:
+        ids_by_rank.setdefault(position.rank, []).append(position.id)
+
+    rows = {}
+    for rank, ids in ids_by_rank.items():
+        kind, model, field, serializer = KINDS[rank]
+        queryset = model.objects.filter(user=request.user, id__in=ids)
+        if model is Recipe:
+            queryset = queryset.prefetch_related('tags', 'ingredients')
+        for obj in queryset:
+            if serializer is None:
+                rows[rank, obj.id] = {
+                    'kind': obj.kind,
+                    'id': obj.object_id,
+                    'deleted': True,
+                    'data': None,
+                }
+            else:
+                rows[rank, obj.id] = {
+                    'kind': kind,
+                    'id': obj.id,
+                    'deleted': False,
+                    'data': serializer(
+                        obj,
+                        context={'request': request},
+                    ).data,
+                }
+
+    #Rows deleted since they were read are skipped, their tombstone follows
+    return [
+        rows[position.rank, position.id]
+        for position in page
+        if (position.rank, position.id) in rows
+    ]
+
+
+def changes(request, since=None, limit=None):
+    """A page of the user's changes after the since cursor"""
+    limit = max(1, min(
+        limit or settings.SYNC_PAGE_SIZE,
+        settings.SYNC_MAX_PAGE_SIZE,
+    ))
+    now = timezone.now()
+    cursor = decode_cursor(since) if since else None
+    if cursor is not None and cursor.timestamp < now - timedelta(
+        days=settings.SYNC_TOMBSTONE_DAYS
+    ):
+        raise CursorExpired(
+            'Cursor is older than the deletions kept, sync from scratch'
+        )
+    horizon = now - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+
+    merged = list(heapq.merge(
+        *_positions(request.user, cursor, horizon, limit)
+    ))
+    page = merged[:limit]
+    if page:
+        cursor = page[-1]
+    return {
+        'changes': _changes(request, page),
+        'cursor': encode_cursor(cursor) if cursor else None,
+        'has_more': len(merged) > limit,
+    }
+
+
+def data_version(user):
+    """The time of the user's latest change of each kind, None if none
+
+    Every change visible to clients moves one of these, so they can key
+    caches of derived data. Like changes(), only values older than
+    SYNC_SETTLE_SECONDS are safe to cache on, see settled().
+    """
+    latest = {
+        f'latest_{kind}': Subquery(
+            model.objects.filter(user=OuterRef('pk'))
+            .order_by(f'-{field}')
+            .values(field)[:1]
+        )
+        for kind, model, field, serializer in KINDS
+    }
+    return tuple(
+        get_user_model().objects.filter(pk=user.pk)
+        .annotate(**latest)
+        .values_list(*latest)
+        .get()
+    )
+
+
+def settled(version):
+    """True once no transaction can still commit a change older than version"""
+    timestamps = [timestamp for timestamp in version if timestamp]
+    return not timestamps or max(timestamps) <= timezone.now() - timedelta(
+        seconds=settings.SYNC_SETTLE_SECONDS
+    )
+
+
+def prune_tombstones(days=None, batch_size=None):
+    """Delete tombstones older than the retention, return how many"""
+    days = settings.SYNC_TOMBSTONE_DAYS if days is None else days
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    expired = Tombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=days),
+    )
+
+    pruned = 0
+    while True:
+        ids = list(expired.order_by('id').values_list('id', flat=True)[
+            :batch_size
+        ])
+        if not ids:
+            return pruned
+        count, _ = Tombstone.objects.filter(id__in=ids).delete()
+        pruned += count
@@ -0,0 +1,27 @@
+"""
+Helpers shared by the recipe tests
+"""
+from decimal import Decimal
+
+from core.models import Ingredient, Recipe, Tag
+
+
+def _named(model, user, items):
+    """Objects of items, getting or creating the user's for plain names"""
+    return [
+        model.objects.get_or_create(user=user, name=item)[0]
+        if isinstance(item, str) else item
+        for item in items
+    ]
+
+
+def create_recipe(user, title='Recipe', tags=(), ingredients=(), **params):
+    """Create a recipe linked to tags and ingredients, objects or names"""
+    defaults = {'time_minutes': 5, 'price': Decimal('1.00')}
+    defaults.update(params)
+    recipe = Recipe.objects.create(user=user, title=title, **defaults)
+    if tags:
+        recipe.tags.add(*_named(Tag, user, tags))
+    if ingredients:
+        recipe.ingredients.add(*_named(Ingredient, user, ingredients))
+    return recipe
@@ -0,0 +1,127 @@
+"""
+Tests for assigning tags and ingredients to many recipes at once
+"""
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+from recipe.tests.helpers import create_recipe
+
+
+def action_url(basename, action, target_id):
+    return reverse(f'recipe:{basename}-{action}', args=[target_id])
+
+
+class BulkAssignApiTests(TestCase):
+    """Test the assign and unassign actions"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipes = [create_recipe(self.user, f'R{i}') for i in range(4)]
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    def assertCountsConsistent(self):
+        out = StringIO()
+        call_command('reconcile_recipe_counts', dry_run=True, stdout=out)
+        self.assertEqual(out.getvalue().count(': 0 with'), 3)
+
+    def test_assign_by_ids(self):
+        """Test only new links are inserted and counted"""
+        self.recipes[0].tags.add(self.tag)
+        before = Recipe.objects.get(id=self.recipes[1].id).updated_at
+
+        res = self.client.post(
+            action_url('tag', 'assign', self.tag.id),
+            {'ids': [r.id for r in self.recipes[:3]]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipes'], 2)
+        self.assertEqual(
+            RecipeTag.objects.filter(tag=self.tag).count(),
+            3,
+        )
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 3)
+        self.assertGreater(
+            Recipe.objects.get(id=self.recipes[1].id).updated_at,
+            before,
+        )
+        self.assertCountsConsistent()
+
+    def test_assign_by_filter_and_unassign_all(self):
+        """Test ingredients follow a tag filter and can be removed"""
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        for recipe in self.recipes[1:3]:
+            recipe.tags.add(self.tag)
+
+        res = self.client.post(
+            action_url('ingredient', 'assign', egg.id),
+            {'tags': [self.tag.id]},
+            format='json',
+        )
+        self.assertEqual(res.data['recipes'], 2)
+        self.assertEqual(
+            sorted(RecipeIngredient.objects.filter(
+                ingredient=egg,
+            ).values_list('recipe_id', flat=True)),
+            [r.id for r in self.recipes[1:3]],
+        )
+        self.assertEqual(
+            Recipe.objects.get(id=self.recipes[1].id).ingredient_count,
+            1,
+        )
+        self.assertCountsConsistent()
+
+        res = self.client.post(
+            action_url('ingredient', 'unassign', egg.id),
+            {'all': True},
+            format='json',
+        )
+        self.assertEqual(res.data['recipes'], 2)
+        self.assertFalse(RecipeIngredient.objects.exists())
+        self.assertCountsConsistent()
+
+    def test_other_users_rows_untouched(self):
+        """Test foreign recipes are skipped and foreign tags not found"""
+        other = get_user_model().objects.create_user('other@example.com')
+        foreign_recipe = create_recipe(other, 'Foreign')
+        foreign_tag = Tag.objects.create(user=other, name='Foreign')
+
+        res = self.client.post(
+            action_url('tag', 'assign', self.tag.id),
+            {'ids': [foreign_recipe.id]},
+            format='json',
+        )
+        self.assertEqual(res.data['recipes'], 0)
+
+        res = self.client.post(
+            action_url('tag', 'assign', foreign_tag.id),
+            {'all': True},
+            format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(RecipeTag.objects.exists())
+
+    def test_selection_required(self):
+        """Test an empty selection or a selection with all is rejected"""
+        for data in ({}, {'all': True, 'ids': [1]}):
+            res = self.client.post(
+                action_url('tag', 'unassign', self.tag.id),
+                data,
+                format='json',
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
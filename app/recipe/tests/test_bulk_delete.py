@@ -0,0 +1,73 @@
+"""
+Tests for deleting many recipes at once
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import DeletionJob, Recipe
+from recipe.tests.helpers import create_recipe
+
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
+
+
+class BulkDeleteApiTests(TestCase):
+    """Test the bulk delete endpoint"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_delete(self):
+        """Test the selected recipes are deleted"""
+        r1 = create_recipe(self.user)
+        r2 = create_recipe(self.user)
+        keep = create_recipe(self.user)
+
+        res = self.client.post(
+            BULK_DELETE_URL,
+            {'ids': [r1.id, r2.id]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], DeletionJob.DONE)
+        self.assertEqual(list(Recipe.objects.all()), [keep])
+
+    def test_bulk_delete_other_users_recipes(self):
+        """Test recipes of other users are left alone"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        recipe = create_recipe(other)
+
+        self.client.post(BULK_DELETE_URL, {'ids': [recipe.id]}, format='json')
+
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_bulk_delete_in_background(self):
+        """Test a background deletion returns a job to poll"""
+        recipe = create_recipe(self.user)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(
+                BULK_DELETE_URL,
+                {'ids': [recipe.id], 'background': True},
+                format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(callbacks), 1)
+
+        job_url = reverse('recipe:deletionjob-detail', args=[res.data['id']])
+        res = self.client.get(job_url)
+
+        self.assertEqual(res.data['status'], DeletionJob.PENDING)
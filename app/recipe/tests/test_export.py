@@ -0,0 +1,150 @@
+"""
+Tests for the streaming recipe export
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from recipe.tests.helpers import create_recipe
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def body(res):
+    return b''.join(res.streaming_content)
+
+
+class ExportApiTests(TestCase):
+    """Test the export endpoint"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(
+            self.user, 'Curry',
+            tags=['Vegan', 'Dinner'],
+            ingredients=['Rice'],
+            price=Decimal('4.50'),
+        )
+        create_recipe(self.user, 'Toast')
+
+    def test_auth_required(self):
+        """Test the export needs an authenticated user"""
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_ndjson(self):
+        """Test one line per recipe with tag and ingredient names"""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in body(res).splitlines()]
+        self.assertEqual([r['title'] for r in records], ['Curry', 'Toast'])
+        self.assertEqual(records[0]['tags'], ['Dinner', 'Vegan'])
+        self.assertEqual(records[0]['ingredients'], ['Rice'])
+        self.assertEqual(records[0]['price'], '4.50')
+        self.assertEqual(records[1]['tags'], [])
+
+    def test_export_csv(self):
+        """Test CSV export joins names into one cell"""
+        res = self.client.get(EXPORT_URL, {'export_format': 'csv'})
+
+        rows = list(csv.DictReader(io.StringIO(body(res).decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['tags'], 'Dinner|Vegan')
+        self.assertIn('recipes.csv', res['Content-Disposition'])
+
+    def test_export_gzip(self):
+        """Test the export can be compressed on the fly"""
+        res = self.client.get(EXPORT_URL, {'gzip': 1})
+
+        self.assertEqual(res['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(body(res)).splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_export_gzip_flag_values(self):
+        """Test gzip takes the usual boolean spellings and rejects others"""
+        for value in ('true', 'yes', '0'):
+            res = self.client.get(EXPORT_URL, {'gzip': value})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                res['Content-Type'] == 'application/gzip',
+                value != '0',
+            )
+
+        res = self.client.get(EXPORT_URL, {'gzip': 'maybe'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('gzip', res.data)
+
+    def test_export_limited_to_user(self):
+        """Test other users' recipes are not exported"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        create_recipe(other, 'Secret', tags=['Vegan'])
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertNotIn(b'Secret', body(res))
+
+    def test_export_unknown_format(self):
+        """Test an unknown format is rejected"""
+        res = self.client.get(EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_chunked_queries(self):
+        """Test link lookups are per chunk, not per recipe"""
+        for i in range(10):
+            create_recipe(self.user, f'Recipe {i}', tags=['Quick'])
+
+        with self.settings(EXPORT_CHUNK_SIZE=5), \
+                self.assertNumQueries(1 + 3 * 2):
+            # One recipe query plus two link queries for each of 3 chunks
+            lines = body(self.client.get(EXPORT_URL)).splitlines()
+
+        self.assertEqual(len(lines), 12)
+
+
+class ExportCommandTests(TestCase):
+    """Test the export_recipes command"""
+
+    def test_export_to_file(self):
+        """Test the command writes a gzipped export"""
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        create_recipe(user, 'Curry', tags=['Vegan'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'recipes.ndjson.gz')
+            call_command(
+                'export_recipes', 'user@example.com',
+                output=path, gzip=True, stderr=io.StringIO(),
+            )
+            with gzip.open(path) as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual(records[0]['tags'], ['Vegan'])
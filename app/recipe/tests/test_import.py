@@ -0,0 +1,243 @@
+"""
+Tests for the batched NDJSON recipe import
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImportJob, Ingredient, Recipe, RecipeTag, Tag
+from recipe import importing
+
+IMPORT_URL = reverse('recipe:recipe-import')
+
+
+def record(title, **fields):
+    data = {'title': title, 'time_minutes': 10, 'price': '2.50'}
+    data.update(fields)
+    return json.dumps(data)
+
+
+def ndjson(*lines):
+    return ('\n'.join(lines) + '\n').encode()
+
+
+class ImportTests(TestCase):
+    """Test the import pipeline"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+
+    def run_import(self, data, job=None, **kwargs):
+        job = job or ImportJob.objects.create(user=self.user, source='test')
+        return importing.run_import(job, data.splitlines(), **kwargs)
+
+    def test_import_with_links(self):
+        """Test recipes are created with their tags and ingredients"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        job = self.run_import(ndjson(
+            record('Curry', tags=['Vegan', 'Dinner'], ingredients=['Rice']),
+            record('Salad', tags=[{'name': 'Vegan'}]),
+        ))
+
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.imported, 2)
+        curry = Recipe.objects.get(title='Curry')
+        self.assertEqual(
+            sorted(curry.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'],
+        )
+        self.assertEqual(Tag.objects.filter(name='Vegan').count(), 1)
+        self.assertEqual(Ingredient.objects.get().user, self.user)
+        self.assertFalse(RecipeTag.objects.exclude(user=self.user).exists())
+
+    def test_invalid_lines_are_reported(self):
+        """Test bad lines are recorded without stopping the import"""
+        job = self.run_import(ndjson(
+            record('Good'),
+            '{not json',
+            record('Bad', time_minutes='soon'),
+            '',
+            record('Also good'),
+        ))
+
+        self.assertEqual(job.imported, 2)
+        self.assertEqual(job.failed, 2)
+        self.assertEqual([e['line'] for e in job.errors], [2, 3])
+        self.assertIn('time_minutes', job.errors[1]['errors'])
+
+    def test_batches_resolve_names_once(self):
+        """Test the queries per batch do not grow with its size"""
+        lines = [
+            record(f'Recipe {i}', tags=['A', 'B'], ingredients=['C'])
+            for i in range(50)
+        ]
+        job = ImportJob.objects.create(user=self.user, source='test')
+
+        # Savepoint, the job lock, 2 name lookups, 2 name inserts, recipes
+        # and their statistics upsert, 2 link inserts with their
+        # recipe_count updates and the ingredient_count update, the job with
+        # its final status, savepoint release
+        with self.assertNumQueries(15):
+            importing.run_import(job, lines, batch_size=100)
+
+        self.assertEqual(Recipe.objects.count(), 50)
+
+    def test_resume_after_crash(self):
+        """Test a failed import resumes after the last committed batch"""
+        data = ndjson(*[record(f'Recipe {i}') for i in range(5)])
+        job = ImportJob.objects.create(user=self.user, source='test')
+        write_batch = importing.write_batch
+        calls = []
+
+        def crash_on_second_batch(*args):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('crash')
+            return write_batch(*args)
+
+        with patch.object(importing, 'write_batch', crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                self.run_import(data, job=job, batch_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual(job.lines, 2)
+        self.assertEqual(job.status, ImportJob.RUNNING)
+
+        self.run_import(data, job=job, batch_size=2)
+
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)
+                 .order_by('id')),
+            [f'Recipe {i}' for i in range(5)],
+        )
+
+    def test_concurrent_run_stops(self):
+        """Test a second run of a job can't import its lines again"""
+        data = ndjson(record('Curry'), record('Toast'))
+        job = ImportJob.objects.create(user=self.user, source='test')
+        stale = ImportJob.objects.get(pk=job.pk)
+        self.run_import(data, job=job)
+
+        with self.assertRaises(importing.ImportConflict):
+            self.run_import(data, job=stale)
+
+        self.assertEqual(Recipe.objects.count(), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.imported, 2)
+
+
+class ImportApiTests(TestCase):
+    """Test the import endpoint and command"""
+
+    def setUp(self):
+        upload_root = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_root.cleanup)
+        settings = self.settings(IMPORT_UPLOAD_ROOT=upload_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_import_upload(self):
+        """Test an upload is imported in the background"""
+        upload = SimpleUploadedFile(
+            'recipes.ndjson',
+            ndjson(record('Curry', tags=['Vegan']), 'oops'),
+        )
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(IMPORT_URL, {'file': upload})
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], ImportJob.RUNNING)
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Recipe.objects.exists())
+        job_url = res['Location']
+        self.assertTrue(job_url.endswith(
+            reverse('recipe:importjob-detail', args=[res.data['id']]),
+        ))
+
+        #What the thread started by the callback runs
+        job = importing.run_job(ImportJob.objects.get(id=res.data['id']))
+        res = self.client.get(job_url)
+
+        self.assertEqual(res.data['imported'], 1)
+        self.assertEqual(res.data['failed'], 1)
+        self.assertEqual(res.data['status'], ImportJob.DONE)
+        self.assertEqual(Recipe.objects.get().user, self.user)
+        self.assertFalse(job.upload)
+
+    def test_failed_job_is_recorded(self):
+        """Test a crashed background run marks the job failed"""
+        upload = SimpleUploadedFile('x.ndjson', ndjson(record('Curry')))
+        res = self.client.post(IMPORT_URL, {'file': upload})
+        job = ImportJob.objects.get(id=res.data['id'])
+
+        with patch.object(importing, 'write_batch',
+                          side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                importing.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertEqual(job.error, 'crash')
+
+    def test_resume_done_job(self):
+        """Test a finished job is returned without importing again"""
+        job = ImportJob.objects.create(
+            user=self.user,
+            source='x',
+            status=ImportJob.DONE,
+        )
+        upload = SimpleUploadedFile('x.ndjson', ndjson(record('Curry')))
+
+        res = self.client.post(IMPORT_URL, {'file': upload, 'job': job.id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_resume_other_users_job(self):
+        """Test jobs of other users can't be resumed"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        job = ImportJob.objects.create(user=other, source='x')
+        upload = SimpleUploadedFile('x.ndjson', ndjson(record('Curry')))
+
+        res = self.client.post(IMPORT_URL, {'file': upload, 'job': job.id})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_import_command(self):
+        """Test the command imports a file"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'recipes.ndjson')
+            with open(path, 'wb') as f:
+                f.write(ndjson(record('Curry'), record('Toast')))
+
+            call_command(
+                'import_recipes', 'user@example.com', path,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
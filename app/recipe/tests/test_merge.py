@@ -0,0 +1,130 @@
+"""
+Tests for merging tags and ingredients
+"""
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, RecipeTag, Tag, Tombstone
+from recipe import bulk
+from recipe.tests.helpers import create_recipe
+
+
+def merge_url(basename, target_id):
+    return reverse(f'recipe:{basename}-merge', args=[target_id])
+
+
+class MergeApiTests(TestCase):
+    """Test folding duplicate tags and ingredients into one"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertCountsConsistent(self):
+        out = StringIO()
+        call_command('reconcile_recipe_counts', dry_run=True, stdout=out)
+        self.assertEqual(out.getvalue().count(': 0 with'), 3)
+
+    def test_merge_tags(self):
+        """Test links move to the target once and sources are deleted"""
+        vegan, lower, spaced = (
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'vegan', 'vegan ')
+        )
+        both = create_recipe(self.user, 'Both', [vegan, lower])
+        sources_only = create_recipe(self.user, 'Sources', [lower, spaced])
+        untouched = create_recipe(self.user, 'Untouched', [vegan])
+        before = Recipe.objects.get(id=untouched.id).updated_at
+
+        res = self.client.post(
+            merge_url('tag', vegan.id),
+            {'sources': [lower.id, spaced.id]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipes'], 2)
+        self.assertEqual(
+            sorted(RecipeTag.objects.values_list('recipe_id', 'tag_id')),
+            sorted([(both.id, vegan.id), (sources_only.id, vegan.id),
+                    (untouched.id, vegan.id)]),
+        )
+        self.assertEqual(list(Tag.objects.all()), [vegan])
+        vegan.refresh_from_db()
+        self.assertEqual(vegan.recipe_count, 3)
+        self.assertEqual(
+            set(Tombstone.objects.filter(kind=Tombstone.TAG).values_list(
+                'object_id', flat=True,
+            )),
+            {lower.id, spaced.id},
+        )
+        self.assertEqual(
+            Recipe.objects.get(id=untouched.id).updated_at,
+            before,
+        )
+        self.assertCountsConsistent()
+
+    def test_merge_ingredients_counts(self):
+        """Test ingredient_count drops where a recipe had both"""
+        egg, eggs = (
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Egg', 'Eggs')
+        )
+        recipe = create_recipe(self.user, 'Omelette', [], [egg, eggs])
+
+        self.client.post(
+            merge_url('ingredient', egg.id),
+            {'sources': [eggs.id]},
+            format='json',
+        )
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 1)
+        self.assertCountsConsistent()
+
+    def test_invalid_sources(self):
+        """Test foreign sources and the target itself are rejected"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        other = get_user_model().objects.create_user('other@example.com')
+        foreign = Tag.objects.create(user=other, name='vegan')
+
+        for sources in ([foreign.id], [tag.id], []):
+            res = self.client.post(
+                merge_url('tag', tag.id),
+                {'sources': sources},
+                format='json',
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_merge_into_itself(self):
+        """Test the target among the sources gets its own error"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        other = Tag.objects.create(user=self.user, name='vegan')
+
+        with self.assertNumQueries(1):
+            res = self.client.post(
+                merge_url('tag', tag.id),
+                {'sources': [other.id, tag.id]},
+                format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['sources'],
+            ['Cannot merge a tag or ingredient into itself.'],
+        )
+        with self.assertRaisesMessage(ValueError, 'into itself'):
+            bulk.merge(self.user, RecipeTag, tag.id, [tag.id])
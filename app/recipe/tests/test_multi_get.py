@@ -0,0 +1,86 @@
+"""
+Tests for fetching recipes, tags and ingredients by a list of ids
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Tag
+from recipe.serializers import RecipeDetailSerializer, TagSerializer
+from recipe.tests.helpers import create_recipe
+
+
+def multi_url(basename, *ids):
+    url = reverse(f'recipe:{basename}-multi-get')
+    return f'{url}?ids={",".join(map(str, ids))}'
+
+
+class MultiGetApiTests(TestCase):
+    """Test the multi action of the recipe, tag and ingredient endpoints"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_recipes_in_request_order(self):
+        """Test recipes come in request order with the detail format"""
+        recipes = [
+            create_recipe(
+                self.user, f'Recipe {i}',
+                tags=[f'Recipe {i} tag'],
+                ingredients=[f'Recipe {i} ingredient'],
+            )
+            for i in range(3)
+        ]
+        other = get_user_model().objects.create_user('other@example.com')
+        foreign = create_recipe(
+            other, 'Foreign',
+            tags=['Foreign tag'],
+            ingredients=['Foreign ingredient'],
+        )
+        ids = [recipes[2].id, foreign.id, recipes[0].id, 0, recipes[2].id]
+
+        #The recipes and one query per prefetched relation
+        with self.assertNumQueries(3):
+            res = self.client.get(multi_url('recipe', *ids))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            RecipeDetailSerializer([recipes[2], recipes[0]], many=True).data,
+        )
+        self.assertEqual(res.data['missing'], [foreign.id, 0])
+
+    def test_tags_and_ingredients(self):
+        """Test tags and ingredients are fetched the same way"""
+        tags = [Tag.objects.create(user=self.user, name=n) for n in 'ab']
+        ingredient = Ingredient.objects.create(user=self.user, name='Egg')
+
+        res = self.client.get(multi_url('tag', tags[1].id, tags[0].id))
+        self.assertEqual(
+            res.data['results'],
+            TagSerializer([tags[1], tags[0]], many=True).data,
+        )
+
+        res = self.client.get(multi_url('ingredient', ingredient.id, 0))
+        self.assertEqual(
+            [item['name'] for item in res.data['results']],
+            ['Egg'],
+        )
+        self.assertEqual(res.data['missing'], [0])
+
+    @override_settings(MULTI_GET_MAX_IDS=2)
+    def test_invalid_and_too_many_ids(self):
+        """Test bad ids and batches over the cap are rejected"""
+        res = self.client.get(multi_url('recipe', 1, 'x'))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(multi_url('tag', 1, 2, 3))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
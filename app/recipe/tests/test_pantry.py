@@ -0,0 +1,103 @@
+"""
+Tests for the pantry query
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe
+from recipe.tests.helpers import create_recipe
+
+PANTRY_URL = reverse('recipe:recipe-pantry')
+
+
+def pantry_param(*ingredients, **params):
+    params['ingredients'] = ','.join(str(i.id) for i in ingredients)
+    return params
+
+
+class PantryApiTests(TestCase):
+    """Test finding recipes covered by a set of ingredients"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.egg, self.rice, self.milk, self.beef = (
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Egg', 'Rice', 'Milk', 'Beef')
+        )
+        self.fried_rice = create_recipe(self.user, 'Fried rice',
+                                        ingredients=[self.egg, self.rice])
+        self.omelette = create_recipe(self.user, 'Omelette',
+                                      ingredients=[self.egg])
+        self.pudding = create_recipe(self.user, 'Rice pudding',
+                                     ingredients=[self.rice, self.milk])
+        self.stew = create_recipe(
+            self.user, 'Stew',
+            ingredients=[self.beef, self.rice, self.milk],
+        )
+
+    def test_only_covered_recipes(self):
+        """Test recipes need every ingredient by default"""
+        res = self.client.get(PANTRY_URL, pantry_param(self.egg, self.rice))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['recipe']['id'] for item in res.data],
+            [self.fried_rice.id, self.omelette.id],
+        )
+        self.assertEqual(res.data[0]['missing'], 0)
+        self.assertEqual(res.data[0]['coverage'], 1.0)
+
+    def test_missing_allowed(self):
+        """Test recipes lacking up to missing ingredients, ranked"""
+        res = self.client.get(
+            PANTRY_URL,
+            pantry_param(self.egg, self.rice, missing=1),
+        )
+
+        self.assertEqual(
+            [(item['recipe']['id'], item['missing']) for item in res.data],
+            [
+                (self.fried_rice.id, 0),
+                (self.omelette.id, 0),
+                (self.pudding.id, 1),
+            ],
+        )
+
+    def test_zero_ingredient_count(self):
+        """Test a drifted count of 0 skips the recipe instead of failing"""
+        Recipe.objects.filter(id=self.omelette.id).update(ingredient_count=0)
+
+        res = self.client.get(PANTRY_URL, pantry_param(self.egg, self.rice))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['recipe']['id'] for item in res.data],
+            [self.fried_rice.id],
+        )
+
+    def test_other_users_recipes_excluded(self):
+        """Test only the user's own recipes are matched"""
+        other = get_user_model().objects.create_user('other@example.com')
+        egg = Ingredient.objects.create(user=other, name='Egg')
+        create_recipe(other, 'Boiled egg', ingredients=[egg])
+
+        res = self.client.get(PANTRY_URL, pantry_param(egg))
+
+        self.assertEqual(res.data, [])
+
+    def test_invalid_params(self):
+        """Test missing or malformed parameters are rejected"""
+        for params in ({}, {'ingredients': 'x'},
+                       {'ingredients': '1', 'missing': 'y'}):
+            res = self.client.get(PANTRY_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,103 @@
+"""
+Tests for the shopping list action
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient
+from recipe import shopping
+from recipe.tests.helpers import create_recipe
+
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+def ids_param(*recipes):
+    return {'ids': ','.join(str(recipe.id) for recipe in recipes)}
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class ShoppingListApiTests(TestCase):
+    """Test merging the ingredients of several recipes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.egg = Ingredient.objects.create(user=self.user, name='Egg')
+
+    def test_merged_ingredients(self):
+        """Test ingredients are deduplicated with per-ingredient counts"""
+        r1 = create_recipe(self.user, ingredients=[self.salt, self.egg])
+        r2 = create_recipe(self.user, ingredients=[self.salt])
+        create_recipe(self.user, ingredients=[self.egg])
+
+        res = self.client.get(SHOPPING_LIST_URL, ids_param(r1, r2))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['ingredients'], [
+            {'id': self.egg.id, 'name': 'Egg', 'recipe_count': 1},
+            {'id': self.salt.id, 'name': 'Salt', 'recipe_count': 2},
+        ])
+
+    def test_other_users_recipes_ignored(self):
+        """Test recipes of another user contribute nothing"""
+        other = get_user_model().objects.create_user('other@example.com')
+        pepper = Ingredient.objects.create(user=other, name='Pepper')
+        recipe = create_recipe(other, ingredients=[pepper])
+
+        res = self.client.get(SHOPPING_LIST_URL, ids_param(recipe))
+
+        self.assertEqual(res.data['ingredients'], [])
+
+    def test_cached_until_data_changes(self):
+        """Test repeated lists are cached and changes are picked up"""
+        recipe = create_recipe(self.user, ingredients=[self.salt])
+
+        with self.assertNumQueries(2):
+            first = shopping.shopping_list(self.user, [recipe.id])
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                shopping.shopping_list(self.user, [recipe.id]),
+                first,
+            )
+
+        recipe.ingredients.add(self.egg)
+        recipe.save()
+
+        self.assertEqual(
+            len(shopping.shopping_list(self.user, [recipe.id])),
+            2,
+        )
+
+    def test_unsettled_data_not_cached(self):
+        """Test results are not cached while recent writes may commit"""
+        recipe = create_recipe(self.user, ingredients=[self.salt])
+
+        with override_settings(SYNC_SETTLE_SECONDS=60):
+            shopping.shopping_list(self.user, [recipe.id])
+            with self.assertNumQueries(2):
+                shopping.shopping_list(self.user, [recipe.id])
+
+    def test_invalid_ids(self):
+        """Test missing or malformed ids are rejected"""
+        for params in ({}, {'ids': 'a,b'}):
+            res = self.client.get(SHOPPING_LIST_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SHOPPING_LIST_MAX_RECIPES=2)
+    def test_too_many_recipes(self):
+        """Test the number of recipes is limited"""
+        res = self.client.get(SHOPPING_LIST_URL, {'ids': '1,2,3'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
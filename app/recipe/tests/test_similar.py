@@ -0,0 +1,119 @@
+"""
+Tests for similar recipe recommendations
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Tag
+from recipe import similarity
+from recipe.tests.helpers import create_recipe
+
+
+def similar_url(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+@override_settings(
+    SYNC_SETTLE_SECONDS=0,
+    SIMILAR_TAG_WEIGHT=1.0,
+    SIMILAR_INGREDIENT_WEIGHT=1.0,
+)
+class SimilarApiTests(TestCase):
+    """Test the similar action and its index"""
+
+    def setUp(self):
+        similarity.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.egg, self.flour, self.milk, self.beef = (
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Egg', 'Flour', 'Milk', 'Beef')
+        )
+        self.baking = Tag.objects.create(user=self.user, name='Baking')
+
+    def test_ranked_by_similarity(self):
+        """Test recipes are ranked by weighted Jaccard similarity"""
+        cake = create_recipe(self.user, 'Cake', [self.baking],
+                             [self.egg, self.flour, self.milk])
+        pancake = create_recipe(self.user, 'Pancake', [self.baking],
+                                [self.egg, self.flour, self.milk])
+        bread = create_recipe(self.user, 'Bread', [self.baking],
+                              [self.flour])
+        create_recipe(self.user, 'Steak', [], [self.beef])
+
+        res = self.client.get(similar_url(cake.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['recipe']['id'], item['score']) for item in res.data],
+            [(pancake.id, 1.0), (bread.id, 0.5)],
+        )
+
+    def test_index_follows_changes(self):
+        """Test edits, deleted recipes and deleted tags are applied"""
+        cake = create_recipe(self.user, 'Cake', [self.baking], [self.egg])
+        bread = create_recipe(self.user, 'Bread', [self.baking], [])
+        omelette = create_recipe(self.user, 'Omelette', [], [self.milk])
+        self.client.get(similar_url(cake.id))
+
+        omelette.ingredients.add(self.egg)
+        bread_id = bread.id
+        bread.delete()
+        res = self.client.get(similar_url(cake.id))
+
+        self.assertEqual(
+            [item['recipe']['id'] for item in res.data],
+            [omelette.id],
+        )
+
+        self.baking.delete()
+        index = similarity.get_index(self.user)
+
+        self.assertNotIn(bread_id, index.features)
+        self.assertEqual(index.features[cake.id],
+                         (similarity.ingredient_feature(self.egg.id),))
+
+    def test_other_users_recipe_not_found(self):
+        """Test recipes of another user are not found"""
+        other = get_user_model().objects.create_user('other@example.com')
+        recipe = create_recipe(other, 'Cake', [], [])
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(SIMILAR_INLINE_BUILD_MAX_RECIPES=0)
+    def test_large_library_built_in_background(self):
+        """Test the first request of a large library is accepted"""
+        cake = create_recipe(self.user, 'Cake', [], [self.egg])
+
+        with mock.patch('recipe.similarity.threading.Thread') as thread:
+            res = self.client.get(similar_url(cake.id))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        thread.return_value.start.assert_called_once()
+
+    @override_settings(SIMILAR_MAX_POSTINGS=2)
+    def test_common_features_only_rescore(self):
+        """Test features of many recipes add no new candidates"""
+        cake = create_recipe(self.user, 'Cake', [self.baking],
+                             [self.egg, self.beef])
+        steak = create_recipe(self.user, 'Steak', [], [self.beef])
+        create_recipe(self.user, 'Bread', [self.baking], [])
+        create_recipe(self.user, 'Quiche', [self.baking], [])
+
+        index = similarity.get_index(self.user)
+        scored = index.similar(cake.id, 10)
+
+        self.assertEqual([recipe_id for score, recipe_id in scored],
+                         [steak.id])
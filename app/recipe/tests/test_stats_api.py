@@ -0,0 +1,65 @@
+"""
+Tests for the library statistics endpoint
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from recipe.tests.helpers import create_recipe
+
+STATS_URL = reverse('recipe:recipe-stats')
+
+
+class StatsApiTests(TestCase):
+    """Test the stats action"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_empty_library(self):
+        """Test a user without recipes gets empty statistics"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipes'], 0)
+        self.assertIsNone(res.data['price'])
+        self.assertEqual(res.data['growth'], [])
+
+    def test_stats_of_own_library(self):
+        """Test statistics cover the user's recipes and top tags only"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        create_recipe(self.user, tags=[vegan, quick],
+                      price=Decimal('3.00'), time_minutes=10)
+        create_recipe(self.user, tags=[vegan],
+                      price=Decimal('5.00'), time_minutes=40)
+        other = get_user_model().objects.create_user('other@example.com')
+        create_recipe(other, price=Decimal('50.00'), time_minutes=200)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipes'], 2)
+        self.assertEqual(res.data['price']['average'], '4.00')
+        self.assertEqual(res.data['time_minutes']['average'], 25.0)
+        self.assertEqual(
+            [(tag['name'], tag['recipes']) for tag in res.data['tags']],
+            [('Vegan', 2), ('Quick', 1)],
+        )
+        self.assertEqual(res.data['growth'][0]['total'], 2)
+
+    def test_auth_required(self):
+        """Test the endpoint needs authentication"""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,180 @@
+"""
+Tests for the delta sync endpoint
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import deletion
+from core.models import Tag, Tombstone
+from recipe import sync
+from recipe.tests.helpers import create_recipe
+
+CHANGES_URL = reverse('recipe:recipe-changes')
+
+
+def summary(page):
+    return [
+        (change['kind'], change['id'], change['deleted'])
+        for change in page['changes']
+    ]
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncApiTests(TestCase):
+    """Test fetching changes since a cursor"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None, **params):
+        if since:
+            params['since'] = since
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_full_sync(self):
+        """Test a sync without cursor returns every object of the user"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(self.user)
+        recipe.tags.add(tag)
+        other = get_user_model().objects.create_user('other@example.com')
+        create_recipe(other)
+
+        page = self.sync()
+
+        self.assertEqual(
+            summary(page),
+            [('tag', tag.id, False), ('recipe', recipe.id, False)],
+        )
+        self.assertEqual(page['changes'][1]['data']['tags'][0]['name'],
+                         'Vegan')
+        self.assertFalse(page['has_more'])
+
+    def test_only_changes_since_cursor(self):
+        """Test created, updated and deleted objects after the cursor"""
+        kept = create_recipe(self.user, 'Kept')
+        updated = create_recipe(self.user, 'Updated')
+        removed = create_recipe(self.user, 'Removed')
+        cursor = self.sync()['cursor']
+
+        updated.title = 'Changed'
+        updated.save()
+        removed_id = removed.id
+        removed.delete()
+        created = create_recipe(self.user, 'Created')
+        page = self.sync(cursor)
+
+        self.assertEqual(summary(page), [
+            ('recipe', updated.id, False),
+            ('recipe', removed_id, True),
+            ('recipe', created.id, False),
+        ])
+        self.assertNotIn(kept.id, [c['id'] for c in page['changes']])
+        self.assertEqual(summary(self.sync(page['cursor'])), [])
+
+    def test_pages_do_not_skip_or_repeat(self):
+        """Test paging with a small limit visits every change once"""
+        recipes = [create_recipe(self.user, f'R{i}') for i in range(5)]
+        tags = [Tag.objects.create(user=self.user, name=f'T{i}')
+                for i in range(3)]
+
+        seen = []
+        cursor = None
+        while True:
+            page = self.sync(cursor, limit=2)
+            self.assertLessEqual(len(page['changes']), 2)
+            seen += summary(page)
+            cursor = page['cursor']
+            if not page['has_more']:
+                break
+
+        self.assertEqual(
+            sorted(seen),
+            sorted([('recipe', r.id, False) for r in recipes]
+                   + [('tag', t.id, False) for t in tags]),
+        )
+
+    def test_bulk_delete_leaves_tombstones(self):
+        """Test recipes removed with raw deletes are reported"""
+        recipe = create_recipe(self.user)
+        cursor = self.sync()['cursor']
+
+        deletion.delete_recipes(self.user, [recipe.id])
+
+        self.assertEqual(
+            summary(self.sync(cursor)),
+            [('recipe', recipe.id, True)],
+        )
+
+    def test_settle_time_holds_back_recent_changes(self):
+        """Test changes younger than the settle time wait for later"""
+        create_recipe(self.user)
+
+        with override_settings(SYNC_SETTLE_SECONDS=60):
+            page = self.sync()
+
+        self.assertEqual(page['changes'], [])
+        self.assertIsNone(page['cursor'])
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        res = self.client.get(CHANGES_URL, {'since': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(res.data), ['since'])
+
+    def test_invalid_limit(self):
+        """Test a bad limit is reported under limit, not since"""
+        for limit in ('x', '0'):
+            res = self.client.get(CHANGES_URL, {'limit': limit})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(list(res.data), ['limit'])
+
+    def test_expired_cursor(self):
+        """Test a cursor older than the tombstones kept is gone"""
+        since = sync.encode_cursor(
+            sync.Cursor(timezone.now() - timedelta(days=365), 0, 0)
+        )
+
+        res = self.client.get(CHANGES_URL, {'since': since})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_prune_tombstones(self):
+        """Test only tombstones past the retention are pruned"""
+        old, new = [create_recipe(self.user) for _ in range(2)]
+        old.delete()
+        Tombstone.objects.update(
+            deleted_at=timezone.now() - timedelta(days=100),
+        )
+        new_id = new.id
+        new.delete()
+
+        self.assertEqual(sync.prune_tombstones(days=90), 1)
+        self.assertEqual(
+            list(Tombstone.objects.values_list('object_id', flat=True)),
+            [new_id],
+        )
+
+    def test_user_delete_leaves_no_tombstones(self):
+        """Test deleting a user removes their tombstones"""
+        create_recipe(self.user).delete()
+        create_recipe(self.user)
+
+        deletion.delete_user(self.user)
+
+        self.assertFalse(Tombstone.objects.exists())
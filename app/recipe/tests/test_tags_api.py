@@ -133,4 +133,23 @@ class PrivateTagsAPITests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only' : 1})
 
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data), 1)
+
+    def test_order_by_recipe_count(self):
+        """Test ordering tags by how many recipes use them"""
+        rare = Tag.objects.create(user=self.user, name="Brunch")
+        popular = Tag.objects.create(user=self.user, name="Dinner")
+        for title in ("Pasta", "Soup"):
+            recipe = Recipe.objects.create(title=title,
+                                           time_minutes=10,
+                                           price=Decimal('3.50'),
+                                           user=self.user)
+            recipe.tags.add(popular)
+        recipe.tags.add(rare)
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+
+        self.assertEqual(
+            [tag['name'] for tag in res.data],
+            [popular.name, rare.name],
+        )
@@ -9,6 +9,8 @@ router = DefaultRouter()
 router.register('recipes', views.RecipeViewSet)
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
+router.register('import-jobs', views.ImportJobViewSet)
+router.register('deletion-jobs', views.DeletionJobViewSet)
 app_name = "recipe"
 
 urlpatterns = [
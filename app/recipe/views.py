@@ -8,14 +8,84 @@ from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
 )
-from rest_framework import viewsets, mixins, status
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from rest_framework import filters, viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.reverse import reverse
 
-from core.models import Ingredient, Recipe, Tag
+from core import deletion
+from core import stats as library_stats
+from core.batch import BatchTokenAuthentication
+from core.models import (
+    DeletionJob,
+    ImportJob,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+from recipe import bulk
+from recipe import export as recipe_export
+from recipe import importing
+from recipe import pantry
 from recipe import serializers
+from recipe import shopping
+from recipe import similarity
+from recipe import sync
+
+IDS_PARAMETER = OpenApiParameter(
+    'ids',
+    OpenApiTypes.STR,
+    required=True,
+    description="Comma Seperated list of IDs to fetch"
+)
+
+
+class MultiGetMixin:
+    """Fetch several objects by id in one request"""
+
+    def _params_to_ints(self, qs):
+        """Convert a list of string to integers"""
+        return [int(str_id) for str_id in qs.split(',')]
+
+    #One scoped query instead of a retrieve call per id
+    @action(methods=['GET'], detail=False, url_path='multi')
+    def multi_get(self, request):
+        """Objects with the given ids in request order, and missing ids"""
+        try:
+            ids = self._params_to_ints(request.query_params.get('ids', ''))
+        except ValueError:
+            return Response(
+                {'ids': 'Must be a comma separated list of IDs'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > settings.MULTI_GET_MAX_IDS:
+            return Response(
+                {'ids': f'At most {settings.MULTI_GET_MAX_IDS} IDs'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        found = {
+            obj.id: obj
+            for obj in self.get_queryset().filter(id__in=ids).order_by()
+        }
+        serializer = self.get_serializer(
+            [found[id] for id in ids if id in found],
+            many=True,
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [id for id in ids if id not in found],
+        })
+
 
 #Adding custom functionality(query parameters) to swagger API
 @extend_schema_view(
@@ -32,41 +102,138 @@ from recipe import serializers
                 description="Comma Seperated list of ingredients to filter"
             )
         ]
-    )
+    ),
+    export=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'export_format',
+                OpenApiTypes.STR, enum=list(recipe_export.FORMATS),
+                description="ndjson (default) or csv"
+            ),
+            OpenApiParameter(
+                'gzip',
+                OpenApiTypes.BOOL,
+                description="Gzip the export"
+            )
+        ],
+        responses={(200, 'application/octet-stream'): OpenApiTypes.BINARY},
+    ),
+    changes=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'since',
+                OpenApiTypes.STR,
+                description="Cursor of the last sync, omit for a full sync"
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description="Changes per page"
+            )
+        ],
+        responses={
+            200: serializers.SyncPageSerializer,
+            410: OpenApiTypes.OBJECT,
+        },
+    ),
+    shopping_list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'ids',
+                OpenApiTypes.STR,
+                required=True,
+                description="Comma Seperated list of recipe IDs"
+            )
+        ],
+        responses=serializers.ShoppingListSerializer,
+    ),
+    similar=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'k',
+                OpenApiTypes.INT,
+                description="Number of similar recipes"
+            )
+        ],
+        responses={
+            200: serializers.SimilarRecipeSerializer(many=True),
+            202: OpenApiTypes.OBJECT,
+        },
+    ),
+    pantry=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'ingredients',
+                OpenApiTypes.STR,
+                required=True,
+                description="Comma Seperated list of ingredient IDs at home"
+            ),
+            OpenApiParameter(
+                'missing',
+                OpenApiTypes.INT,
+                description="Ingredients a recipe may lack, default 0"
+            )
+        ],
+        responses=serializers.PantryRecipeSerializer(many=True),
+    ),
+    stats=extend_schema(
+        responses=serializers.LibraryStatsSerializer,
+    ),
+    multi_get=extend_schema(
+        parameters=[IDS_PARAMETER],
+        responses=serializers.RecipeMultiGetSerializer,
+    ),
+    import_recipes=extend_schema(
+        request=serializers.RecipeImportRequestSerializer,
+        responses={
+            200: serializers.ImportJobSerializer,
+            202: serializers.ImportJobSerializer,
+        },
+    ),
+    bulk_delete=extend_schema(
+        request=serializers.RecipeBulkDeleteSerializer,
+        responses={
+            200: serializers.DeletionJobSerializer,
+            202: serializers.DeletionJobSerializer,
+        },
+    ),
 )
 #Viewset made to work directly with models
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(MultiGetMixin, viewsets.ModelViewSet):
     """View for manage recipe APIs"""
     serializer_class = serializers.RecipeDetailSerializer
 
     #Objects available for this
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [BatchTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
-    def _params_to_ints(self, qs):
-        """Convert a list of string to integers"""
-        return [int(str_id) for str_id in qs.split(',')]
-
     #Filter recipes to authenticated user
     def get_queryset(self):
         """Retreive recipes as saved in queryset above for authenticated users"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
+        user = self.request.user
+        #Scope every query by user so partitioned tables prune to one
+        #partition
+        queryset = self.queryset.filter(user=user)
 
-        #If tags or ingredients exists then make those queryset, otherwise return all recipes
+        #If tags or ingredients exists then filter by them, otherwise
+        #return all recipes
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.with_tags(user, self._params_to_ints(tags))
 
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.with_ingredients(
+                user,
+                self._params_to_ints(ingredients),
+            )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
+        #Detail output for many recipes at once
+        if self.action == 'multi_get':
+            queryset = queryset.prefetch_related('tags', 'ingredients')
+
+        return queryset.order_by('-id')
 
     #Return detail serializer for most things but return recipe serializer for list outputs
     def get_serializer_class(self):
@@ -75,14 +242,249 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'import_recipes':
+            return serializers.RecipeImportRequestSerializer
+        elif self.action == 'bulk_delete':
+            return serializers.RecipeBulkDeleteSerializer
 
         return self.serializer_class
 
+    #Stream the whole library instead of paging through the list endpoint
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Export all recipes of the user as NDJSON or CSV"""
+        params = serializers.RecipeExportParamsSerializer(
+            data=request.query_params,
+        )
+        params.is_valid(raise_exception=True)
+        export_format = params.validated_data['export_format']
+        compress = params.validated_data['gzip']
+
+        response = StreamingHttpResponse(
+            recipe_export.export_stream(
+                request.user,
+                export_format,
+                compress,
+            ),
+            content_type=(
+                'application/gzip' if compress
+                else recipe_export.CONTENT_TYPES[export_format]
+            ),
+        )
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+            recipe_export.filename(export_format, compress),
+        )
+        return response
+
+    #Offline clients download what changed instead of the whole library
+    @action(methods=['GET'], detail=False, url_path='changes')
+    def changes(self, request):
+        """Recipes, tags and ingredients changed since a sync cursor"""
+        params = serializers.SyncParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        try:
+            page = sync.changes(
+                request,
+                params.validated_data.get('since'),
+                params.validated_data.get('limit'),
+            )
+        except sync.CursorExpired as e:
+            #Well formed, but the deletions since then are gone
+            return Response({'since': [str(e)]}, status=status.HTTP_410_GONE)
+        return Response(page)
+
+    #Meal plans need the merged ingredients, not every recipe detail
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """Ingredients of the given recipes with how many recipes use each"""
+        try:
+            recipe_ids = self._params_to_ints(
+                request.query_params.get('ids', '')
+            )
+        except ValueError:
+            return Response(
+                {'ids': 'Must be a comma separated list of recipe IDs'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = settings.SHOPPING_LIST_MAX_RECIPES
+        if len(recipe_ids) > limit:
+            return Response(
+                {'ids': f'At most {limit} recipes'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ingredients = shopping.shopping_list(request.user, recipe_ids)
+        return Response(
+            serializers.ShoppingListSerializer({
+                'ingredients': ingredients,
+            }).data
+        )
+
+    #Recommendations from the in-memory index, see recipe/similarity.py
+    @action(methods=['GET'], detail=True, url_path='similar')
+    def similar(self, request, pk=None):
+        """Recipes sharing the most tags and ingredients with this one"""
+        recipe = self.get_object()
+        try:
+            k = int(request.query_params.get(
+                'k', settings.SIMILAR_DEFAULT_K,
+            ))
+        except ValueError:
+            return Response(
+                {'k': 'Must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        k = max(1, min(k, settings.SIMILAR_MAX_K))
+
+        scored = similarity.similar_recipes(request.user, recipe.id, k)
+        if scored is None:
+            return Response(
+                {'detail': 'Similarity index is being built, retry shortly'},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Retry-After': '5'},
+            )
+
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=[recipe_id for score, recipe_id in scored],
+        ).prefetch_related('tags', 'ingredients').in_bulk()
+        serializer = serializers.SimilarRecipeSerializer(
+            [
+                {'score': score, 'recipe': recipes[recipe_id]}
+                for score, recipe_id in scored
+                if recipe_id in recipes
+            ],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
+
+    #Recipes that can be cooked from the given ingredients
+    @action(methods=['GET'], detail=False, url_path='pantry')
+    def pantry(self, request):
+        """Recipes covered by the ingredients, best covered first"""
+        try:
+            ingredient_ids = self._params_to_ints(
+                request.query_params.get('ingredients', '')
+            )
+            missing = int(request.query_params.get('missing', 0))
+        except ValueError:
+            return Response(
+                {'ingredients': 'Must be a comma separated list of IDs, '
+                                'missing an integer'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(ingredient_ids) > settings.PANTRY_MAX_INGREDIENTS:
+            return Response(
+                {'ingredients': 'At most '
+                                f'{settings.PANTRY_MAX_INGREDIENTS} IDs'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        rows = pantry.cookable(
+            request.user,
+            ingredient_ids,
+            missing=max(missing, 0),
+            limit=settings.PANTRY_MAX_RESULTS,
+        )
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=[recipe_id for recipe_id, matched, total in rows],
+        ).prefetch_related('tags', 'ingredients').in_bulk()
+        serializer = serializers.PantryRecipeSerializer(
+            [
+                {
+                    'recipe': recipes[recipe_id],
+                    'missing': total - matched,
+                    'coverage': matched / total,
+                }
+                for recipe_id, matched, total in rows
+                if recipe_id in recipes
+            ],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
+
+    #Read from the rollup rows kept by core/stats.py
+    @action(methods=['GET'], detail=False, url_path='stats')
+    def stats(self, request):
+        """Price, time, tag and growth statistics of the library"""
+        return Response(
+            serializers.LibraryStatsSerializer(
+                library_stats.summary(request.user),
+            ).data
+        )
+
     #Assign user id to new recipes
     def perform_create(self, serializer):
         """Create a new Recipe"""
         serializer.save(user=self.request.user)
 
+    #Bulk import from NDJSON, e.g. an export of this or another app
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='import',
+        url_name='import',
+        parser_classes=[MultiPartParser],
+    )
+    def import_recipes(self, request):
+        """Import an NDJSON file in the background, resuming a job if given"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+
+        job_id = serializer.validated_data.get('job')
+        if job_id is None:
+            job = ImportJob(user=request.user, source=upload.name[:255])
+        else:
+            job = get_object_or_404(ImportJob, id=job_id, user=request.user)
+            if job.status == ImportJob.DONE:
+                return Response(
+                    serializers.ImportJobSerializer(job).data,
+                    status=status.HTTP_200_OK,
+                )
+            #The new upload replaces the one a failed run left
+            job.upload.delete(save=False)
+        job.upload = upload
+        job.status = ImportJob.RUNNING
+        job.error = ''
+        job.save()
+        importing.start_job(job)
+
+        url = reverse('recipe:importjob-detail', args=[job.id],
+                      request=request)
+        return Response(
+            serializers.ImportJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': url},
+        )
+
+    #Batched deletion, optionally in the background for large sets
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Delete many recipes, returning the deletion job"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        background = serializer.validated_data['background']
+
+        job = DeletionJob.objects.create(
+            user=request.user,
+            email=request.user.email,
+            kind=DeletionJob.RECIPES,
+            recipe_ids=serializer.validated_data['ids'],
+        )
+        deletion.start_job(job, background=background)
+
+        return Response(
+            serializers.DeletionJobSerializer(job).data,
+            status=(
+                status.HTTP_202_ACCEPTED if background
+                else status.HTTP_200_OK
+            ),
+        )
+
     #Custom action for uploading image API that only accepts POST request
     @action(methods=['POST'], detail=True, url_path="upload-image")
     def upload_image(self, request, pk=None):
@@ -111,13 +513,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
 )
 #GenericViewSet allows mixins integration
 #Mixins provides additional functionalities
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(MultiGetMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base Viewset for recipe attributes"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [BatchTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    #?ordering=-recipe_count lists the most used first
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['name', 'recipe_count']
+    ordering = ['-name']
 
 
     def get_queryset(self):
@@ -125,20 +532,129 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
         assigned_only = bool(
             int(self.request.query_params.get('assigned_only', 0))
         )
-        queryset = self.queryset
+        queryset = self.queryset.filter(user=self.request.user)
 
+        #recipe_count is kept up to date, no join through the recipes needed
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
+
+        return queryset.order_by('-name')
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
+    def _bulk_change(self, request, operation):
+        target = self.get_object()
+        serializer = serializers.RecipeSelectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        selection = serializer.validated_data
+        recipes = None
+        if not selection['all']:
+            recipes = bulk.select_recipes(
+                request.user,
+                ids=selection.get('ids'),
+                tags=selection.get('tags'),
+                ingredients=selection.get('ingredients'),
+            )
+        elif operation is bulk.assign:
+            recipes = bulk.select_recipes(request.user)
+        changed = operation(request.user, self.link_model, target.id, recipes)
+        return Response(
+            serializers.BulkAssignResultSerializer({'recipes': changed}).data
+        )
+
+    #One statement for thousands of recipes instead of a PATCH per recipe
+    @extend_schema(
+        request=serializers.RecipeSelectionSerializer,
+        responses=serializers.BulkAssignResultSerializer,
+    )
+    @action(methods=['POST'], detail=True, url_path='assign')
+    def assign(self, request, pk=None):
+        """Add this tag/ingredient to the selected recipes"""
+        return self._bulk_change(request, bulk.assign)
+
+    @extend_schema(
+        request=serializers.RecipeSelectionSerializer,
+        responses=serializers.BulkAssignResultSerializer,
+    )
+    @action(methods=['POST'], detail=True, url_path='unassign')
+    def unassign(self, request, pk=None):
+        """Remove this tag/ingredient from the selected recipes"""
+        return self._bulk_change(request, bulk.unassign)
+
+    #Cleans up near duplicates like "Vegan" and "vegan " in one go
+    @extend_schema(
+        request=serializers.MergeSerializer,
+        responses=serializers.MergeResultSerializer,
+    )
+    @action(methods=['POST'], detail=True, url_path='merge')
+    def merge(self, request, pk=None):
+        """Fold the source tags/ingredients into this one"""
+        target = self.get_object()
+        serializer = serializers.MergeSerializer(
+            data=request.data,
+            context={'target_id': target.id},
+        )
+        serializer.is_valid(raise_exception=True)
+        source_ids = sorted(set(serializer.validated_data['sources']))
+        try:
+            changed = bulk.merge(
+                request.user,
+                self.link_model,
+                target.id,
+                source_ids,
+            )
+        except ValueError as e:
+            return Response(
+                {'sources': str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            serializers.MergeResultSerializer({'recipes': changed}).data
+        )
 
+@extend_schema_view(
+    multi_get=extend_schema(
+        parameters=[IDS_PARAMETER],
+        responses=serializers.TagMultiGetSerializer,
+    ),
+)
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database"""
     serializer_class = serializers.TagSerializer
     queryset =  Tag.objects.all()
+    link_model = RecipeTag
 
+@extend_schema_view(
+    multi_get=extend_schema(
+        parameters=[IDS_PARAMETER],
+        responses=serializers.IngredientMultiGetSerializer,
+    ),
+)
 class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    link_model = RecipeIngredient
+
+
+class ImportJobViewSet(mixins.RetrieveModelMixin,
+                       mixins.ListModelMixin,
+                       viewsets.GenericViewSet):
+    """Status of the user's recipe imports"""
+    serializer_class = serializers.ImportJobSerializer
+    queryset = ImportJob.objects.all()
+    authentication_classes = [BatchTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user).order_by('-id')
+
+
+class DeletionJobViewSet(mixins.RetrieveModelMixin,
+                         mixins.ListModelMixin,
+                         viewsets.GenericViewSet):
+    """Status of the user's deletion jobs"""
+    serializer_class = serializers.DeletionJobSerializer
+    queryset = DeletionJob.objects.all()
+    authentication_classes = [BatchTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.queryset.filter(user=self.request.user).order_by('-id')
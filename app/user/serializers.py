@@ -11,7 +11,9 @@ from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
-class UserSerializer(serializers.ModelSerializer):
+from core.metrics import TimedSerializerMixin
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for the user object"""
 
     class Meta:
@@ -156,3 +156,13 @@ class PrivateUserAPITests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
 
+    def test_delete_account(self):
+        """Test deleting the account locks it and queues the deletion"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.delete(ME_URL)
+
+        self.user.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['kind'], 'user')
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(len(callbacks), 1)
@@ -1,8 +1,13 @@
 """
 Views for the user API
 """
-from rest_framework import generics, authentication, permissions
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
 
+from core import deletion
+from core.batch import BatchTokenAuthentication
+from recipe.serializers import DeletionJobSerializer
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 from rest_framework.authtoken.views import ObtainAuthToken
@@ -18,12 +23,22 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
-#RetrieveUpdateAPIView is provided for retrieveing and updating objects in database
-class ManageUserView(generics.RetrieveUpdateAPIView):
+#RetrieveUpdateDestroyAPIView also lets users delete their account
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """Manage the authenicated user"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [BatchTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
\ No newline at end of file
+        return self.request.user
+
+    @extend_schema(responses={202: DeletionJobSerializer})
+    def delete(self, request, *args, **kwargs):
+        """Delete the account and all its data in the background"""
+        job = deletion.queue_user_deletion(self.get_object())
+
+        return Response(
+            DeletionJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
@@ -3,8 +3,12 @@
 #Fail the whole script if a command fails
 set -e
 
-python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
+#Runs wait_for_db, collectstatic, build_schema and migrate
+#and reports how long each took
+python manage.py startup --report-file /vol/web/startup.json
+
+#Shared directory for the per-worker metrics snapshots, reset on every boot
+export METRICS_DIR=${METRICS_DIR:-/tmp/metrics}
+rm -rf "$METRICS_DIR" && mkdir -p "$METRICS_DIR"
 
 uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi